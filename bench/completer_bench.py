@@ -0,0 +1,58 @@
+"""
+Per-keystroke latency of the name completer behind the typed-answer quiz.
+
+Builds a NameCompleter over generated names with Zipf-like popularity and
+replays typing names letter by letter, reporting the build time and p50/p99/max
+latency per prefix length. Every keystroke of a typed answer asks for fresh
+suggestions, so all of them have to stay well below a frame (16 ms).
+
+    python bench/completer_bench.py --names 200000 --typed 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from matcher_bench import synthetic_names, percentile
+from name_completer import NameCompleter
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the per-keystroke latency of the name completer")
+    parser.add_argument("--names", type=int, default=100000)
+    parser.add_argument("--typed", type=int, default=1000, help="names typed letter by letter")
+    parser.add_argument("--limit", type=int, default=8, help="suggestions per keystroke")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(3)
+    names = [name for name, _ in synthetic_names(args.names)]
+    rng.shuffle(names)
+
+    completer = NameCompleter(size=args.limit)
+    for rank, name in enumerate(names, 1):
+        completer.add(name, weight=1e6 / rank)
+    start = time.perf_counter()
+    completer.complete("")
+    print(f"indexed {len(completer)} names in {time.perf_counter() - start:.2f} s")
+
+    by_length = {}
+    for name in rng.sample(names, min(args.typed, len(names))):
+        # Players type in lower case and without the genus' capital, which the index ignores
+        typed = name.lower()
+        for length in range(1, len(typed) + 1):
+            start = time.perf_counter()
+            completer.complete(typed[:length], args.limit)
+            by_length.setdefault(min(length, 6), []).append(time.perf_counter() - start)
+
+    print(f"{'prefix':<8} {'keystrokes':>10} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for length, latencies in sorted(by_length.items()):
+        label = f"{length}+" if length == 6 else str(length)
+        print(f"{label:<8} {len(latencies):>10} {percentile(latencies, 0.5) * 1e6:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1e6:>8.1f} {max(latencies) * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Cold import time of the project's modules, each measured in a fresh interpreter.
+
+A CLI or worker process pays for every module it imports before doing any work,
+so importing a module must not load selenium, aiohttp, requests or Pillow, start
+threads or touch the network. For each module the benchmark reports the median
+import time over a number of fresh processes, the heavy dependencies the import
+executed and the threads it left running, and exits non-zero if a module goes
+over the budget or breaks one of those rules.
+
+    python bench/import_bench.py --runs 5 --budget-ms 300
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Modules workers and CLIs import directly
+MODULES = [
+    "quinsectz",
+    "http_client",
+    "name_resolver",
+    "taxon_id",
+    "name_matcher",
+    "name_completer",
+    "datasets",
+    "dataset_export",
+    "dataset_sync",
+    "question_pipeline",
+    "image_requestor",
+    "image_store",
+    "image_source",
+    "image_scraper",
+    "image_variants",
+    "driver_pool",
+    "quiz_ui",
+    "demo_scraped_image",
+]
+
+# Dependencies which only the code paths that use them may load
+HEAVY_MODULES = ["requests", "aiohttp", "selenium.webdriver", "PIL.Image", "pyarrow", "tkinter"]
+
+_PROBE = """
+import json, sys, threading, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+from lazy_loading import is_loaded
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'heavy': [name for name in {heavy!r} if is_loaded(name)],
+    'threads': threading.active_count() - 1,
+}}))
+"""
+
+def measure(module, runs):
+    """
+    Import `module` in `runs` fresh interpreters.
+
+    Returns:
+    dict: The median import time, and the heavy modules and threads of the last run
+    """
+    samples = []
+    for _ in range(runs):
+        probe = _PROBE.format(src=SRC, module=module, heavy=HEAVY_MODULES)
+        output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'module': module,
+        'median_ms': statistics.median(sample['ms'] for sample in samples),
+        'heavy': samples[-1]['heavy'],
+        'threads': samples[-1]['threads'],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the project's modules")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="fail if a module takes longer to import")
+    parser.add_argument("--only", action="append", help="measure only modules whose name contains this (repeatable)")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'module':<24} {'median ms':>10}  heavy dependencies / threads")
+    for module in MODULES:
+        if args.only and not any(part in module for part in args.only):
+            continue
+        result = measure(module, args.runs)
+        results.append(result)
+        notes = ", ".join(result['heavy']) or "-"
+        if result['threads']:
+            notes += f" / {result['threads']} thread(s)"
+        print(f"{module:<24} {result['median_ms']:>10.1f}  {notes}")
+
+    failed = [
+        result['module'] for result in results
+        if result['median_ms'] > args.budget_ms or result['heavy'] or result['threads']
+    ]
+    if failed:
+        print(f"Over budget or not side-effect free: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
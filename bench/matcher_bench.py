@@ -0,0 +1,85 @@
+"""
+Latency of the local name matcher over a synthetic checklist.
+
+Builds a NameMatcher over generated binomials and times queries for exact
+names, names with authorship, other gender endings, typos and names that
+aren't in the list, reporting p50/p99 per kind of query.
+
+    python bench/matcher_bench.py --names 200000 --queries 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from name_matcher import NameMatcher, is_confident
+
+SYLLABLES = ["ca", "ra", "bus", "po", "li", "ni", "ter", "go", "phi", "lus", "me", "to", "da", "cri", "stel", "an", "or", "ex", "ul", "mo"]
+ENDINGS = ["us", "a", "um", "is", "ensis", "atus", "oides"]
+
+def synthetic_names(count, seed=1):
+    """
+    Return `count` distinct (name, key) pairs shaped like species binomials.
+    """
+    rng = random.Random(seed)
+    genera = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize() for _ in range(max(1, count // 20))]
+    names = {}
+    while len(names) < count:
+        epithet = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(ENDINGS)
+        names.setdefault(f"{rng.choice(genera)} {epithet}", len(names) + 1)
+    return list(names.items())
+
+def typo(name, rng):
+    position = rng.randrange(len(name.split()[0]) + 1, len(name))
+    return name[:position] + rng.choice("aeioulnrst") + name[position + 1:]
+
+def regender(name):
+    for ending, other in (("us", "a"), ("um", "us"), ("a", "um"), ("is", "e")):
+        if name.endswith(ending):
+            return name[:-len(ending)] + other
+    return name + "i"
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the local name matcher")
+    parser.add_argument("--names", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    names = synthetic_names(args.names)
+    start = time.perf_counter()
+    matcher = NameMatcher()
+    matcher.add_many(names)
+    print(f"indexed {len(matcher)} names in {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(2)
+    sample = [name for name, _ in rng.sample(names, min(args.queries, len(names)))]
+    kinds = {
+        'exact': sample,
+        'authorship': [f"{name} (Linnaeus, 1758)" for name in sample],
+        'gender ending': [regender(name) for name in sample],
+        'typo': [typo(name, rng) for name in sample],
+        'unknown': [f"Zzyx{name.split()[1]}" for name in sample],
+    }
+
+    print(f"{'query':<16} {'p50 us':>8} {'p99 us':>8} {'confident':>10}")
+    for kind, queries in kinds.items():
+        latencies = []
+        confident = 0
+        for query in queries:
+            start = time.perf_counter()
+            candidates = matcher.match(query)
+            latencies.append(time.perf_counter() - start)
+            confident += is_confident(candidates)
+        print(f"{kind:<16} {percentile(latencies, 0.5) * 1e6:>8.0f} {percentile(latencies, 0.99) * 1e6:>8.0f} "
+              f"{confident / len(queries):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmarks of the project's client functions against the local stand-in server.
+
+Every benchmark calls one function repeatedly and reports throughput and
+p50/p99 latency. Calls are cold by default: the taxonomy cache, the HTTP cache,
+the name resolver and the taxonomy index are emptied before each one. Those are
+process-wide, so cold calls run one at a time; with --warm they are emptied
+once per benchmark and the calls may run concurrently.
+
+    python bench/run_bench.py --iterations 50 --latency 0.02 --error-rate 0.05
+    python bench/run_bench.py --iterations 200 --warm --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stub_server import StubServer
+import http_client
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def reset_caches():
+    # Start every call cold, so the numbers measure the requests rather than the caches
+    import quinsectz as qi
+    from name_resolver import resolver
+    from taxonomy_cache import get_default_cache
+    from taxonomy_index import TaxonomyIndex
+
+    get_default_cache().invalidate()
+    http_client.client.http_cache().invalidate()
+    resolver.invalidate()
+    qi.taxonomy_index = TaxonomyIndex()
+
+def bench_families_in_class(server):
+    import quinsectz as qi
+    return qi.families_in_class("Insecta")
+
+def bench_sibling_families(server):
+    import quinsectz as qi
+    return qi.sibling_families("Ins0003idae")
+
+def bench_species_paginated_concurrent(server):
+    import quinsectz as qi
+    return asyncio.run(_close_after(qi.species_in_family_paginated_concurrent("Ins0003idae")))
+
+def bench_get_dataset_async(server):
+    import datasets
+    return asyncio.run(_close_after(datasets.get_dataset_async({'limit': 1000, 'offset': 0})))
+
+def bench_get_exact_taxon_id(server):
+    import taxon_id
+    return taxon_id.get_exact_taxon_id({'key': 3, 'scientificName': "Insecta"})
+
+def bench_select_random_image(server):
+    import image_requestor as imgr
+    # The genus key is looked up once, only the image selection is measured
+    genus_key = server.taxonomy.match("Ins000300us", "genus")['key']
+    return imgr.select_random_image(genus_key)
+
+def bench_save_image(server):
+    import image_requestor as imgr
+    # A fresh URL every call, otherwise the store answers from disk
+    bench_save_image.calls = getattr(bench_save_image, "calls", 0) + 1
+    return imgr.save_image(("Stub species", f"{server.url}images/bench-{bench_save_image.calls}.jpg"))
+
+def bench_match_many(server):
+    import taxon_id
+    # A checklist of 200 names with every name listed twice, matched against the stand-in dataset
+    names = [f"Ins{number:04d}idae" for number in range(100)] * 2
+
+    async def match_all():
+        filters = [taxon_id.TaxonFilter(key=3, scientificName=name) for name in names]
+        return [pair async for pair in taxon_id.match_many(filters)]
+    return asyncio.run(_close_after(match_all()))
+
+async def _close_after(coroutine):
+    try:
+        return await coroutine
+    finally:
+        await http_client.client.close_async()
+
+BENCHMARKS = {
+    "quinsectz.families_in_class": bench_families_in_class,
+    "quinsectz.sibling_families": bench_sibling_families,
+    "quinsectz.species_in_family_paginated_concurrent": bench_species_paginated_concurrent,
+    "datasets.get_dataset_async": bench_get_dataset_async,
+    "taxon_id.get_exact_taxon_id": bench_get_exact_taxon_id,
+    "taxon_id.match_many (200 names)": bench_match_many,
+    "image_requestor.select_random_image": bench_select_random_image,
+    "image_requestor.save_image": bench_save_image,
+}
+
+def run(name, function, iterations, concurrency, server, cold=True):
+    """
+    Call `function` `iterations` times on `concurrency` threads.
+
+    Cold calls (the default) each start from emptied caches. The caches are
+    shared by every thread, so another call would warm them halfway through:
+    cold calls need a concurrency of 1.
+
+    Returns:
+    dict: The benchmark's name, throughput, latency percentiles and failure count
+    """
+    if cold and concurrency > 1:
+        raise ValueError("Cold calls share the process-wide caches, run them with a concurrency of 1")
+
+    latencies = []
+    failures = []
+    requests_before = server.requests
+
+    # Warm calls share what the first ones fetched
+    if not cold:
+        reset_caches()
+
+    def timed_call(_):
+        if cold:
+            reset_caches()
+        start = time.perf_counter()
+        try:
+            function(server)
+        except Exception as e:
+            failures.append(e)
+            return
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed_call, range(iterations)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'name': name,
+        'calls': iterations,
+        'failures': len(failures),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'requests': server.requests - requests_before,
+    }
+
+def print_report(results):
+    print(f"{'benchmark':<50} {'calls':>6} {'fail':>5} {'req':>6} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        p50 = "-" if result['p50_ms'] is None else f"{result['p50_ms']:.1f}"
+        p99 = "-" if result['p99_ms'] is None else f"{result['p99_ms']:.1f}"
+        print(f"{result['name']:<50} {result['calls']:>6} {result['failures']:>5} {result['requests']:>6} "
+              f"{result['throughput']:>9.1f} {p50:>9} {p99:>9}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the client code against a local stand-in server")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1, help="threads calling at once, needs --warm above 1")
+    parser.add_argument("--warm", action="store_true", help="empty the caches once per benchmark instead of before every call")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the server adds to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests the server fails")
+    parser.add_argument("--only", action="append", help="run only benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--metrics", action="store_true", help="print the recorded metrics in Prometheus text format")
+    args = parser.parse_args(argv)
+    if args.concurrency > 1 and not args.warm:
+        parser.error("cold calls share the process-wide caches and run one at a time, pass --warm for --concurrency above 1")
+
+    # Caches, the image index and the image store all live under the working directory
+    os.chdir(tempfile.mkdtemp(prefix="quinsectz-bench-"))
+
+    with StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, retry_after=0, seed=1) as server:
+        http_client.set_base_urls(server.gbif_url, server.checklistbank_url)
+        # Injected errors should be retried quickly, the benchmark isn't about backoff
+        http_client.configure(http_client.ClientConfig(backoff_base=0.01, backoff_cap=0.1))
+
+        results = []
+        for name, function in BENCHMARKS.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            results.append(run(name, function, args.iterations, args.concurrency, server, cold=not args.warm))
+        http_client.client.close()
+
+    print_report(results)
+
+    # Where the adaptive crawl windows settled
+    import datasets
+    import quinsectz as qi
+    print(f"dataset window: {datasets.dataset_concurrency.snapshot()}")
+    print(f"species window: {qi.species_concurrency.snapshot()}")
+    import taxon_id
+    print(f"match window: {taxon_id.match_concurrency.snapshot()}")
+
+    if args.metrics:
+        import metrics
+        print(metrics.registry.to_prometheus(), end="")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Local stand-in for the GBIF and ChecklistBank endpoints the project uses.
+
+Serves canned, deterministic responses generated from a small synthetic
+taxonomy, with configurable latency and error injection, so the client code
+can be measured (and exercised) without touching the real APIs.
+
+Run it on its own with `python bench/stub_server.py --port 8080` and point the
+project at it through the GBIF_API_URL / CHECKLISTBANK_API_URL environment
+variables, or start it in-process with StubServer and http_client.set_base_urls.
+"""
+from aiohttp import web
+import argparse
+import asyncio
+import bisect
+import hashlib
+import io
+import random
+import socket
+import threading
+
+# The classes of the synthetic taxonomy, with their GBIF keys
+CLASSES = {"Insecta": 216, "Mammalia": 359}
+
+# Placeholder image returned for every occurrence, built once on first request
+_image_bytes = None
+
+def image_bytes():
+    global _image_bytes
+    if _image_bytes is None:
+        try:
+            from PIL import Image
+            buffer = io.BytesIO()
+            Image.new("RGB", (800, 600), (90, 140, 60)).save(buffer, "JPEG")
+            _image_bytes = buffer.getvalue()
+        except ImportError:
+            _image_bytes = b"\xff\xd8\xff\xe0" + bytes(4096) + b"\xff\xd9"
+    return _image_bytes
+
+
+class SyntheticTaxonomy:
+    """
+    A deterministic kingdom > phylum > class > order > family > genus > species tree.
+
+    Every species gets a fixed number of occurrences with images (some none),
+    so occurrence searches, counts and facets all agree with each other.
+    """
+
+    def __init__(self, orders=4, families=10, genera=5, species=10):
+        self.records = {}
+        self.children = {}
+        self.names = {}
+        self.occurrences = {}
+
+        kingdom = self._add(1, "Animalia", "KINGDOM", None)
+        phylum = self._add(54, "Arthropoda", "PHYLUM", kingdom)
+        next_key = 1000
+        for class_name, class_key in CLASSES.items():
+            taxon_class = self._add(class_key, class_name, "CLASS", phylum)
+            for o in range(orders):
+                next_key += 1
+                order = self._add(next_key, f"{class_name[:3]}order{o:02d}", "ORDER", taxon_class)
+                for f in range(families):
+                    next_key += 1
+                    family = self._add(next_key, f"{class_name[:3]}{o:02d}{f:02d}idae", "FAMILY", order)
+                    for g in range(genera):
+                        next_key += 1
+                        genus_name = f"{class_name[:3]}{o:02d}{f:02d}{g:02d}us"
+                        genus = self._add(next_key, genus_name, "GENUS", family)
+                        for s in range(species):
+                            next_key += 1
+                            self._add(next_key, f"{genus_name} stubus{s:02d}", "SPECIES", genus)
+                            # Every fifth species has no images at all
+                            self.occurrences[next_key] = (next_key % 5) * 7
+
+    def _add(self, key, name, rank, parent):
+        record = {
+            'key': key,
+            'nubKey': key,
+            'scientificName': name,
+            'canonicalName': name,
+            'rank': rank,
+            'taxonomicStatus': 'ACCEPTED',
+        }
+        if parent is not None:
+            record['parentKey'] = parent['key']
+            record['parent'] = parent['scientificName']
+            for higher in ('kingdom', 'phylum', 'class', 'order', 'family', 'genus'):
+                if higher in parent:
+                    record[higher] = parent[higher]
+                    record[higher + 'Key'] = parent[higher + 'Key']
+        if rank != 'SPECIES':
+            record[rank.lower()] = name
+            record[rank.lower() + 'Key'] = key
+        else:
+            record['species'] = name
+            record['speciesKey'] = key
+
+        self.records[key] = record
+        self.children.setdefault(key, [])
+        if parent is not None:
+            self.children[parent['key']].append(key)
+        self.names[(name.lower(), rank)] = key
+        self.names.setdefault((name.lower(), None), key)
+        return record
+
+    def match(self, name, rank=None):
+        key = self.names.get((name.strip().lower(), rank.upper() if rank else None))
+        if key is None:
+            key = self.names.get((name.strip().lower(), None))
+        return None if key is None else self.records[key]
+
+    def descendants(self, key, rank=None):
+        # Pre-order walk, so results come back in a stable order
+        found = []
+        stack = list(reversed(self.children.get(key, [])))
+        while stack:
+            child = stack.pop()
+            if rank is None or self.records[child]['rank'] == rank.upper():
+                found.append(self.records[child])
+            stack.extend(reversed(self.children[child]))
+        return found
+
+    def species_under(self, key):
+        if key in self.records and self.records[key]['rank'] == 'SPECIES':
+            return [self.records[key]]
+        return self.descendants(key, 'SPECIES')
+
+
+class StubServer:
+    """
+    The stand-in server, running its own event loop in a background thread.
+
+    Params:
+    latency (float): Seconds added to every response
+    jitter (float): Extra random seconds (uniform 0 to jitter) added to every response
+    error_rate (float): Fraction of requests answered with `error_status` instead
+    error_status (int): The injected error status (default is 503)
+    retry_after (float): Retry-After sent with injected errors, None to leave it out
+    datasets (int): Number of ChecklistBank datasets served by /dataset
+    seed (int): Seed of the latency/error randomness
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, retry_after=None, datasets=5000, seed=None, taxonomy=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.dataset_count = datasets
+        self.taxonomy = taxonomy or SyntheticTaxonomy()
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self._random = random.Random(seed)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    @property
+    def gbif_url(self):
+        return self.url + "v1/"
+
+    @property
+    def checklistbank_url(self):
+        return self.url
+
+    def app(self):
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/v1/species/match", self.species_match)
+        app.router.add_get("/v1/species/search", self.species_search)
+        app.router.add_get("/v1/species/{key}", self.species)
+        app.router.add_get("/v1/occurrence/search", self.occurrence_search)
+        app.router.add_get("/dataset", self.dataset_search)
+        app.router.add_get("/dataset/{key}/match/nameusage", self.nameusage_match)
+        app.router.add_get("/images/{name}", self.image)
+        return app
+
+    def start(self):
+        """
+        Start serving in a background thread and return the base URL.
+        """
+        # Bind first, so port 0 picks a free port we can report
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            self._loop.run_until_complete(web.SockSite(self._runner, sock).start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="stub-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        self.requests += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            headers = {} if self.retry_after is None else {"Retry-After": str(self.retry_after)}
+            return web.json_response({"error": "injected"}, status=self.error_status, headers=headers)
+        response = await handler(request)
+
+        # JSON bodies carry an ETag, so clients can revalidate them with If-None-Match
+        if response.status == 200 and response.content_type == "application/json":
+            etag = '"' + hashlib.sha1(response.body).hexdigest() + '"'
+            if request.headers.get("If-None-Match") == etag:
+                self.not_modified += 1
+                return web.Response(status=304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+        return response
+
+    async def species_match(self, request):
+        record = self.taxonomy.match(request.query.get("name", ""), request.query.get("rank"))
+        if record is None:
+            return web.json_response({"matchType": "NONE", "confidence": 100, "synonym": False})
+        match = dict(record, usageKey=record['key'], matchType="EXACT", confidence=99, synonym=False, status="ACCEPTED")
+        return web.json_response(match)
+
+    async def species(self, request):
+        record = self.taxonomy.records.get(_int(request.match_info["key"]))
+        if record is None:
+            raise web.HTTPNotFound()
+        return web.json_response(record)
+
+    async def species_search(self, request):
+        query = request.query
+        higher = _int(query.get("higherTaxonKey"))
+        results = self.taxonomy.descendants(higher, query.get("rank")) if higher is not None else []
+        if query.get("q"):
+            results = [record for record in results if query["q"].lower() in record['scientificName'].lower()]
+        return web.json_response(_page(results, query, "results", "count"))
+
+    async def occurrence_search(self, request):
+        query = request.query
+        taxon_key = _int(query.get("taxonKey", query.get("classKey")))
+        species = self.taxonomy.species_under(taxon_key) if taxon_key is not None else []
+
+        # Occurrences are numbered species by species, find the one at each offset with a bisect
+        counts = [self.taxonomy.occurrences[record['key']] for record in species]
+        ends = []
+        total = 0
+        for count in counts:
+            total += count
+            ends.append(total)
+
+        offset = _int(query.get("offset")) or 0
+        limit = min(_int(query.get("limit")) if query.get("limit") is not None else 20, 300)
+        results = []
+        for number in range(offset, min(offset + limit, total)):
+            record = species[bisect.bisect_right(ends, number)]
+            results.append({
+                'key': 10 ** 9 + number,
+                'species': record['scientificName'],
+                'speciesKey': record['key'],
+                'genusKey': record.get('genusKey'),
+                'familyKey': record.get('familyKey'),
+                'media': [{'type': 'StillImage', 'identifier': f"{self.url}images/{record['key']}-{number}.jpg"}],
+            })
+
+        data = {'offset': offset, 'limit': limit, 'endOfRecords': offset + limit >= total, 'count': total, 'results': results}
+
+        facets = []
+        for field in query.getall("facet", []):
+            totals = {}
+            for record, count in zip(species, counts):
+                value = record.get(field)
+                if count and value is not None:
+                    totals[value] = totals.get(value, 0) + count
+            facet_offset = _int(query.get(field + ".facetOffset")) or 0
+            facet_limit = _int(query.get(field + ".facetLimit")) or 10
+            values = sorted(totals.items(), key=lambda item: -item[1])[facet_offset:facet_offset + facet_limit]
+            facets.append({'field': field, 'counts': [{'name': str(key), 'count': count} for key, count in values]})
+        if facets:
+            data['facets'] = facets
+        return web.json_response(data)
+
+    async def dataset_search(self, request):
+        query = request.query
+        datasets = [
+            {'key': 1000 + number, 'title': f"Stub dataset {number}", 'alias': f"stub{number}",
+             'origin': 'EXTERNAL', 'type': 'TAXONOMIC', 'modified': f"2024-01-{number % 28 + 1:02d}T00:00:00"}
+            for number in range(self.dataset_count)
+        ]
+        if query.get("q"):
+            datasets = [dataset for dataset in datasets if query["q"].lower() in dataset['title'].lower()]
+        return web.json_response(_page(datasets, query, "result", "total"))
+
+    async def nameusage_match(self, request):
+        query = request.query
+        name = query.get("scientificName") or query.get("name") or query.get("q") or ""
+        record = self.taxonomy.match(name, query.get("rank"))
+        if record is None:
+            return web.json_response({"original": {"scientificName": name}, "type": "none", "issues": {}})
+        return web.json_response({
+            "original": {"scientificName": name},
+            "type": "exact",
+            "usage": {
+                "id": str(record['key']),
+                "name": {"scientificName": record['scientificName'], "rank": record['rank'].lower()},
+                "status": "accepted",
+            },
+            "issues": {},
+        })
+
+    async def image(self, request):
+        return web.Response(body=image_bytes(), content_type="image/jpeg")
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _page(items, query, results_name, count_name):
+    offset = _int(query.get("offset")) or 0
+    limit = _int(query.get("limit")) if query.get("limit") is not None else 20
+    return {
+        'offset': offset,
+        'limit': limit,
+        'endOfRecords': offset + limit >= len(items),
+        count_name: len(items),
+        results_name: items[offset:offset + limit],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve stand-in GBIF and ChecklistBank endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.error_status)
+    server.start()
+    print(f"GBIF_API_URL={server.gbif_url}")
+    print(f"CHECKLISTBANK_API_URL={server.checklistbank_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
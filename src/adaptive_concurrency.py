@@ -0,0 +1,168 @@
+from contextlib import asynccontextmanager
+import asyncio
+import collections
+import threading
+import time
+import http_client
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the number of requests a paged crawl keeps in flight.
+
+    Every request attempt made inside `slot()` is reported back by http_client.
+    While latencies stay within `latency_tolerance` times the recent median,
+    the limit grows by one per full window of good responses (additive
+    increase). A 429, a 5xx, a timeout or a connection error, or a latency
+    spike, cuts it by `backoff` (multiplicative decrease), at most once per
+    round trip so one burst of errors counts as one signal.
+
+    The same controller can be used from several event loops one after the
+    other, so a crawl starts at the limit the previous one ended with.
+    """
+
+    def __init__(self, initial=2, min_limit=1, max_limit=32, latency_tolerance=2.0, backoff=0.5, window=50):
+        if not 1 <= min_limit <= initial <= max_limit:
+            raise ValueError("Need 1 <= min_limit <= initial <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._latencies = collections.deque(maxlen=window)
+        self._good = 0
+        self._smoothed = None
+        self._cooldown_until = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fixed(cls, limit):
+        """
+        Return a controller that never moves off `limit`, for callers asking for a fixed concurrency.
+        """
+        return cls(initial=limit, min_limit=limit, max_limit=limit)
+
+    @property
+    def limit(self):
+        """
+        The current window: how many requests may be in flight.
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def snapshot(self):
+        """
+        Return the controller's state for monitoring.
+        """
+        with self._lock:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'baseline_ms': _median(self._latencies) * 1000 if self._latencies else None,
+                'smoothed_ms': self._smoothed * 1000 if self._smoothed is not None else None,
+                'increases': self.increases,
+                'decreases': self.decreases,
+            }
+
+    async def acquire(self):
+        while True:
+            with self._lock:
+                if self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    return
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                # Pass on a wake-up this waiter can no longer use
+                self._wake()
+                raise
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one slot of the window, reporting the requests made meanwhile back to the controller.
+        """
+        await self.acquire()
+        try:
+            with http_client.observe_attempts(self.observe):
+                yield
+        finally:
+            self.release()
+
+    def observe(self, status, seconds):
+        """
+        Feed back one request attempt: its HTTP status (None for timeouts and connection errors) and latency.
+        """
+        now = time.monotonic()
+        with self._lock:
+            congested = status is None or status == 429 or status >= 500
+            if not congested:
+                # The median, not the minimum, so ordinary jitter isn't taken for congestion
+                baseline = _median(self._latencies) if self._latencies else seconds
+                self._latencies.append(seconds)
+                self._smoothed = seconds if self._smoothed is None else 0.8 * self._smoothed + 0.2 * seconds
+                congested = seconds > baseline * self.latency_tolerance
+
+            if congested:
+                self._good = 0
+                if now >= self._cooldown_until:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self.decreases += 1
+                    # Requests already in flight saw the old window, wait a round trip before judging again
+                    self._cooldown_until = now + (self._smoothed or seconds or 0.0)
+                return
+
+            self._good += 1
+            if self._good >= int(self._limit) and self._limit < self.max_limit:
+                self._good = 0
+                self._limit = min(self.max_limit, int(self._limit) + 1)
+                self.increases += 1
+                grown = True
+            else:
+                grown = False
+        if grown:
+            self._wake()
+
+    def _wake(self):
+        # Hand the free slots to waiting coroutines, on whichever loop each one runs
+        with self._lock:
+            free = int(self._limit) - self._in_flight
+            waiters = [self._waiters.popleft() for _ in range(max(0, min(free, len(self._waiters))))]
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+
+
+def _median(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2]
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+def as_limiter(max_concurrent, default):
+    """
+    Turn a max_concurrent argument into a controller: None means `default`, an int a fixed limit.
+    """
+    if max_concurrent is None:
+        return default
+    if isinstance(max_concurrent, AdaptiveConcurrency):
+        return max_concurrent
+    return AdaptiveConcurrency.fixed(max_concurrent)
@@ -0,0 +1,432 @@
+from array import array
+from bisect import bisect_left
+import io
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+from ranks import Rank, UNORDERED_RANKS, parse_rank
+
+logger = logging.getLogger(__name__)
+
+# Name of the core file inside the GBIF backbone Darwin Core Archive (backbone.zip)
+TAXON_MEMBER = "Taxon.tsv"
+
+# Rank codes are the Rank ordinals, so comparing two codes compares the ranks
+RANK_CODES = {rank.value: rank.ordinal for rank in Rank}
+RANKS = list(Rank)
+
+# Traversals walk through these instead of stopping
+_UNORDERED_RANKS = {rank.ordinal for rank in UNORDERED_RANKS}
+
+# Taxonomic statuses as spelled by the GBIF species API
+STATUSES = ["ACCEPTED", "DOUBTFUL", "SYNONYM", "HETEROTYPIC_SYNONYM", "HOMOTYPIC_SYNONYM", "PROPARTE_SYNONYM", "MISAPPLIED"]
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Array files of a saved store and their type codes. Row and name ids are "i", 32 bits on every
+# platform where "l" is 64 bits on Linux but 32 on Windows; only GBIF keys get 64 bits
+_COLUMNS = {
+    "keys": "q",
+    "parents": "i",
+    "ranks": "B",
+    "statuses": "B",
+    "canonical": "i",
+    "scientific": "i",
+    "child_offsets": "i",
+    "children": "i",
+}
+
+def _layout():
+    # How the array files are written here, recorded in meta.json and checked on load
+    return {
+        "byteorder": sys.byteorder,
+        "columns": {column: [typecode, array(typecode).itemsize] for column, typecode in _COLUMNS.items()},
+    }
+
+
+class BackboneStore:
+    """
+    Compact in-memory copy of the GBIF backbone taxonomy.
+
+    Every taxon is a row index into a set of parallel arrays: its GBIF key, the row
+    index of its parent (-1 for roots), a rank code, a status code and ids into the
+    interned name table. Children are kept as a CSR adjacency list so descending the
+    tree never touches a dictionary.
+    """
+
+    def __init__(self, keys, parents, ranks, statuses, canonical, scientific, names, child_offsets=None, children=None):
+        self.keys = keys
+        self.parents = parents
+        self.ranks = ranks
+        self.statuses = statuses
+        self.canonical = canonical
+        self.scientific = scientific
+        self.names = names
+
+        if child_offsets is None or children is None:
+            child_offsets, children = _build_children(parents)
+        self.child_offsets = child_offsets
+        self.children = children
+
+        # Built on the first name lookup, most processes only need a handful of them
+        self._name_ids = None
+        self._name_offsets = None
+        self._name_rows = None
+
+        # Rank code -> the row of every taxon's closest ancestor at that rank, built on first use
+        self._ancestor_columns = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, store_dir):
+        """
+        Load a store previously written with `save` or `import_backbone`.
+
+        Raises ValueError if the store's array files were written with another
+        layout (item sizes or byte order) than this platform reads.
+        """
+        with open(os.path.join(store_dir, "meta.json")) as f:
+            meta = json.load(f)
+        layout = {"byteorder": meta.get("byteorder"), "columns": meta.get("columns")}
+        if layout != _layout():
+            raise ValueError(
+                f"The backbone store in {store_dir} was written with the array layout {layout}, "
+                f"this version reads {_layout()}: import it again"
+            )
+
+        columns = {}
+        for column, typecode in _COLUMNS.items():
+            values = array(typecode)
+            path = os.path.join(store_dir, column + ".bin")
+            with open(path, "rb") as f:
+                values.frombytes(f.read())
+            columns[column] = values
+
+        with open(os.path.join(store_dir, "names.txt"), encoding="utf-8") as f:
+            names = f.read().split("\n")
+
+        return cls(names=names, **columns)
+
+    def save(self, store_dir, source=None):
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+
+        for column in _COLUMNS:
+            with open(os.path.join(store_dir, column + ".bin"), "wb") as f:
+                getattr(self, column).tofile(f)
+
+        with open(os.path.join(store_dir, "names.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(self.names))
+
+        meta = {"taxa": len(self.keys), "names": len(self.names), "source": source, "created": time.time(), **_layout()}
+        with open(os.path.join(store_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def row_of_key(self, key):
+        """
+        Return the row of a GBIF taxon key, or None if the store doesn't have it.
+        """
+        row = bisect_left(self.keys, key)
+        if row < len(self.keys) and self.keys[row] == key:
+            return row
+        return None
+
+    def lookup(self, name, rank=None):
+        """
+        Find the row of a name, the offline equivalent of species.name_backbone.
+
+        Accepted names are preferred over doubtful ones and those over synonyms.
+
+        Params:
+        name (str): The canonical or full scientific name (case-insensitive)
+        rank (str or Rank): Optional rank the match must have (e.g. 'family')
+
+        Returns:
+        int: The row of the best match, or None if there is no match
+        """
+        if self._name_ids is None:
+            self._build_name_index()
+
+        name_id = self._name_ids.get(name.strip().lower())
+        if name_id is None:
+            return None
+
+        rank_code = parse_rank(rank).ordinal if rank else None
+        best = None
+        for position in range(self._name_offsets[name_id], self._name_offsets[name_id + 1]):
+            row = self._name_rows[position]
+            if rank_code is not None and self.ranks[row] != rank_code:
+                continue
+            if best is None or self.statuses[row] < self.statuses[best]:
+                best = row
+        return best
+
+    def descendants_at_rank(self, row, rank, limit=None, status=None):
+        """
+        Return the rows of all descendants of `row` at `rank`.
+
+        The walk stops at the requested rank and never enters lower ones, so asking for
+        the families of a class only visits the orders and superfamilies in between.
+
+        Params:
+        row (int): The ancestor's row
+        rank (str or Rank): The rank of the descendants to collect (e.g. 'family')
+        limit (int): Maximum number of rows to return (default is all of them)
+        status (str): Optional taxonomic status the descendants must have (e.g. 'accepted')
+        """
+        target = parse_rank(rank).ordinal
+        status_code = STATUS_CODES[status.upper()] if status else None
+
+        found = []
+        stack = [row]
+        while stack:
+            current = stack.pop()
+            for position in range(self.child_offsets[current + 1] - 1, self.child_offsets[current] - 1, -1):
+                child = self.children[position]
+                child_rank = self.ranks[child]
+                if child_rank == target:
+                    if status_code is None or self.statuses[child] == status_code:
+                        found.append(child)
+                        if limit is not None and len(found) >= limit:
+                            return found
+                elif child_rank < target or child_rank in _UNORDERED_RANKS:
+                    stack.append(child)
+        return found
+
+    def ancestor_at_rank(self, row, rank):
+        """
+        Return the row of the closest ancestor of `row` at `rank`, or None.
+
+        Major ranks are answered from a per-rank ancestor column, one array index
+        once the column exists. Other ranks walk up the parents.
+        """
+        rank = parse_rank(rank)
+        if rank.major_index is not None:
+            ancestor = self.ancestor_column(rank)[row]
+            return None if ancestor == -1 else ancestor
+
+        target = rank.ordinal
+        current = self.parents[row]
+        while current != -1:
+            if self.ranks[current] == target:
+                return current
+            current = self.parents[current]
+        return None
+
+    def ancestor_column(self, rank):
+        """
+        Return an array holding, for every row, the row of its closest ancestor at `rank` (-1 for none).
+
+        Each column costs one array item per taxon, so they are built only for the
+        ranks that get asked for.
+        """
+        rank_code = parse_rank(rank).ordinal
+        column = self._ancestor_columns.get(rank_code)
+        if column is None:
+            column = self._ancestor_columns[rank_code] = self._build_ancestor_column(rank_code)
+        return column
+
+    def record(self, row):
+        """
+        Build a dictionary with the same fields GBIF species search results carry.
+        """
+        key = self.keys[row]
+        parent = self.parents[row]
+        record = {
+            "key": key,
+            "nubKey": key,
+            "scientificName": self.names[self.scientific[row]],
+            "canonicalName": self.names[self.canonical[row]],
+            "rank": RANKS[self.ranks[row]].value,
+            "taxonomicStatus": STATUSES[self.statuses[row]],
+        }
+        if parent != -1:
+            record["parentKey"] = self.keys[parent]
+            record["parent"] = self.names[self.canonical[parent]]
+
+        # Fill in the major ranks from the taxon itself up to the root
+        current = row
+        while current != -1:
+            rank = RANKS[self.ranks[current]]
+            if rank.major_index is not None and rank.key_field not in record:
+                record[rank.value.lower()] = self.names[self.canonical[current]]
+                record[rank.key_field] = self.keys[current]
+            current = self.parents[current]
+        return record
+
+    def _build_ancestor_column(self, rank_code):
+        column = array("i", [-1]) * len(self.keys)
+
+        # Walk down from the roots, handing every child its parent's answer
+        stack = [row for row, parent in enumerate(self.parents) if parent == -1]
+        while stack:
+            row = stack.pop()
+            inherited = row if self.ranks[row] == rank_code else column[row]
+            for position in range(self.child_offsets[row], self.child_offsets[row + 1]):
+                child = self.children[position]
+                column[child] = inherited
+                stack.append(child)
+        return column
+
+    def _build_name_index(self):
+        name_ids = {}
+        for name_id, name in enumerate(self.names):
+            name_ids.setdefault(name.lower(), name_id)
+
+        # Both the canonical and the full scientific name of a taxon point at its row
+        lowered = array("i", (name_ids[name.lower()] for name in self.names))
+
+        def row_name_ids(row):
+            canonical_id = lowered[self.canonical[row]]
+            scientific_id = lowered[self.scientific[row]]
+            return (canonical_id,) if canonical_id == scientific_id else (canonical_id, scientific_id)
+
+        # Count rows per name, prefix sum into offsets, then fill in a second pass
+        offsets = array("i", bytes(array("i").itemsize * (len(self.names) + 1)))
+        for row in range(len(self.keys)):
+            for name_id in row_name_ids(row):
+                offsets[name_id + 1] += 1
+
+        for name_id in range(len(self.names)):
+            offsets[name_id + 1] += offsets[name_id]
+
+        rows = array("i", bytes(array("i").itemsize * offsets[-1]))
+        fill = array("i", offsets)
+        for row in range(len(self.keys)):
+            for name_id in row_name_ids(row):
+                rows[fill[name_id]] = row
+                fill[name_id] += 1
+
+        self._name_ids = name_ids
+        self._name_offsets = offsets
+        self._name_rows = rows
+
+
+def _build_children(parents):
+    # Count children per parent, then prefix sum into offsets and fill
+    count = len(parents)
+    offsets = array("i", bytes(array("i").itemsize * (count + 1)))
+    for parent in parents:
+        if parent != -1:
+            offsets[parent + 1] += 1
+
+    for row in range(count):
+        offsets[row + 1] += offsets[row]
+
+    children = array("i", bytes(array("i").itemsize * offsets[count]))
+    fill = array("i", offsets)
+    for row, parent in enumerate(parents):
+        if parent != -1:
+            children[fill[parent]] = row
+            fill[parent] += 1
+    return offsets, children
+
+
+def _open_taxon_file(archive_path):
+    # Accept both the zipped archive and an already extracted Taxon.tsv
+    if zipfile.is_zipfile(archive_path):
+        archive = zipfile.ZipFile(archive_path)
+        member = next(name for name in archive.namelist() if os.path.basename(name) == TAXON_MEMBER)
+        return io.TextIOWrapper(archive.open(member), encoding="utf-8", newline="")
+    return open(archive_path, encoding="utf-8", newline="")
+
+
+def import_backbone(archive_path, store_dir=None, accepted_only=True, progress_every=1000000):
+    """
+    Stream the GBIF backbone Darwin Core Archive into a BackboneStore.
+
+    The Taxon.tsv file is read line by line, so the archive is never extracted and
+    only the compact columns are kept in memory.
+
+    Params:
+    archive_path (str): Path to backbone.zip (or an extracted Taxon.tsv)
+    store_dir (str): Directory the store is saved to (default is not to save it)
+    accepted_only (bool): Skip synonyms, which are about half of the backbone (default is True)
+    progress_every (int): Log progress at INFO level every this many lines (0 to disable)
+
+    Returns:
+    BackboneStore: The imported store
+    """
+    keys = array("q")
+    parent_keys = array("q")
+    ranks = array("B")
+    statuses = array("B")
+    canonical = array("i")
+    scientific = array("i")
+
+    names = []
+    name_ids = {}
+
+    def intern(name):
+        name_id = name_ids.get(name)
+        if name_id is None:
+            name_id = len(names)
+            name_ids[name] = name_id
+            names.append(name)
+        return name_id
+
+    with _open_taxon_file(archive_path) as f:
+        header = f.readline().rstrip("\r\n").split("\t")
+        column = {name: index for index, name in enumerate(header)}
+        key_col = column["taxonID"]
+        parent_col = column["parentNameUsageID"]
+        scientific_col = column["scientificName"]
+        canonical_col = column["canonicalName"]
+        rank_col = column["taxonRank"]
+        status_col = column["taxonomicStatus"]
+
+        for line_number, line in enumerate(f, 1):
+            fields = line.rstrip("\r\n").split("\t")
+
+            status = fields[status_col].upper().replace(" ", "_")
+            status_code = STATUS_CODES.get(status)
+            if status_code is None or (accepted_only and status_code > STATUS_CODES["DOUBTFUL"]):
+                continue
+
+            keys.append(int(fields[key_col]))
+            parent = fields[parent_col]
+            parent_keys.append(int(parent) if parent else -1)
+            ranks.append(parse_rank(fields[rank_col], Rank.UNRANKED).ordinal)
+            statuses.append(status_code)
+            scientific.append(intern(fields[scientific_col]))
+            canonical.append(intern(fields[canonical_col] or fields[scientific_col]))
+
+            if progress_every and line_number % progress_every == 0:
+                logger.info("Imported %d lines, kept %d taxa", line_number, len(keys))
+
+    # Sort every column by key so keys can be found with a binary search
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    keys = array("q", (keys[row] for row in order))
+    ranks = array("B", (ranks[row] for row in order))
+    statuses = array("B", (statuses[row] for row in order))
+    canonical = array("i", (canonical[row] for row in order))
+    scientific = array("i", (scientific[row] for row in order))
+
+    # Turn parent keys into parent rows, parents that were skipped become roots
+    parents = array("i")
+    for row in order:
+        parent_key = parent_keys[row]
+        parent_row = bisect_left(keys, parent_key) if parent_key != -1 else len(keys)
+        parents.append(parent_row if parent_row < len(keys) and keys[parent_row] == parent_key else -1)
+
+    store = BackboneStore(keys, parents, ranks, statuses, canonical, scientific, names)
+    if store_dir is not None:
+        store.save(store_dir, source=os.path.abspath(archive_path))
+    return store
+
+
+if __name__ == "__main__":
+    # Example usage: python backbone_store.py backbone.zip backbone
+    archive = sys.argv[1] if len(sys.argv) > 1 else "backbone.zip"
+    target = sys.argv[2] if len(sys.argv) > 2 else "backbone"
+
+    # Show the import progress
+    logging.basicConfig(level=logging.INFO)
+
+    start_time = time.time()
+    imported = import_backbone(archive, target)
+    print(f"Imported {len(imported)} taxa into {target} in {time.time() - start_time:.2f} seconds")
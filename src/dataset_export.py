@@ -0,0 +1,139 @@
+import asyncio
+import gzip
+import json
+import sys
+import http_client
+from datasets import iter_dataset_pages
+from lazy_loading import lazy_import
+
+# Parquet export is optional, it needs pyarrow, which is only loaded by the first ParquetSink
+pyarrow = lazy_import("pyarrow", optional=True)
+
+class NdjsonSink:
+    """
+    Writes records as newline-delimited JSON, one page at a time (gzip-compressed if the path ends in .gz).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+
+    def write_page(self, records):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False))
+            self._file.write("\n")
+        self._file.flush()
+        self.count += len(records)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetSink:
+    """
+    Writes records to a Parquet file, one row group per page.
+
+    The columns are `columns`, or the keys of the first page's records; keys
+    that show up later are left out. Nested values are stored as JSON strings.
+    """
+
+    def __init__(self, path, columns=None):
+        if pyarrow is None:
+            raise ImportError("Parquet export needs pyarrow, install it or export NDJSON instead")
+        # Binds pyarrow.parquet, which importing pyarrow alone doesn't
+        lazy_import("pyarrow.parquet")
+        self.path = path
+        self.columns = list(columns) if columns else None
+        self.count = 0
+        self._schema = None
+        self._writer = None
+
+    def write_page(self, records):
+        if not records:
+            return
+        if self.columns is None:
+            self.columns = list(dict.fromkeys(key for record in records for key in record))
+
+        data = {column: [_flatten(record.get(column)) for record in records] for column in self.columns}
+        if self._schema is None:
+            table = pyarrow.table(data)
+            # Columns that were empty on the first page can only be typed as strings
+            self._schema = pyarrow.schema([
+                pyarrow.field(field.name, pyarrow.string()) if pyarrow.types.is_null(field.type) else field
+                for field in table.schema
+            ])
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema)
+        table = pyarrow.table(data, schema=self._schema)
+        self._writer.write_table(table)
+        self.count += len(records)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _flatten(value):
+    # Parquet columns need one type, nested records and lists go in as JSON
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def open_sink(path, columns=None):
+    """
+    Return the sink matching a file name: Parquet for .parquet, NDJSON otherwise.
+    """
+    if path.endswith(".parquet"):
+        return ParquetSink(path, columns)
+    return NdjsonSink(path)
+
+async def export_datasets(sink, search_filters=None, size=None, max_concurrent=None):
+    """
+    Stream datasets into a sink page by page, in offset order.
+
+    Params:
+    sink (NdjsonSink or ParquetSink): Where the datasets are written, closed by the caller
+    search_filters (dict): Parameters for filtering datasets
+    size (int): Number of datasets to export (or None for all)
+    max_concurrent (int): Maximum number of pages in flight (default adapts to the server)
+
+    Returns:
+    int: The number of datasets written
+    """
+    written = 0
+    pages = iter_dataset_pages(search_filters, size, max_concurrent)
+    try:
+        async for _, results in pages:
+            sink.write_page(results)
+            written += len(results)
+    finally:
+        await pages.aclose()
+    return written
+
+
+async def main(path):
+    with open_sink(path) as sink:
+        count = await export_datasets(sink, {'limit': 1000, 'offset': 0})
+    print(f"Exported {count} datasets to {path}.")
+
+    # Close the pooled connections of this event loop
+    await http_client.client.close_async()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "datasets.ndjson"))
@@ -0,0 +1,195 @@
+from dataclasses import dataclass, asdict
+from typing import Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import http_client
+from datasets import DatasetFilter, SortBy, iter_dataset_pages
+
+logger = logging.getLogger(__name__)
+
+# Default location of the local dataset store
+DEFAULT_STORE_PATH = os.path.join("cache", "datasets.sqlite")
+
+@dataclass
+class SyncResult:
+    full: bool # Whether the whole catalogue was crawled
+    fetched: int = 0
+    inserted: int = 0
+    updated: int = 0
+    removed: int = 0 # Datasets gone from the catalogue, only found by full crawls
+    high_water_mark: Optional[str] = None # The latest `modified` timestamp stored
+
+
+class DatasetStore:
+    """
+    Local SQLite copy of the ChecklistBank dataset catalogue.
+
+    Datasets are upserted by key. The store also keeps the high-water mark of
+    the sync: the latest `modified` timestamp it has seen.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        # Create the store directory if it doesn't exist
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS datasets ("
+            " key INTEGER PRIMARY KEY,"
+            " modified TEXT,"
+            " data TEXT NOT NULL,"
+            " synced_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def upsert_many(self, datasets, synced_at=None):
+        """
+        Insert or update datasets by key.
+
+        Returns:
+        tuple: The number of datasets inserted and updated (unchanged ones count as neither)
+        """
+        synced_at = synced_at or time.time()
+        inserted = updated = 0
+        with self._lock:
+            for dataset in datasets:
+                row = self._conn.execute("SELECT modified FROM datasets WHERE key = ?", (dataset['key'],)).fetchone()
+                if row is None:
+                    inserted += 1
+                elif row[0] != dataset.get('modified'):
+                    updated += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO datasets (key, modified, data, synced_at) VALUES (?, ?, ?, ?)",
+                    (dataset['key'], dataset.get('modified'), json.dumps(dataset), synced_at)
+                )
+            self._conn.commit()
+        return inserted, updated
+
+    def remove_not_synced_since(self, synced_at):
+        """
+        Drop the datasets a full crawl started at `synced_at` didn't return. Returns how many.
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM datasets WHERE synced_at < ?", (synced_at,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM datasets WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def iter_datasets(self):
+        """
+        Yield every stored dataset, in key order.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM datasets ORDER BY key").fetchall()
+        for row in rows:
+            yield json.loads(row[0])
+
+    def high_water_mark(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE name = 'high_water_mark'").fetchone()
+        return None if row is None else row[0]
+
+    def set_high_water_mark(self, modified):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (name, value) VALUES ('high_water_mark', ?)", (modified,)
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM datasets").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+async def sync_datasets(store=None, full=False, search_filters=None, max_concurrent=None):
+    """
+    Bring a DatasetStore up to date with the ChecklistBank catalogue.
+
+    The first run (or any run with full=True) crawls the whole catalogue and drops
+    the stored datasets it no longer lists. Later runs only ask for datasets
+    modified since the high-water mark and upsert them. The mark only moves once
+    a run has gone through without errors, so a failed run is simply repeated.
+
+    Params:
+    store (DatasetStore): The local store (default is DatasetStore())
+    full (bool): Crawl everything even if the store has a high-water mark (default is False)
+    search_filters (DatasetFilter): Extra filters, e.g. a dataset type (default is every dataset)
+    max_concurrent (int): Maximum number of pages in flight (default adapts to the server)
+
+    Returns:
+    SyncResult: What the run fetched and changed
+    """
+    if store is None:
+        store = DatasetStore()
+    high_water_mark = store.high_water_mark()
+    full = full or high_water_mark is None
+
+    filters = asdict(search_filters or DatasetFilter())
+    filters.update(offset=0, sortBy=SortBy.MODIFIED)
+    if not full:
+        # The API filters by day, the datasets of the mark's own day come again and are upserted unchanged
+        filters['modified'] = high_water_mark[:10]
+
+    result = SyncResult(full=full, high_water_mark=high_water_mark)
+    started_at = time.time()
+
+    # Bypass the HTTP cache, a stale page would hide the very changes the sync is after
+    pages = iter_dataset_pages(filters, max_concurrent=max_concurrent, cache_mode=None)
+    try:
+        async for _, results in pages:
+            inserted, updated = store.upsert_many(results, started_at)
+            result.fetched += len(results)
+            result.inserted += inserted
+            result.updated += updated
+            for dataset in results:
+                modified = dataset.get('modified')
+                if modified and (result.high_water_mark is None or modified > result.high_water_mark):
+                    result.high_water_mark = modified
+    finally:
+        await pages.aclose()
+
+    if full:
+        result.removed = store.remove_not_synced_since(started_at)
+    if result.high_water_mark is not None:
+        store.set_high_water_mark(result.high_water_mark)
+
+    logger.info("Synced %d datasets (%s): %d new, %d updated, %d removed", result.fetched,
+                "full" if full else "since " + high_water_mark, result.inserted, result.updated, result.removed)
+    return result
+
+
+async def main(full):
+    store = DatasetStore()
+    try:
+        await sync_datasets(store, full=full)
+    finally:
+        store.close()
+        # Close the pooled connections of this event loop
+        await http_client.client.close_async()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the local ChecklistBank dataset store")
+    parser.add_argument("--full", action="store_true", help="crawl the whole catalogue instead of the changes")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().full))
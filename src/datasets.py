@@ -1,10 +1,14 @@
-import requests
 from dataclasses import dataclass, asdict
 from typing import List, Optional
 from enum import Enum
 import asyncio
-import aiohttp
+import collections
+import logging
 import time
+import http_client
+from adaptive_concurrency import AdaptiveConcurrency, as_limiter
+
+logger = logging.getLogger(__name__)
 
 class Code(Enum):
     BACTERIAL = "BACTERIAL"
@@ -110,89 +114,116 @@ class DatasetFilter:
 # Base URL for the Catalogue of Life ChecklistBank API
 SEARCH_URL = "https://api.checklistbank.org/nameusage/search"
 
-# URL for dataset searching
-BASE_URL = "https://api.checklistbank.org/"
+# Endpoint for dataset searching, under http_client.CHECKLISTBANK_API_URL
 DATASET_ENDPOINT = "dataset"
 
-async def fetch_dataset_page(session, search_filters, offset):
+# Pages are revalidated before use: a crawl by offset mixing pages of different ages could skip or repeat
+# datasets when the listing shifted in between, callers that can live with that may pass STALE_WHILE_REVALIDATE
+DATASET_CACHE_MODE = http_client.CacheMode.REVALIDATE
+
+# Shared by every dataset crawl, so each one starts from the window the last one settled on
+dataset_concurrency = AdaptiveConcurrency(initial=2, max_limit=16)
+
+async def fetch_dataset_page(search_filters, offset, cache_mode=DATASET_CACHE_MODE):
     """
-    Fetch a single page of datasets asynchronously using aiohttp.
+    Fetch a single page of datasets asynchronously over the shared pooled client.
+
+    Pages go through the HTTP cache with `cache_mode`, None always downloads them.
     """
-    url = BASE_URL + DATASET_ENDPOINT
-    search_filters['offset'] = offset
+    url = http_client.CHECKLISTBANK_API_URL + DATASET_ENDPOINT
+
+    # Copy the filters, concurrent pages must not share the offset
+    params = dict(search_filters, offset=offset)
     
-    # Log before making the request
-    print(f"Making request for offset: {offset}")
+    logger.debug("Making request for offset: %d", offset)
+
+    data = await http_client.get_json_async(url, params=params, cache_mode=cache_mode)
 
-    async with session.get(url, params=search_filters) as response:
-        response.raise_for_status()
-        data = await response.json()
+    logger.debug("Received response for offset: %d", offset)
 
-        # Log after receiving the response
-        print(f"Received response for offset: {offset}")
+    return data.get('result', []), data.get('total', 0)
 
-        return data.get('result', []), data.get('total', 0)
 
+async def iter_dataset_pages(search_filters=None, size=None, max_concurrent=None, cache_mode=DATASET_CACHE_MODE):
+    """
+    Yield (offset, datasets) pages in offset order, each as soon as every page before it has arrived.
+
+    The first page is fetched on its own to learn the total. After that no more
+    pages are in flight than the concurrency window allows and nothing further
+    ahead is requested, so only a few pages are held in memory whatever the
+    catalogue size. Closing the generator early cancels the pages still in flight.
+
+    Params:
+    search_filters (dict): Parameters for filtering datasets
+    size (int): Number of datasets to retrieve (or None to fetch all)
+    max_concurrent (int or AdaptiveConcurrency): Pages in flight, a fixed number or a controller
+        (default is the adaptive dataset_concurrency)
+    cache_mode (http_client.CacheMode): How pages go through the HTTP cache
+    """
+    if search_filters is None:
+        search_filters = {}
 
-async def get_dataset_async(search_filters=None, size=None, max_concurrent=2):
+    limit = search_filters.get('limit') or 1000  # Max limit per request is 1000
+    offset = search_filters.get('offset') or 0
+    concurrency = as_limiter(max_concurrent, dataset_concurrency)
+
+    async def fetch_in_window(page_offset):
+        async with concurrency.slot():
+            return await fetch_dataset_page(search_filters, page_offset, cache_mode)
+
+    # First request to get the total number of datasets and first page of results
+    first_page, total_datasets = await fetch_in_window(offset)
+    end = total_datasets if size is None else min(total_datasets, offset + size)
+    yield offset, first_page[:max(0, end - offset)]
+
+    offsets = iter(range(offset + limit, end, limit))
+    pending = collections.deque()
+    try:
+        while True:
+            # Keep the window full, the head page is awaited while the others keep loading
+            while len(pending) < concurrency.limit:
+                page_offset = next(offsets, None)
+                if page_offset is None:
+                    break
+                task = asyncio.create_task(fetch_in_window(page_offset))
+                pending.append((page_offset, task))
+
+            if not pending:
+                return
+
+            page_offset, task = pending.popleft()
+            results, _ = await task
+            yield page_offset, results[:end - page_offset]
+    finally:
+        # Stop whatever is still pending when the caller stops early
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+
+async def get_dataset_async(search_filters=None, size=None, max_concurrent=None, cache_mode=DATASET_CACHE_MODE):
     """
     Retrieve datasets asynchronously using aiohttp and asyncio.
+
+    Holds every dataset in memory, use iter_dataset_pages or dataset_export to stream large catalogues.
     
     Parameters:
     - search_filters (dict): Parameters for filtering datasets.
     - size (int): Number of datasets to retrieve (or None to fetch all).
-    - max_concurrent (int): Maximum number of concurrent requests.
+    - max_concurrent (int): Maximum number of concurrent requests (default adapts to the server).
+    - cache_mode (http_client.CacheMode): How pages go through the HTTP cache (default revalidates every page).
     
     Returns:
     list: A list of datasets
     """
-    if search_filters is None:
-        search_filters = {}
-
-    limit = search_filters.get('limit', 1000)  # Max limit per request is 1000
-    offset = search_filters.get('offset', 0)
-    
     datasets = []
-    total_datasets = None
-    total_fetched = 0
-    
-    async with aiohttp.ClientSession() as session:
-        # First request to get the total number of datasets and first page of results
-        initial_results, total_datasets = await fetch_dataset_page(session, search_filters, offset)
-        datasets.extend(initial_results)
-        total_fetched += len(initial_results)
-
-        # If we already fetched everything in the first call
-        if size is None:
-            size = total_datasets
-
-        if total_fetched >= size:
-            return datasets[:size]
-
-        # Calculate remaining offsets and schedule tasks
-        tasks = []
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def fetch_with_semaphore(offset):
-            async with semaphore:
-                return await fetch_dataset_page(session, search_filters, offset)
-
-        offsets = range(offset + limit, size, limit)
-        for page_offset in offsets:
-            tasks.append(fetch_with_semaphore(page_offset))
-
-        # Gather all results concurrently
-        results = await asyncio.gather(*tasks)
-
-        # Extend dataset with results from all concurrent pages
-        for result in results:
-            datasets.extend(result[0])  # result[0] contains the 'result' from fetch_dataset_page
-            total_fetched += len(result[0])
-
-            if total_fetched >= size:
-                return datasets[:size]
-
-    return datasets[:total_datasets]
+    pages = iter_dataset_pages(search_filters, size, max_concurrent, cache_mode)
+    try:
+        async for _, results in pages:
+            datasets.extend(results)
+    finally:
+        await pages.aclose()
+    return datasets
 
 async def print_elapsed_time():
     """
@@ -217,7 +248,7 @@ async def main():
     )
         
     # Run both the dataset fetch and the elapsed time tracker concurrently
-    fetch_task = asyncio.create_task(get_dataset_async(search_filters=asdict(search_filters), size=55000, max_concurrent=2))
+    fetch_task = asyncio.create_task(get_dataset_async(search_filters=asdict(search_filters), size=55000))
     timer_task = asyncio.create_task(print_elapsed_time())  # Track elapsed time while fetching datasets
 
     # Wait for the dataset fetching task to complete
@@ -229,6 +260,9 @@ async def main():
 
     print(f"Retrieved {len(datasets)} datasets.")
 
+    # Close the pooled connections of this event loop
+    await http_client.client.close_async()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
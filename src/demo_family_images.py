@@ -1,21 +1,35 @@
 import quinsectz as qi
 import image_scraper as img
+from driver_pool import DriverPool
 import random
+import logging
 
-# Define the class name
-class_name = "Insecta"
+def main():
+    # Define the class name
+    class_name = "Insecta"
 
-# Get the family list
-family_list = qi.families_in_class(class_name)
+    # Get the family list
+    family_list = qi.families_in_class(class_name)
 
-# Select random family
-random_family = random.choice(family_list)
+    # Select random family
+    random_family = random.choice(family_list)
 
-# Print the randomly selected family's name
-print("Randomly selected family:", random_family['scientificName'])
+    # Print the randomly selected family's name
+    print("Randomly selected family:", random_family['scientificName'])
 
-#Get Image
-usage_key = random_family['key']
-print("Taxon key:",usage_key)
-url = "https://www.gbif.org/occurrence/gallery?taxon_key=" + str(usage_key) + "&occurrence_status=present"
-img.scrape_random_species_text_dynamic(url)
\ No newline at end of file
+    #Get Image
+    usage_key = random_family['key']
+    print("Taxon key:",usage_key)
+    url = "https://www.gbif.org/occurrence/gallery?taxon_key=" + str(usage_key) + "&occurrence_status=present"
+    pool = DriverPool(size=1)
+    try:
+        with pool.driver() as lease:
+            print("Scraped species:", img.scrape_gallery(lease, url))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    # Show what the scraper logs, e.g. a gallery without images
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,37 @@
+import quinsectz as qi
+import image_scraper as img
+from image_source import ApiImageSource, HedgedImageSource, ScraperImageSource
+from question_pipeline import QuestionPipeline, make_source_question_builder
+from quiz_ui import show_quiz
+import queue
+import logging
+
+def main():
+    url_queue = queue.Queue()
+    species_queue = queue.Queue()
+
+    # The browser only gets used when the API is slow, one driver is enough
+    scraper_pool, scraper_threads = img.start_scrapers(url_queue, species_queue, workers=1)
+
+    # Define the class name
+    class_name = "Insecta"
+
+    # Warm the taxonomy cache before the producers start drawing from it
+    qi.families_in_class(class_name)
+
+    # API first, the scraper only once the API has taken longer than it usually does
+    image_source = HedgedImageSource(ApiImageSource(), ScraperImageSource(url_queue))
+    build_question = make_source_question_builder(image_source, class_name)
+    pipeline = QuestionPipeline(build_question, high_watermark=5, low_watermark=2, producers=2)
+    pipeline.start()
+
+    # Display the GUI
+    show_quiz(pipeline)
+    image_source.close()
+    scraper_pool.close()
+
+
+if __name__ == "__main__":
+    # Show failing image sources and the producers' warnings
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,108 +1,40 @@
 import quinsectz as qi
 import image_scraper as img
-import random
-import threading
+from question_pipeline import QuestionPipeline, make_scraped_question_builder
+from quiz_ui import show_quiz
 import queue
-import tkinter as tk
-from PIL import Image, ImageTk
-import os
+import logging
 
-url_queue = queue.Queue()
-species_queue = queue.Queue()
+def main():
+    url_queue = queue.Queue()
 
-img_scraper_thread = threading.Thread(target=img.scrape_random_species_text_dynamic, args=(url_queue, species_queue), daemon = True)
-img_scraper_thread.start()
-
-species_name = ""
-
-family = ""
-
-other_choices = []
-
-# GUI setup
-def show_question(image_path, choices, correct_family):
-    # Set up the tkinter root
-    root = tk.Tk()
-    root.title("Family Identification Quiz")
-
-    # Load the image
-    img = Image.open(image_path)
-    img.thumbnail((400, 400))  # Resize to fit within 400x400 while keeping aspect ratio
-    img_tk = ImageTk.PhotoImage(img)
-
-    # Display the image
-    img_label = tk.Label(root, image=img_tk)
-    img_label.pack()
-
-    # Display the choices
-    def check_answer(selected_family):
-        if selected_family == correct_family:
-            result_label.config(text="Correct!", fg="green")
-        else:
-            result_label.config(text="Wrong, try again!", fg="red")
-
-    # Add buttons for multiple choices
-    for choice in choices:
-        button = tk.Button(root, text=choice, command=lambda c=choice: check_answer(c))
-        button.pack(pady=10)
-
-    # Label to show result
-    result_label = tk.Label(root, text="", font=("Helvetica", 16))
-    result_label.pack()
-
-    # Start the tkinter main loop
-    root.mainloop()
-
-
-# Main loop
-while species_name == "":
+    # Two headless browsers, kept open between questions. Every request carries its
+    # own reply queue, nothing is answered on the shared species queue
+    scraper_pool, scraper_threads = img.start_scrapers(url_queue, queue.Queue(), workers=2)
 
     # Define the class name
     class_name = "Mammalia"
 
-    # Get the family list
-    family_list = qi.families_in_class(class_name)
-
-    genus_list = []
-
-    while genus_list == []:
-
-        # Select random family
-        random_family = random.choice(family_list)
-        family = random_family
-
-        # Print the randomly selected family's name
-        print("Randomly selected family:", random_family['scientificName'])
-        
-        genus_list = qi.genus_in_family(random_family['scientificName'])
-
-    random_genus = random.choice(genus_list)
-
-    print("Randomly selected genus:", random_genus['scientificName'])
-
-    #Get Image
-    usage_key = random_genus['key']
-    print("Taxon key:",usage_key)
-    url = "https://www.gbif.org/occurrence/gallery?taxon_key=" + str(usage_key) + "&occurrence_status=present"
-    url_queue.put(url)
-
-    species_name = species_queue.get()
-    print("Got the stuff")
-
-print("Species name is: ------------------------------ " + species_name + "-------------------------------------------------------s")
+    # Warm the taxonomy cache before the producer starts drawing from it
+    qi.families_in_class(class_name)
 
-family_siblings = qi.sibling_families(family['scientificName'])
+    # One producer per scraper worker
+    build_question = make_scraped_question_builder(url_queue, class_name)
+    pipeline = QuestionPipeline(build_question, high_watermark=3, low_watermark=1, producers=2)
+    pipeline.start()
 
-if len(family_siblings) >= 3:
-    other_choices = random.sample(family_siblings, 3)
-else:
-    other_choices = family_siblings
+    # Display the GUI
+    show_quiz(pipeline)
 
-choices = [family['scientificName']] + [choice['scientificName'] for choice in other_choices]
-random.shuffle(choices)  # Shuffle the options
+    # A None per worker stops it after the page it is on, then the browsers can go
+    for _ in scraper_threads:
+        url_queue.put(None)
+    for thread in scraper_threads:
+        thread.join()
+    scraper_pool.close()
 
-# Assuming the image was saved in worker.py
-image_path = os.path.join("images", species_name + ".png")
 
-# Display the GUI
-show_question(image_path, choices, family['scientificName'])
\ No newline at end of file
+if __name__ == "__main__":
+    # Show the scraper workers' failed pages and the producers' warnings
+    logging.basicConfig(level=logging.INFO)
+    main()
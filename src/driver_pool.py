@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+import logging
+import os
+import queue
+import threading
+import time
+from lazy_loading import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Selenium's webdriver package is slow to import, only processes that start a browser load it
+webdriver = lazy_import("selenium.webdriver")
+exceptions = lazy_import("selenium.common.exceptions")
+
+# Optional Chrome profile, e.g. to reuse cookies; the pool runs without one by default
+CHROME_USER_DATA_DIR = os.environ.get("CHROME_USER_DATA_DIR")
+CHROME_PROFILE_NAME = os.environ.get("CHROME_PROFILE_NAME")
+
+def make_chrome_driver(headless=True, user_data_dir=CHROME_USER_DATA_DIR, profile_name=CHROME_PROFILE_NAME):
+    """
+    Start a Chrome driver that also works on headless Linux servers and in containers.
+    """
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1280,1024")
+    if user_data_dir:
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+    if profile_name:
+        options.add_argument(f"--profile-directory={profile_name}")
+    return webdriver.Chrome(options=options)
+
+
+class DriverLease:
+    """
+    A pooled driver handed out by DriverPool.driver(), counting the pages it loads.
+    """
+
+    def __init__(self, driver, pages=0):
+        self.driver = driver
+        self.pages = pages
+
+    def get(self, url):
+        self.pages += 1
+        self.driver.get(url)
+
+
+class DriverPool:
+    """
+    Pool of long-lived WebDriver instances shared by scraper threads.
+
+    Up to `size` drivers are started lazily. A driver goes back to the pool after
+    each use and is quit and replaced once it has loaded `max_pages` pages or when
+    it fails with a WebDriverException (e.g. the browser crashed).
+    """
+
+    def __init__(self, size=2, max_pages=50, driver_factory=make_chrome_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.driver_factory = driver_factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Borrow a driver for the duration of a with block.
+
+        Yields:
+        DriverLease: The lease, load pages with lease.get(url) so they are counted
+        """
+        lease = self._acquire(timeout)
+        try:
+            yield lease
+        except exceptions.TimeoutException:
+            # A page that didn't load in time says nothing about the browser itself
+            self._release(lease)
+            raise
+        except exceptions.WebDriverException:
+            # The browser may be gone, don't hand it out again
+            self._discard(lease)
+            raise
+        except BaseException:
+            self._release(lease)
+            raise
+        else:
+            self._release(lease)
+
+    def close(self):
+        """
+        Quit every idle driver; drivers still in use are quit when they come back.
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                lease = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(lease)
+
+    def _acquire(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("The driver pool is closed")
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+
+            if create:
+                try:
+                    return DriverLease(self.driver_factory())
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            # Every driver is busy, wait for one to come back (or to be discarded, freeing a slot)
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            if wait <= 0:
+                raise TimeoutError("No driver became available in time")
+            try:
+                return self._idle.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    def _release(self, lease):
+        with self._lock:
+            closed = self._closed
+        if closed or lease.pages >= self.max_pages:
+            # Recycle drivers after a while, long-lived browsers slowly leak memory
+            self._discard(lease)
+        else:
+            self._idle.put(lease)
+
+    def _discard(self, lease):
+        try:
+            lease.driver.quit()
+        except Exception as e:
+            logger.warning("Could not quit driver: %s", e)
+        with self._lock:
+            self._created -= 1
@@ -0,0 +1,193 @@
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlencode
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default location of the response cache, next to the taxonomy cache
+DEFAULT_CACHE_PATH = os.path.join("cache", "http.sqlite")
+
+# How long a stored body may still be served while it is being revalidated, unless the server says otherwise
+DEFAULT_STALE_TTL = 24 * 3600
+
+# Upper bound on the number of stored responses before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = 5000
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh_until: float # Served without asking the server until then
+    stale_until: float # Served while revalidating in the background until then
+
+    def json(self):
+        return json.loads(self.body)
+
+    def conditional_headers(self):
+        """
+        Return the If-None-Match / If-Modified-Since headers revalidating this response.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    On-disk store of response bodies with their validators, keyed by URL and query.
+
+    Bodies are kept with the ETag / Last-Modified they came with so they can be
+    revalidated, and with two deadlines computed from Cache-Control: until
+    `fresh_until` they are served without a request, until `stale_until` they
+    may be served while a revalidation runs in the background.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, stale_ttl=DEFAULT_STALE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+
+        # Create the cache directory if it doesn't exist
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " fresh_until REAL NOT NULL,"
+            " stale_until REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Return the CachedResponse stored under `key`, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fresh_until, stale_until FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return CachedResponse(*row)
+
+    def store(self, key, body, headers):
+        """
+        Store a 200 response body with the validators and freshness of its headers.
+
+        Returns:
+        bool: False if the response asked not to be stored (Cache-Control: no-store)
+        """
+        directives = parse_cache_control(headers.get("Cache-Control"))
+        if "no-store" in directives:
+            return False
+
+        fresh_until, stale_until = self._deadlines(directives)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, body, etag, last_modified, fresh_until, stale_until, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, headers.get("ETag"), headers.get("Last-Modified"), fresh_until, stale_until, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+        return True
+
+    def revalidated(self, key, headers):
+        """
+        Record a 304 for `key`: the body stays, its deadlines (and validators, if new ones came) are renewed.
+        """
+        fresh_until, stale_until = self._deadlines(parse_cache_control(headers.get("Cache-Control")))
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fresh_until = ?, stale_until = ?, accessed_at = ?,"
+                " etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (fresh_until, stale_until, time.time(), headers.get("ETag"), headers.get("Last-Modified"), key)
+            )
+            self._conn.commit()
+
+    def invalidate(self, key=None):
+        """
+        Drop one stored response, or all of them. Returns the number removed.
+        """
+        with self._lock:
+            if key is not None:
+                cursor = self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            else:
+                cursor = self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _deadlines(self, directives):
+        now = time.time()
+        max_age = _seconds(directives.get("max-age")) if "no-cache" not in directives else 0
+        fresh_until = now + (max_age or 0)
+        stale = _seconds(directives.get("stale-while-revalidate"))
+        return fresh_until, fresh_until + (stale if stale is not None else self.stale_ttl)
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+
+def cache_key(url, params=None):
+    """
+    Return the cache key of a request: its URL plus its normalized query, sorted by parameter name.
+
+    Params:
+    url (str): The request URL
+    params (list): (name, value) pairs as returned by http_client.normalize_params
+    """
+    if not params:
+        return url
+    # A stable sort keeps the order of repeated parameters, which can matter
+    return url + "?" + urlencode(sorted(params, key=lambda pair: pair[0]))
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header into {directive: value or None}.
+    """
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+def _seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,506 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+import http_cache
+import metrics
+from lazy_loading import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Loaded on the first request, a process that only reads caches never imports them
+requests = lazy_import("requests")
+aiohttp = lazy_import("aiohttp")
+
+class CacheMode(Enum):
+    REVALIDATE = "revalidate" # Conditional request unless the stored body is still fresh, 304s are served from disk
+    STALE_WHILE_REVALIDATE = "stale-while-revalidate" # Serve a stale body at once and revalidate in the background
+
+# Called with (status, seconds) after every request attempt made in the current context, see observe_attempts
+_attempt_observer = ContextVar("attempt_observer", default=None)
+
+# Base URLs of the APIs the project talks to, overridable to point at a stand-in server
+GBIF_API_URL = os.environ.get("GBIF_API_URL", "https://api.gbif.org/v1/")
+CHECKLISTBANK_API_URL = os.environ.get("CHECKLISTBANK_API_URL", "https://api.checklistbank.org/")
+
+@dataclass
+class ClientConfig:
+    timeout: float = 30.0 # Total seconds allowed for one attempt
+    connect_timeout: float = 10.0
+    max_retries: int = 4 # Retries after the first attempt
+    backoff_base: float = 0.5 # Seconds, doubled on every retry
+    backoff_cap: float = 30.0
+    pool_size: int = 10 # Keep-alive connections per host
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    cache_path: str = http_cache.DEFAULT_CACHE_PATH # Where CacheMode responses are stored
+    stale_ttl: float = http_cache.DEFAULT_STALE_TTL # How long stale bodies may be served while revalidating
+    # host -> (requests per second, burst size), hosts not listed aren't limited
+    rate_limits: Dict[str, Tuple[float, int]] = field(default_factory=lambda: {
+        "api.gbif.org": (10.0, 20),
+        "api.checklistbank.org": (5.0, 10),
+    })
+
+
+class RetryableStatus(Exception):
+    """
+    Raised internally for a response whose status is worth retrying.
+    """
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, shared by the sync and async request paths.
+
+    Callers reserve a token up front and then sleep for however long the bucket
+    says, so waiting never happens while holding the lock.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token and return how many seconds to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class HttpClient:
+    """
+    Process-wide HTTP client with pooled keep-alive connections.
+
+    Sync requests go through one requests.Session, async ones through one
+    aiohttp.ClientSession per event loop. Both paths share the per-host token
+    buckets and retry 429/5xx responses and connection errors with jittered
+    exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or ClientConfig()
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._async_sessions = weakref.WeakKeyDictionary()
+        self._cache = None
+        self._refreshing = set()
+        self._refresh_executor = None
+        self._refresh_lock = threading.Lock()
+
+    def bucket(self, url):
+        """
+        Return the token bucket of a URL's host, or None if the host isn't rate limited.
+        """
+        host = urlsplit(url).hostname
+        limit = self.config.rate_limits.get(host)
+        if limit is None:
+            return None
+        with self._buckets_lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(*limit)
+            return bucket
+
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.config.pool_size, pool_maxsize=self.config.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def async_session(self):
+        """
+        Return the aiohttp session of the running event loop, creating it on first use.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.config.pool_size)
+            timeout = aiohttp.ClientTimeout(total=self.config.timeout, connect=self.config.connect_timeout)
+            session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._async_sessions[loop] = session
+        return session
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Return the seconds to wait before retry number `attempt` (0-based), with full jitter.
+        """
+        ceiling = min(self.config.backoff_cap, self.config.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.config.backoff_cap))
+        return delay
+
+    def get(self, url, params=None, headers=None, stream=False, timeout=None):
+        """
+        Send a GET request, retrying 429/5xx responses and connection errors.
+
+        Params:
+        url (str): The URL to request
+        params (dict): Query parameters, None values are dropped and enums sent by value
+        headers (dict): Extra request headers
+        stream (bool): Don't read the body up front (default is False)
+        timeout (float): Seconds allowed per attempt (default is the configured timeout)
+
+        Returns:
+        requests.Response: The last response, whatever its status
+        """
+        session = self.session()
+        bucket = self.bucket(url)
+        params = normalize_params(params)
+        timeout = (self.config.connect_timeout, timeout or self.config.timeout)
+
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            started = time.monotonic()
+            try:
+                response = session.get(url, params=params, headers=headers, stream=stream, timeout=timeout)
+                _report_attempt(url, response.status_code, started, response.headers)
+                if response.status_code in self.config.retry_statuses and attempt < self.config.max_retries:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    response.close()
+                    raise RetryableStatus(response.status_code, retry_after)
+                return response
+            except (RetryableStatus, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not isinstance(e, RetryableStatus):
+                    _report_attempt(url, None, started)
+                if attempt >= self.config.max_retries:
+                    raise
+                _report_retry(url, e, isinstance(e, requests.exceptions.Timeout))
+                time.sleep(self.backoff(attempt, getattr(e, "retry_after", None)))
+                attempt += 1
+
+    def get_json(self, url, params=None, headers=None, timeout=None, cache_mode=None):
+        """
+        GET a URL and return its parsed JSON body, raising for error statuses.
+
+        Params:
+        cache_mode (CacheMode): Keep the body in the HTTP cache and revalidate it with
+            If-None-Match / If-Modified-Since (default is to always download it)
+        """
+        if cache_mode is None:
+            response = self.get(url, params=params, headers=headers, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+        key = http_cache.cache_key(url, normalize_params(params))
+        cached = self._cached(key, cache_mode, url, params, headers, timeout)
+        if cached is not None:
+            return cached.json()
+        return self._revalidate(key, url, params, headers, timeout)
+
+    def http_cache(self):
+        """
+        Return the HTTP response cache, opening it on first use.
+        """
+        with self._session_lock:
+            if self._cache is None:
+                self._cache = http_cache.HttpCache(self.config.cache_path, stale_ttl=self.config.stale_ttl)
+            return self._cache
+
+    def _cached(self, key, cache_mode, url, params, headers, timeout):
+        # Return the stored response if it can be served without waiting for the server
+        cached = self.http_cache().get(key)
+        if cached is None:
+            return None
+        now = time.time()
+        if cached.fresh_until > now:
+            metrics.cache_requests.inc(cache="http", result="hit")
+            return cached
+        if cache_mode is CacheMode.STALE_WHILE_REVALIDATE and cached.stale_until > now:
+            metrics.cache_requests.inc(cache="http", result="stale")
+            self._refresh_in_background(key, url, params, headers, timeout)
+            return cached
+        return None
+
+    def _revalidate(self, key, url, params, headers, timeout):
+        # Ask the server whether the stored body is still current, download it if not
+        cached = self.http_cache().get(key)
+        request_headers = dict(headers or {})
+        if cached is not None:
+            request_headers.update(cached.conditional_headers())
+
+        response = self.get(url, params=params, headers=request_headers, timeout=timeout)
+        if response.status_code == 304 and cached is not None:
+            metrics.cache_requests.inc(cache="http", result="revalidated")
+            self.http_cache().revalidated(key, response.headers)
+            return cached.json()
+        response.raise_for_status()
+        metrics.cache_requests.inc(cache="http", result="miss")
+        self.http_cache().store(key, response.content, response.headers)
+        return response.json()
+
+    def _refresh_in_background(self, key, url, params, headers, timeout):
+        # Revalidations run on the sync client in a worker thread, so they outlive any event loop
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="http-revalidate")
+
+        def refresh():
+            try:
+                self._revalidate(key, url, params, headers, timeout)
+            except Exception as e:
+                logger.warning("Background revalidation of %s failed: %s", key, e)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self._refresh_executor.submit(refresh)
+
+    @asynccontextmanager
+    async def request_async(self, url, params=None, headers=None, timeout=None):
+        """
+        Async context manager yielding the aiohttp response of a GET request.
+
+        Retries happen before the response is handed out, so the caller only sees
+        the final attempt and can stream its body.
+        """
+        session = self.async_session()
+        bucket = self.bucket(url)
+        params = normalize_params(params)
+        # timeout=None would switch off the session's timeouts, so only a per-call value is passed on
+        options = {"timeout": aiohttp.ClientTimeout(total=timeout, connect=self.config.connect_timeout)} if timeout else {}
+
+        attempt = 0
+        while True:
+            if bucket is not None:
+                await bucket.acquire_async()
+            started = time.monotonic()
+            try:
+                response = await session.get(url, params=params, headers=headers, **options)
+                _report_attempt(url, response.status, started, response.headers)
+                if response.status in self.config.retry_statuses and attempt < self.config.max_retries:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    response.release()
+                    raise RetryableStatus(response.status, retry_after)
+            except (RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if not isinstance(e, RetryableStatus):
+                    _report_attempt(url, None, started)
+                if attempt >= self.config.max_retries:
+                    raise
+                _report_retry(url, e, isinstance(e, asyncio.TimeoutError))
+                await asyncio.sleep(self.backoff(attempt, getattr(e, "retry_after", None)))
+                attempt += 1
+                continue
+
+            try:
+                yield response
+            finally:
+                response.release()
+            return
+
+    async def get_json_async(self, url, params=None, headers=None, timeout=None, cache_mode=None):
+        """
+        GET a URL asynchronously and return its parsed JSON body, raising for error statuses.
+
+        Params:
+        cache_mode (CacheMode): As for get_json
+        """
+        if cache_mode is None:
+            async with self.request_async(url, params=params, headers=headers, timeout=timeout) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+        key = http_cache.cache_key(url, normalize_params(params))
+        cached = self._cached(key, cache_mode, url, params, headers, timeout)
+        if cached is not None:
+            return cached.json()
+
+        request_headers = dict(headers or {})
+        cached = self.http_cache().get(key)
+        if cached is not None:
+            request_headers.update(cached.conditional_headers())
+
+        async with self.request_async(url, params=params, headers=request_headers, timeout=timeout) as response:
+            if response.status == 304 and cached is not None:
+                metrics.cache_requests.inc(cache="http", result="revalidated")
+                self.http_cache().revalidated(key, response.headers)
+                return cached.json()
+            response.raise_for_status()
+            body = await response.read()
+        metrics.cache_requests.inc(cache="http", result="miss")
+        self.http_cache().store(key, body, response.headers)
+        return json.loads(body)
+
+    def close(self):
+        # Let running revalidations finish first, they still need the session and the cache
+        with self._refresh_lock:
+            executor, self._refresh_executor = self._refresh_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._cache is not None:
+                self._cache.close()
+                self._cache = None
+
+    async def close_async(self):
+        """
+        Close the aiohttp session of the running event loop.
+        """
+        session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+def normalize_params(params):
+    """
+    Turn a filter dictionary into query parameters both requests and aiohttp accept.
+
+    None values are dropped, enums are sent by value, booleans as true/false and
+    lists as repeated parameters.
+    """
+    if not params:
+        return None
+
+    normalized = []
+    for name, value in params.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if item is None:
+                continue
+            if isinstance(item, Enum):
+                item = item.value
+            if isinstance(item, bool):
+                item = "true" if item else "false"
+            normalized.append((name, str(item)))
+    return normalized
+
+
+@contextmanager
+def observe_attempts(observer):
+    """
+    Call observer(status, seconds) after every request attempt made inside the with block.
+
+    The status is None for timeouts and connection errors. The observer is held in a
+    context variable, so it only sees the attempts of the current thread or task.
+    """
+    token = _attempt_observer.set(observer)
+    try:
+        yield
+    finally:
+        _attempt_observer.reset(token)
+
+def _report_attempt(url, status, started, headers=None):
+    # Record one attempt in the metrics and tell the context's observer about it
+    seconds = time.monotonic() - started
+    endpoint = metrics.endpoint(url)
+    metrics.http_requests.inc(endpoint=endpoint, status=status if status is not None else "error")
+    metrics.http_request_seconds.observe(seconds, endpoint=endpoint)
+    length = headers.get("Content-Length") if headers is not None else None
+    if length and length.isdigit():
+        metrics.http_response_bytes.inc(int(length), endpoint=endpoint)
+
+    observer = _attempt_observer.get()
+    if observer is not None:
+        observer(status, seconds)
+
+def _report_retry(url, error, timed_out):
+    if isinstance(error, RetryableStatus):
+        reason = str(error.status)
+    else:
+        reason = "timeout" if timed_out else "connection"
+    metrics.http_retries.inc(endpoint=metrics.endpoint(url), reason=reason)
+    logger.debug("Retrying %s after %s", url, reason)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (seconds or an HTTP date) into seconds, or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# The client every module shares, replace it with configure()
+client = HttpClient()
+
+def configure(config):
+    """
+    Replace the process-wide client with one using `config`.
+    """
+    global client
+    client = HttpClient(config)
+    return client
+
+def set_base_urls(gbif=None, checklistbank=None):
+    """
+    Point every module at other API base URLs (e.g. a local stand-in server).
+
+    Modules read the base URLs at request time, so this also affects modules imported earlier.
+    """
+    global GBIF_API_URL, CHECKLISTBANK_API_URL
+    if gbif is not None:
+        GBIF_API_URL = gbif if gbif.endswith("/") else gbif + "/"
+    if checklistbank is not None:
+        CHECKLISTBANK_API_URL = checklistbank if checklistbank.endswith("/") else checklistbank + "/"
+
+def get(url, params=None, headers=None, stream=False, timeout=None):
+    return client.get(url, params=params, headers=headers, stream=stream, timeout=timeout)
+
+def get_json(url, params=None, headers=None, timeout=None, cache_mode=None):
+    return client.get_json(url, params=params, headers=headers, timeout=timeout, cache_mode=cache_mode)
+
+def request_async(url, params=None, headers=None, timeout=None):
+    return client.request_async(url, params=params, headers=headers, timeout=timeout)
+
+async def get_json_async(url, params=None, headers=None, timeout=None, cache_mode=None):
+    return await client.get_json_async(url, params=params, headers=headers, timeout=timeout, cache_mode=cache_mode)
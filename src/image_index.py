@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+import http_client
+from name_resolver import resolver
+
+# Default location of the index, next to the taxonomy cache
+DEFAULT_INDEX_PATH = os.path.join("cache", "images.sqlite")
+
+# Image counts change slowly, rebuild a class's counts after a day
+DEFAULT_TTL = 24 * 3600
+
+# How long a taxon whose images couldn't be used is skipped
+DEFAULT_FAILURE_TTL = 6 * 3600
+
+# Facet values requested per page
+FACET_PAGE_SIZE = 1000
+
+# The facet fields an index build collects, with the rank of their values
+FACETS = {"familyKey": "FAMILY", "genusKey": "GENUS"}
+
+class ImageAvailabilityIndex:
+    """
+    Local per-taxon counts of occurrences with images.
+
+    `build` runs faceted occurrence searches (mediaType=StillImage, faceted by
+    familyKey and genusKey) under a class and stores every count it gets back.
+    A taxon of a built class that doesn't appear in the facets has no images, so
+    `has_images` can answer "no" without a request. Taxa whose images turned out
+    to be unusable can be marked as failed and are skipped for a while.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, ttl=DEFAULT_TTL, failure_ttl=DEFAULT_FAILURE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._lock = threading.Lock()
+
+        # Create the index directory if it doesn't exist
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counts ("
+            " taxon_key INTEGER PRIMARY KEY,"
+            " rank TEXT,"
+            " scope_key INTEGER,"
+            " count INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS scopes (scope_key INTEGER PRIMARY KEY, built_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS failures (taxon_key INTEGER PRIMARY KEY, expires_at REAL NOT NULL)")
+        self._conn.commit()
+
+    def build(self, class_name, refresh=False):
+        """
+        Collect the image counts of every family and genus under a class.
+
+        Params:
+        class_name (str or int): The class name or usageKey (e.g. "Insecta")
+        refresh (bool): Rebuild even if the class was built within the TTL (default is False)
+
+        Returns:
+        int: The class's usageKey
+        """
+        class_key = resolver.usage_key(class_name, rank='class')
+        if not refresh and self.is_built(class_key):
+            return class_key
+
+        counts = []
+        for field, rank in FACETS.items():
+            for taxon_key, count in _facet_counts({'classKey': class_key}, field):
+                counts.append((taxon_key, rank, class_key, count))
+
+        now = time.time()
+        with self._lock:
+            # Counts missing from a fresh build are zero, so drop the old ones first
+            self._conn.execute("DELETE FROM counts WHERE scope_key = ?", (class_key,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO counts (taxon_key, rank, scope_key, count, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [row + (now,) for row in counts]
+            )
+            self._conn.execute("INSERT OR REPLACE INTO scopes (scope_key, built_at) VALUES (?, ?)", (class_key, now))
+            self._conn.commit()
+        return class_key
+
+    def is_built(self, class_key):
+        with self._lock:
+            row = self._conn.execute("SELECT built_at FROM scopes WHERE scope_key = ?", (class_key,)).fetchone()
+        return row is not None and row[0] + self.ttl > time.time()
+
+    def image_count(self, taxon):
+        """
+        Return the number of occurrences with images of a taxon.
+
+        Params:
+        taxon (dict or int): A taxon record (its classKey lets unknown taxa of built classes count as 0) or a key
+
+        Returns:
+        int: The count, or None if the index doesn't know
+        """
+        taxon_key, class_key = _keys(taxon)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT count, updated_at FROM counts WHERE taxon_key = ?", (taxon_key,)
+            ).fetchone()
+        if row is not None and row[1] + self.ttl > time.time():
+            return row[0]
+        if class_key is not None and self.is_built(class_key):
+            return 0
+        return None
+
+    def has_images(self, taxon):
+        """
+        Return True if a taxon has usable images, False if it has none (or recently failed), None if unknown.
+        """
+        taxon_key, _ = _keys(taxon)
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM failures WHERE taxon_key = ?", (taxon_key,)).fetchone()
+        if row is not None and row[0] > time.time():
+            return False
+
+        count = self.image_count(taxon)
+        return None if count is None else count > 0
+
+    def set_count(self, taxon, count, rank=None):
+        """
+        Record a count learnt elsewhere (e.g. from a limit=0 occurrence search).
+        """
+        taxon_key, class_key = _keys(taxon)
+        with self._lock:
+            # A count without a rank or class keeps the ones a build stored, or the taxon would drop out of counts()
+            self._conn.execute(
+                "INSERT INTO counts (taxon_key, rank, scope_key, count, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (taxon_key) DO UPDATE SET"
+                " rank = COALESCE(excluded.rank, rank),"
+                " scope_key = COALESCE(excluded.scope_key, scope_key),"
+                " count = excluded.count,"
+                " updated_at = excluded.updated_at",
+                (taxon_key, rank.upper() if rank else None, class_key, count, time.time())
+            )
+            self._conn.commit()
+
+    def mark_failed(self, taxon, ttl=None):
+        """
+        Skip a taxon for `ttl` seconds (default is the index's failure_ttl), e.g. after it yielded no usable image.
+        """
+        taxon_key, _ = _keys(taxon)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failures (taxon_key, expires_at) VALUES (?, ?)",
+                (taxon_key, time.time() + (ttl if ttl is not None else self.failure_ttl))
+            )
+            self._conn.commit()
+
+    def counts(self, class_key, rank):
+        """
+        Return {taxon_key: count} for every taxon of `rank` with images under a built class.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT taxon_key, count FROM counts WHERE scope_key = ? AND rank = ?", (class_key, rank.upper())
+            ).fetchall()
+        return dict(rows)
+
+    def filter_with_images(self, taxa):
+        """
+        Drop the taxon records known to have no usable images, keeping unknown ones.
+        """
+        return [taxon for taxon in taxa if self.has_images(taxon) is not False]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _keys(taxon):
+    # Accept taxon records as well as bare keys
+    if isinstance(taxon, dict):
+        return taxon.get('key', taxon.get('usageKey')), taxon.get('classKey')
+    return taxon, None
+
+def _facet_counts(filters, field):
+    # Page through the values of one facet, yielding (taxon_key, count) pairs
+    url = http_client.GBIF_API_URL + 'occurrence/search'
+    offset = 0
+    while True:
+        params = dict(filters)
+        params.update({
+            'mediaType': 'StillImage',
+            'limit': 0,
+            'facet': field,
+            field + '.facetLimit': FACET_PAGE_SIZE,
+            field + '.facetOffset': offset,
+        })
+        data = http_client.get_json(url, params=params)
+
+        values = []
+        for facet in data.get('facets', []):
+            values.extend(facet.get('counts', []))
+
+        for value in values:
+            yield int(value['name']), value['count']
+
+        if len(values) < FACET_PAGE_SIZE:
+            return
+        offset += FACET_PAGE_SIZE
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+def get_default_index():
+    """
+    Return the process-wide image availability index, opening it on first use.
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = ImageAvailabilityIndex()
+        return _default_index
@@ -1,54 +1,101 @@
-import requests
-import os
+import asyncio
+import http_client
+import image_index
+import image_store
+import logging
 import random
+from lazy_loading import lazy_import
 
-def select_random_image(taxon_key, limit=100000):
+logger = logging.getLogger(__name__)
+
+# Only its exception types are used here, the requests themselves go through http_client
+requests = lazy_import("requests")
+
+# GBIF refuses occurrence searches whose offset + limit goes past this
+OCCURRENCE_PAGING_LIMIT = 100000
+
+def count_images(taxon_key):
     """
-    Fetches images for a given taxon key from the GBIF API and randomly selects one of them
-    
+    Counts the occurrences with images for a given taxon key, without fetching any of them
+
     Params:
     taxon key (int): The taxon number used by GBIF for the specific rank (e.g. 1674437)
-    limit (int): The number of images to randomly select from (default is 100000)
-    
+
     Returns:
-    tuple: A tuple of the form (species_name, image_url)"""
+    int: The number of occurrences with a StillImage"""
 
-    # Base URL for GBIF occurrence search API
-    base_url = 'https://api.gbif.org/v1/occurrence/search'
+    base_url = http_client.GBIF_API_URL + 'occurrence/search'
 
-    # Query parameters
+    # limit=0 only returns the count
     params = {
         'mediaType': 'StillImage',
-        'taxonKey': taxon_key,  # Change to your species name
-        'limit': limit
+        'taxonKey': taxon_key,
+        'limit': 0
     }
 
-    try:
-        # Make the request
-        response = requests.get(base_url, params=params)
-        data = response.json()
+    data = http_client.get_json(base_url, params=params)
+    return data.get('count', 0)
 
-        results = []
+def select_random_image(taxon_key, limit=100000, attempts=5, page_size=3):
+    """
+    Randomly selects one image of a given taxon key from the GBIF API
 
-        # Extract image URLs
-        id = 1
-        if 'results' in data:
-            for occurrence in data['results']:
-                if 'media' in occurrence:
-                    for media in occurrence['media']:
-                        scientific_name = occurrence.get('species', 'Unidentified species')
-                        image_url = media.get('identifier')
-                        if image_url:
-                            results.append((scientific_name, image_url))
+    Rather than downloading every occurrence, it counts the matching occurrences,
+    picks a random offset and fetches a single small page there. Occurrences
+    without a usable image are skipped and another offset is drawn.
+    
+    Params:
+    taxon key (int): The taxon number used by GBIF for the specific rank (e.g. 1674437)
+    limit (int): The number of occurrences to randomly select from (default is 100000, GBIF's paging limit)
+    attempts (int): The number of random offsets to try before giving up (default is 5)
+    page_size (int): The number of occurrences fetched per attempt (default is 3)
+    
+    Returns:
+    tuple: A tuple of the form (species_name, image_url), ("", "") if no image was found"""
 
-                        if results and len(results) >= limit:
-                            return random.choice(results)
-        if results and len(results)>0:
-            return random.choice(results)
+    # Base URL for GBIF occurrence search API
+    base_url = http_client.GBIF_API_URL + 'occurrence/search'
+
+    # Taxa the image index knows to have no (usable) images aren't worth a request
+    index = image_index.get_default_index()
+    if index.has_images(taxon_key) is False:
+        return ("", "")
+
+    try:
+        count = count_images(taxon_key)
+        index.set_count(taxon_key, count)
+
+        window = min(count, limit, OCCURRENCE_PAGING_LIMIT)
+        if window == 0:
+            return ("", "")
+
+        for attempt in range(attempts):
+            offset = random.randrange(window)
+
+            # Query parameters
+            params = {
+                'mediaType': 'StillImage',
+                'taxonKey': taxon_key,
+                'offset': offset,
+                'limit': min(page_size, OCCURRENCE_PAGING_LIMIT - offset)
+            }
+
+            # Make the request
+            data = http_client.get_json(base_url, params=params)
+
+            # Take the first occurrence from the offset on that has an image URL
+            for occurrence in data.get('results', []):
+                image_urls = [media.get('identifier') for media in occurrence.get('media', []) if media.get('identifier')]
+                if image_urls:
+                    scientific_name = occurrence.get('species', 'Unidentified species')
+                    return (scientific_name, random.choice(image_urls))
+
+        # Every attempt came back without a usable image, skip this taxon for a while
+        index.mark_failed(taxon_key)
         return ("", "")
     
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
+        logger.warning("Selecting an image of taxon %s failed: %s", taxon_key, e)
         return []
 
 def request_images(taxon_key, image_number=10):
@@ -62,9 +109,8 @@ def request_images(taxon_key, image_number=10):
     Returns:
     list: A list of tuples of the form (species_name, image_url)"""
 
-    print("in here")
     # Base URL for GBIF occurrence search API
-    base_url = 'https://api.gbif.org/v1/occurrence/search'
+    base_url = http_client.GBIF_API_URL + 'occurrence/search'
 
     # Query parameters
     params = {
@@ -75,8 +121,7 @@ def request_images(taxon_key, image_number=10):
 
     try:
         # Make the request
-        response = requests.get(base_url, params=params)
-        data = response.json()
+        data = http_client.get_json(base_url, params=params)
 
         results = []
 
@@ -95,38 +140,47 @@ def request_images(taxon_key, image_number=10):
         return results
     
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
+        logger.warning("Requesting images of taxon %s failed: %s", taxon_key, e)
         return []
 
-def save_image (image_info, image_index):
+def save_image (image_info, image_index=0):
     """
-    Downloads and saves the image from the provided URL into the 'images' directory.
+    Downloads the image from the provided URL into the content-addressed image store.
     
     Params:
     image_info (tuple): A tuple containing the scientific name and image URL.
-    scientific_name (str): The scientific name of the species to be used as part of the image filename.
-    image_index (int): An index to differentiate images if there are multiple for the same species.
+    image_index (int): Kept for compatibility, images are named by content hash so repeated species no longer overwrite each other.
+
+    Returns:
+    str: The path of the saved image, or None if the download failed
     """
-    scientific_name = image_info[0]
     image_url = image_info [1]
 
-    # Create an "images" directory if it doesn't exist
-    if not os.path.exists('images'):
-        os.makedirs('images')
-    
-    # Get the image content
+    # Stream the image into the store (or reuse it if this URL was downloaded before)
     try:
-        response = requests.get(image_url)
-        response.raise_for_status()  # Check for errors in the response
-        
-        # Format the image filename based on the scientific name and index
-        image_filename = f"images/{scientific_name.replace(' ', '_')}_{image_index}.jpg"
-        
-        # Save the image
-        with open(image_filename, 'wb') as img_file:
-            img_file.write(response.content)
-        
-        print(f"Image saved: {image_filename}")
+        image_filename = image_store.get_default_store().fetch(image_url)
+        logger.debug("Image saved: %s", image_filename)
+        return image_filename
     
     except requests.exceptions.RequestException as e:
-        print(f"Failed to download {image_url}: {e}")
\ No newline at end of file
+        logger.warning("Failed to download %s: %s", image_url, e)
+        return None
+
+def save_images(image_infos, max_concurrent=8):
+    """
+    Downloads many images concurrently into the image store.
+
+    Params:
+    image_infos (list): Tuples of the form (species_name, image_url)
+    max_concurrent (int): Maximum number of downloads in flight
+
+    Returns:
+    dict: Each image URL mapped to its local path, or None if its download failed
+    """
+    async def download():
+        try:
+            return await image_store.get_default_store().fetch_many([info[1] for info in image_infos], max_concurrent)
+        finally:
+            await http_client.client.close_async()
+
+    return asyncio.run(download())
@@ -1,117 +1,188 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import requests
+import http_client
+import image_variants
 import os
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from driver_pool import DriverPool
+import logging
 import random
+import threading
 import time
 
-def scrape_random_species_text_dynamic(url_queue, species_queue, save_dir="images"):
+logger = logging.getLogger(__name__)
 
-    # Set up browser
-    PC_PROFILE_NAME = "Stefanos"
-    userdatadir = f'C:/Users/{PC_PROFILE_NAME}/AppData/Local/Google/Chrome/User Data'
-    CHROME_PROFILE_NAME = "Stefanos"
-    options = webdriver.ChromeOptions()
-    options.add_argument(f"--user-data-dir={userdatadir}")
-    options.add_argument(f'--profile-directory={CHROME_PROFILE_NAME}')
+def scrape_gallery(lease, url, save_dir="images"):
+    """
+    Pick a random image from a GBIF occurrence gallery page and download it.
 
+    Params:
+    lease (DriverLease): A driver borrowed from a DriverPool
+    url (str): The gallery URL (e.g. https://www.gbif.org/occurrence/gallery?taxon_key=1712343)
+    save_dir (str): Where the image is saved, as <species name>.png
 
-    driver = webdriver.Chrome(options=options)
+    Returns:
+    str: The species name, or "" if the gallery had no images
+    """
+    # Selenium is only imported by processes that scrape, the driver pool has already loaded most of it
+    from selenium.common.exceptions import WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
 
-    while True:
-        # Wait for url
-        url = url_queue.get()
+    driver = lease.driver
+    species_name = ""
+
+    # Load the webpage
+    lease.get(url)
 
+    retry_attempts = 10  # Set number of retries for random selection
+    for attempt in range(retry_attempts):
         try:
-            species_name = ""
+            # Wait for the species text elements to be present
+            WebDriverWait(driver, 10).until(
+                lambda d: d.find_elements(By.CSS_SELECTOR, "div[class*='imageGallery']") or
+                            d.find_element(By.XPATH, "//h3[contains(text(), 'No occurrences with images')]")
+            )
+
+            # Check if "No occurrences with images" text is found
+            no_images_text = driver.find_elements(By.XPATH, "//h3[contains(text(), 'No occurrences with images')]")
+            if no_images_text:
+                logger.info("No occurrences with images found at %s", url)
+                return ""
+
+            # Find all image elements
+            image_links = driver.find_elements(By.CSS_SELECTOR, "div.imageGallery a[style*='background-image']")
+
+            # Select a random image
+            random_image = random.choice(image_links)
+            random_url = random_image.get_attribute('href')
+            species_name = random_image.text
+            logger.debug("Randomly selected species: %s", species_name)
+
+            # Navigate to the selected URL
+            lease.get(random_url)
+            break  # If successful, exit the retry loop
+
+        except WebDriverException as e:
+            logger.debug("Attempt %d/%d failed: %s", attempt + 1, retry_attempts, e)
+            if attempt == retry_attempts - 1:
+                raise  # Re-raise error if max retries reached
+            time.sleep(0.5)  # Wait before retrying
+
+        except IndexError:
+            # random.choice on an empty gallery, give the page another moment to fill in
+            logger.debug("Attempt %d/%d found no images yet", attempt + 1, retry_attempts)
+            time.sleep(0.5)
+
+    # If the gallery never showed an image, give up on this URL
+    if not species_name:
+        return ""
+
+    # In case we somehow miss images
+    retry_attempts = 3
+    for attempt in range(retry_attempts):
+        try:
+            # Wait for an image that isn't a .svg icon
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "img:not([src$='.svg'])"))
+            )
+            break  # If successful, exit loop
+        except WebDriverException as e:
+            logger.debug("Retry attempt %d/%d failed: %s", attempt + 1, retry_attempts, e)
+            if attempt == retry_attempts - 1:
+                raise  # Re-raise error if max attempts reached
+            time.sleep(0.5)  # Wait before retrying
+
+    # Now find the large image
+    img_tag = driver.find_element(By.CSS_SELECTOR, "img")
+
+    # Get the URL of the large image
+    img_url = img_tag.get_attribute('src')
+
+    # Handle relative URLs (starting with //)
+    if img_url.startswith('//'):
+        img_url = 'https:' + img_url
+
+    # Create the directory if it doesn't exist
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    # Get the image file name
+    img_name = os.path.join(save_dir, species_name + ".png")
+
+    # Download and save the larger image
+    img_data = http_client.get(img_url).content
+    with open(img_name, 'wb') as f:
+        f.write(img_data)
+    logger.debug("Downloaded larger image: %s", img_name)
+
+    # Build the display-sized variant now so the quiz never decodes the full image
+    try:
+        image_variants.make_variant(img_name)
+    except Exception as e:
+        logger.warning("Could not build the display variant of %s: %s", img_name, e)
+
+    return species_name
+
+def scrape_random_species_text_dynamic(url_queue, species_queue, save_dir="images", pool=None):
+    """
+    Scraper worker loop: take gallery URLs from url_queue and answer on species_queue.
+
+    A queued item is either a URL, answered with the species name (or "") on
+    species_queue, or a (url, reply_queue) pair answered on its own reply queue,
+    which lets several workers serve requests in parallel without mixing answers
+    up. A (url, reply_queue, cancel) triple is skipped if the cancel event is set
+    by the time a worker picks it up. A None item stops the worker.
+
+    Params:
+    url_queue (queue.Queue): Incoming gallery URLs
+    species_queue (queue.Queue): Outgoing species names for plain URL requests
+    save_dir (str): Where images are saved
+    pool (DriverPool): The drivers to borrow from (default is a private pool of one)
+    """
+    if pool is None:
+        pool = DriverPool(size=1)
 
-            # Load the webpage
-            driver.get(url)
-
-            retry_attempts = 10  # Set number of retries for random selection
-            for attempt in range(retry_attempts):
-                try:
-                    # Wait for the species text elements to be present
-                    WebDriverWait(driver, 10).until(
-                        lambda d: d.find_elements(By.CSS_SELECTOR, "div[class*='imageGallery']") or 
-                                    d.find_element(By.XPATH, "//h3[contains(text(), 'No occurrences with images')]")
-                    )
-
-                    # Check if "No occurrences with images" text is found
-                    no_images_text = driver.find_elements(By.XPATH, "//h3[contains(text(), 'No occurrences with images')]")
-                    if no_images_text:
-                        print("No occurrences with images found. Restarting process...")
-                        species_queue.put("")  # Notify the main process that no images were found
-                        break  # Break the inner retry loop and return to waiting for a new URL
-
-                    # Find all image elements
-                    image_links = driver.find_elements(By.CSS_SELECTOR, "div.imageGallery a[style*='background-image']")
-
-                    # Select a random image
-                    random_image = random.choice(image_links)
-                    random_url = random_image.get_attribute('href')
-                    species_name = random_image.text
-                    print(f"Randomly selected species: {species_name}")
-
-                    # Navigate to the selected URL
-                    driver.get(random_url)
-                    break  # If successful, exit the retry loop
-
-                except Exception as e:
-                    print(f"Attempt {attempt + 1}/{retry_attempts} failed: {e}")
-                    if attempt == retry_attempts - 1:
-                        raise  # Re-raise error if max retries reached
-                    time.sleep(0.5)  # Wait before retrying
-
-            # If the loop was broken because of "No occurrences with images" or no image links, restart the process
-            if not species_name:
-                continue  # Restart the while True loop and wait for a new URL
-
-            # In case we somehow miss images
-            retry_attempts = 3
-            for attempt in range(retry_attempts):
-                try:
-                    # Wait for an image that isn't a .svg icon
-                    WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "img:not([src$='.svg'])"))
-                    )
-                    break  # If successful, exit loop
-                except Exception as e:
-                    print(f"Retry attempt {attempt + 1}/{retry_attempts} failed: {e}")
-                    if attempt == retry_attempts - 1:
-                        raise  # Re-raise error if max attempts reached
-                    time.sleep(0.5)  # Wait before retrying
-
-            # Now find the large image
-            img_tag = driver.find_element(By.CSS_SELECTOR, "img")
-
-            # Get the URL of the large image
-            img_url = img_tag.get_attribute('src')
-
-            # Handle relative URLs (starting with //)
-            if img_url.startswith('//'):
-                img_url = 'https:' + img_url
-
-            # Create the directory if it doesn't exist
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-
-            # Get the image file name
-            img_name = os.path.join(save_dir, species_name + ".png")
-
-            # Download and save the larger image
-            img_data = requests.get(img_url).content
-            with open(img_name, 'wb') as f:
-                f.write(img_data)
-            print(f"Downloaded larger image: {img_name}")
-            species_queue.put(species_name)
-            print("Put the species name in the queue")
-            driver.quit()
+    while True:
+        # Wait for url
+        item = url_queue.get()
+        if item is None:
             break
 
+        if isinstance(item, tuple):
+            url, reply_queue, cancel = item if len(item) == 3 else item + (None,)
+        else:
+            url, reply_queue, cancel = item, species_queue, None
+
+        # Nobody waits for a cancelled request any more
+        if cancel is not None and cancel.is_set():
+            continue
+
+        try:
+            with pool.driver() as lease:
+                species_name = scrape_gallery(lease, url, save_dir)
         except Exception as e:
-            print(f"Scraper failed: {e}")
-            species_queue.put("")
-            continue  # Restart process after failure
\ No newline at end of file
+            logger.warning("Scraping %s failed: %s", url, e)
+            species_name = ""
+
+        reply_queue.put(species_name)
+
+def start_scrapers(url_queue, species_queue, workers=2, save_dir="images", pool=None):
+    """
+    Start `workers` scraper threads sharing one pool of `workers` long-lived drivers.
+
+    Returns:
+    tuple: The DriverPool and the list of worker threads
+    """
+    if pool is None:
+        pool = DriverPool(size=workers)
+
+    threads = []
+    for number in range(workers):
+        thread = threading.Thread(
+            target=scrape_random_species_text_dynamic,
+            args=(url_queue, species_queue, save_dir, pool),
+            name=f"image-scraper-{number}",
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    return pool, threads
@@ -0,0 +1,229 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ImageResult:
+    species_name: str # The species shown in the image
+    image_path: str # The image, already on disk
+    source: str = "" # The name of the source that found it
+
+
+class ImageSource(ABC):
+    """
+    Something that finds a quiz image for a genus.
+
+    Subclasses implement `fetch`, which returns an ImageResult or None if the
+    genus had no usable image. Long-running sources should check the `cancel`
+    event now and then and give up (returning None) once it is set.
+    """
+
+    name = "source"
+
+    @abstractmethod
+    def fetch(self, genus_key, cancel=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class ApiImageSource(ImageSource):
+    """
+    Images from the GBIF occurrence API, downloaded into the image store.
+    """
+
+    name = "api"
+
+    def fetch(self, genus_key, cancel=None):
+        # Imported on use, the hedging machinery below needs neither the HTTP stack nor Pillow
+        import image_requestor as imgr
+        import image_variants
+
+        image_info = imgr.select_random_image(genus_key)
+        if not image_info or not image_info[0]:
+            return None
+        if cancel is not None and cancel.is_set():
+            return None
+
+        image_path = imgr.save_image(image_info, 0)
+        if image_path is None:
+            return None
+        return ImageResult(image_info[0], image_variants.display_path(image_path), self.name)
+
+
+class ScraperImageSource(ImageSource):
+    """
+    Images scraped from the GBIF gallery by image_scraper workers listening on url_queue.
+    """
+
+    name = "scraper"
+
+    def __init__(self, url_queue, save_dir="images", poll_interval=0.1):
+        self.url_queue = url_queue
+        self.save_dir = save_dir
+        self.poll_interval = poll_interval
+
+    def fetch(self, genus_key, cancel=None):
+        import image_variants
+
+        url = "https://www.gbif.org/occurrence/gallery?taxon_key=" + str(genus_key) + "&occurrence_status=present"
+
+        # The worker skips requests that were cancelled before it got to them
+        reply_queue = queue.Queue(maxsize=1)
+        cancel = cancel if cancel is not None else threading.Event()
+        self.url_queue.put((url, reply_queue, cancel))
+
+        while True:
+            try:
+                species_name = reply_queue.get(timeout=self.poll_interval)
+                break
+            except queue.Empty:
+                if cancel.is_set():
+                    return None
+
+        if not species_name:
+            return None
+        image_path = image_variants.display_path(os.path.join(self.save_dir, species_name + ".png"))
+        return ImageResult(species_name, image_path, self.name)
+
+
+class LatencyTracker:
+    """
+    Rolling window of the latest fetch times of each source.
+
+    Fetches that were cancelled or failed count with the time they had taken so
+    far, a lower bound of how long they would have needed.
+    """
+
+    def __init__(self, window=100):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = collections.deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, name):
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def quantile(self, name, q):
+        """
+        Return the q-quantile (0 to 1) of a source's recent latencies, or None without samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgedImageSource(ImageSource):
+    """
+    Ask a fast primary source first and a fallback only when the primary is slow.
+
+    The primary gets `hedge_delay` seconds on its own. If it hasn't answered by
+    then the fallback starts too, the first usable image wins and the other
+    fetch is cancelled. A primary that comes back empty (or fails) within the
+    delay doesn't wait it out: the fallback starts right away, since the
+    primary has nothing more to give. Once the primary has `min_samples`
+    recorded latencies the delay follows their `quantile` instead, clamped to
+    [min_delay, max_delay], so only its slow tail is hedged.
+    """
+
+    name = "hedged"
+
+    def __init__(self, primary, fallback, hedge_delay=2.0, quantile=0.9, min_samples=10,
+                 min_delay=0.2, max_delay=10.0, tracker=None, max_workers=4):
+        self.primary = primary
+        self.fallback = fallback
+        self.initial_delay = hedge_delay
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-source")
+
+    def hedge_delay(self):
+        """
+        Return the seconds the primary gets before the fallback starts.
+        """
+        if self.tracker.count(self.primary.name) < self.min_samples:
+            return self.initial_delay
+        delay = self.tracker.quantile(self.primary.name, self.quantile)
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def fetch(self, genus_key, cancel=None):
+        cancel = cancel if cancel is not None else threading.Event()
+        events = {}
+        futures = {}
+
+        def start(source):
+            event = threading.Event()
+            events[source] = event
+            futures[self._executor.submit(self._timed_fetch, source, genus_key, event)] = source
+
+        start(self.primary)
+        pending = set(futures)
+        done, pending = wait(pending, timeout=self.hedge_delay())
+
+        result = self._first_result(done, futures)
+        if result is None and not cancel.is_set():
+            logger.debug("Hedging genus %s with the %s source", genus_key, self.fallback.name)
+            start(self.fallback)
+            pending |= {future for future in futures if future not in done}
+
+            # Take whichever finishes first with an image, wait for the other one otherwise
+            while result is None and pending and not cancel.is_set():
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                result = self._first_result(done, futures)
+
+        # Cancel the losers, they give up at their next check
+        for event in events.values():
+            event.set()
+        for future in pending:
+            future.cancel()
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.primary.close()
+        self.fallback.close()
+
+    def _timed_fetch(self, source, genus_key, cancel):
+        start = time.monotonic()
+        try:
+            result = source.fetch(genus_key, cancel)
+        except Exception:
+            self.tracker.record(source.name, time.monotonic() - start)
+            raise
+        # A fetch that lost the race took at least this long, leaving it out would only keep
+        # the fast ones and drag the hedge delay down; a quick "no image" says nothing
+        if result is not None or cancel.is_set():
+            self.tracker.record(source.name, time.monotonic() - start)
+        return result
+
+    def _first_result(self, done, futures):
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning("The %s image source failed: %s", futures[future].name, e)
+                continue
+            if result is not None:
+                return result
+        return None
@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+import http_client
+import image_variants
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Default location and size budget of the image store
+DEFAULT_ROOT = "images"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Bytes read from the network and written to disk at a time
+CHUNK_SIZE = 64 * 1024
+
+# File extensions of the image types GBIF media usually come in
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/tiff": ".tif",
+}
+
+class ImageStore:
+    """
+    Content-addressed on-disk image store.
+
+    Images are streamed to a temporary file while being hashed and then moved to
+    objects/<first two hex digits>/<sha256><extension>, so the same image is only
+    kept once however many URLs point at it. An SQLite index maps media URLs to
+    hashes and tracks object sizes and last access, and the least recently used
+    objects are evicted whenever the store grows past `max_bytes`.
+
+    An optional `ingest` hook runs once per new object and may write derived files
+    (e.g. display-sized variants) next to it, named <sha256>.<anything>. They are
+    counted in the object's size and evicted with it.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES, ingest=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ingest = ingest
+        self._objects_dir = os.path.join(root, "objects")
+        self._tmp_dir = os.path.join(root, "tmp")
+        self._lock = threading.Lock()
+
+        # Create the store directories if they don't exist
+        for directory in (self._objects_dir, self._tmp_dir):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " hash TEXT PRIMARY KEY,"
+            " path TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS objects_accessed ON objects (accessed_at)")
+        self._conn.commit()
+
+    def path_for(self, url):
+        """
+        Return the local path of an already downloaded URL, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT objects.hash, objects.path FROM urls JOIN objects ON urls.hash = objects.hash WHERE urls.url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            digest, path = row
+            if not os.path.exists(path):
+                # Someone removed the file behind our back, forget it
+                self._forget(digest)
+                self._conn.commit()
+                return None
+
+            self._conn.execute("UPDATE objects SET accessed_at = ? WHERE hash = ?", (time.time(), digest))
+            self._conn.commit()
+            return path
+
+    def hash_for(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM urls WHERE url = ?", (url,)).fetchone()
+            return row[0] if row else None
+
+    def fetch(self, url):
+        """
+        Return the local path of an image, downloading it in chunks if it isn't stored yet.
+        """
+        path = self.path_for(url)
+        if path is not None:
+            metrics.cache_requests.inc(cache="images", result="hit")
+            return path
+        metrics.cache_requests.inc(cache="images", result="miss")
+
+        response = http_client.get(url, stream=True)
+        try:
+            response.raise_for_status()
+            extension = _extension(url, response.headers.get("Content-Type"))
+            with _Download(self._tmp_dir) as download:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    download.write(chunk)
+        finally:
+            response.close()
+
+        return self._ingest(url, download, extension)
+
+    async def fetch_async(self, url):
+        """
+        Asynchronous version of fetch, streaming the body with aiohttp.
+        """
+        path = self.path_for(url)
+        if path is not None:
+            metrics.cache_requests.inc(cache="images", result="hit")
+            return path
+        metrics.cache_requests.inc(cache="images", result="miss")
+
+        async with http_client.request_async(url) as response:
+            response.raise_for_status()
+            extension = _extension(url, response.headers.get("Content-Type"))
+            with _Download(self._tmp_dir) as download:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    download.write(chunk)
+
+        # Moving the file, the ingest hook and the index update block, keep them off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self._ingest, url, download, extension)
+
+    async def fetch_many(self, urls, max_concurrent=8):
+        """
+        Download many images concurrently.
+
+        Params:
+        urls (iterable): The media URLs, duplicates are downloaded once
+        max_concurrent (int): Maximum number of downloads in flight
+
+        Returns:
+        dict: Each URL mapped to its local path, or None if its download failed
+        """
+        semaphore = asyncio.Semaphore(max_concurrent)
+        unique = list(dict.fromkeys(urls))
+
+        async def fetch_with_semaphore(url):
+            async with semaphore:
+                try:
+                    return await self.fetch_async(url)
+                except Exception as e:
+                    logger.warning("Failed to download %s: %s", url, e)
+                    return None
+
+        paths = await asyncio.gather(*(fetch_with_semaphore(url) for url in unique))
+        return dict(zip(unique, paths))
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def evict(self, max_bytes=None):
+        """
+        Delete least recently used objects until the store fits in `max_bytes`.
+
+        Returns:
+        int: The number of objects removed
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        with self._lock:
+            removed = self._evict(max_bytes)
+            self._conn.commit()
+            return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _ingest(self, url, download, extension):
+        digest = download.digest
+        directory = os.path.join(self._objects_dir, digest[:2])
+        path = os.path.join(directory, digest + extension)
+        os.makedirs(directory, exist_ok=True)
+
+        # Identical content downloaded before (from another URL) is kept only once
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM objects WHERE hash = ?", (digest,)).fetchone()
+        if os.path.exists(path):
+            os.remove(download.path)
+        else:
+            os.replace(download.path, path)
+
+        # The hook (e.g. a Pillow resize) runs outside the lock, so other downloads aren't held up by it
+        size = download.size
+        if row is not None:
+            size = row[0]
+        elif self.ingest is not None:
+            size += self._run_ingest(path)
+
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objects (hash, path, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (digest, path, size, now)
+            )
+            self._conn.execute("INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)", (url, digest))
+
+            # Never evict the object we were just asked for
+            self._evict(self.max_bytes, keep=digest)
+            self._conn.commit()
+        return path
+
+    def _run_ingest(self, path):
+        # Derived files count towards the object's size, a failing hook only loses them
+        try:
+            return sum(os.path.getsize(extra) for extra in self.ingest(path))
+        except Exception as e:
+            logger.warning("Ingesting %s failed: %s", path, e)
+            return 0
+
+    def _evict(self, max_bytes, keep=None):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        removed = 0
+        if total <= max_bytes:
+            return removed
+
+        rows = self._conn.execute("SELECT hash, size FROM objects ORDER BY accessed_at ASC").fetchall()
+        for digest, size in rows:
+            if total <= max_bytes:
+                break
+            if digest == keep:
+                continue
+            self._forget(digest)
+            total -= size
+            removed += 1
+        return removed
+
+    def _forget(self, digest):
+        row = self._conn.execute("SELECT path FROM objects WHERE hash = ?", (digest,)).fetchone()
+        if row is not None:
+            # Remove the object together with whatever the ingest hook derived from it
+            directory = os.path.dirname(row[0])
+            if os.path.exists(directory):
+                for name in os.listdir(directory):
+                    if name.startswith(digest):
+                        os.remove(os.path.join(directory, name))
+        self._conn.execute("DELETE FROM objects WHERE hash = ?", (digest,))
+        self._conn.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+
+
+class _Download:
+    """
+    Temporary file that hashes and counts what is written to it.
+    """
+
+    def __init__(self, tmp_dir):
+        self._file = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+        self.path = self._file.name
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.digest = None
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._file.close()
+        if exc_type is not None:
+            # Don't leave half-written downloads behind
+            os.remove(self.path)
+            return False
+        self.digest = self._hash.hexdigest()
+        return False
+
+
+def _extension(url, content_type):
+    # Prefer the Content-Type, fall back to the URL's own extension
+    if content_type:
+        extension = EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+        if extension:
+            return extension
+    extension = os.path.splitext(urlsplit(url).path)[1].lower()
+    if extension in EXTENSIONS.values() or extension in (".jpeg",):
+        return extension
+    return ".img"
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_default_store():
+    """
+    Return the process-wide image store, opening it on first use.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ImageStore(ingest=image_variants.make_display_variants)
+        return _default_store
+
+def set_default_store(store):
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
@@ -0,0 +1,95 @@
+import os
+from lazy_loading import lazy_import
+
+# Pillow is loaded when the first variant is looked up or written
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+features = lazy_import("PIL.features")
+
+# Size the quiz window shows images at
+DISPLAY_SIZE = (400, 400)
+
+VARIANT_QUALITY = 80
+
+# Decided on first use, asking Pillow about its codecs means importing it
+_variant_format = None
+
+def variant_format():
+    """
+    Return the format variants are written in.
+
+    WebP is much smaller than JPEG at the same quality, but Pillow may be built without it.
+    """
+    global _variant_format
+    if _variant_format is None:
+        _variant_format = "WEBP" if features.check("webp") else "JPEG"
+    return _variant_format
+
+def variant_extension():
+    return ".webp" if variant_format() == "WEBP" else ".jpg"
+
+def __getattr__(name):
+    # VARIANT_FORMAT and VARIANT_EXTENSION stay readable as module attributes without being computed at import
+    if name == "VARIANT_FORMAT":
+        return variant_format()
+    if name == "VARIANT_EXTENSION":
+        return variant_extension()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def variant_path(image_path, size=DISPLAY_SIZE):
+    """
+    Return where the variant of an image at `size` lives, next to the original.
+    """
+    base = os.path.splitext(image_path)[0]
+    return f"{base}.{size[0]}x{size[1]}{variant_extension()}"
+
+def make_variant(image_path, size=DISPLAY_SIZE):
+    """
+    Write a downscaled copy of an image that fits within `size`.
+
+    JPEGs are decoded straight at a reduced scale with draft(), which lets the
+    decoder skip most of the work for large photos. Other formats are shrunk by an
+    integer factor with reduce() before the final high quality resize.
+
+    Params:
+    image_path (str): The original image
+    size (tuple): The bounding box of the variant (default is the quiz display size)
+
+    Returns:
+    str: The path of the variant
+    """
+    target = variant_path(image_path, size)
+
+    with Image.open(image_path) as img:
+        if img.format == "JPEG":
+            # Pick the largest DCT scale (1/2, 1/4 or 1/8) that still covers the target size
+            img.draft("RGB", size)
+        else:
+            factor = min(img.width // size[0], img.height // size[1])
+            if factor > 1:
+                img = img.reduce(factor)
+
+        # Apply the EXIF orientation before resizing, the variant carries no EXIF
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(size)
+
+        if img.mode not in ("RGB", "RGBA") or (img.mode == "RGBA" and variant_format() == "JPEG"):
+            img = img.convert("RGB")
+        img.save(target, variant_format(), quality=VARIANT_QUALITY)
+
+    return target
+
+def make_display_variants(image_path):
+    """
+    Ingest hook for the image store: build the display variant and return the files created.
+    """
+    return [make_variant(image_path, DISPLAY_SIZE)]
+
+def display_path(image_path, size=DISPLAY_SIZE):
+    """
+    Return the prebuilt display variant of an image if there is one, otherwise the image itself.
+    """
+    if image_path is None:
+        return None
+    target = variant_path(image_path, size)
+    return target if os.path.exists(target) else image_path
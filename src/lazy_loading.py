@@ -0,0 +1,64 @@
+import importlib.util
+import sys
+import types
+
+class MissingModule(types.ModuleType):
+    """
+    Stands in for a dependency that isn't installed, raising on first use instead of at import.
+    """
+
+    def __getattr__(self, attribute):
+        raise ModuleNotFoundError(
+            f"{self.__name__} is needed for this, install it (see requirements.txt)", name=self.__name__
+        )
+
+
+def lazy_import(name, optional=False):
+    """
+    Return a module that is only executed when one of its attributes is first used.
+
+    Importing selenium, aiohttp or Pillow takes longer than everything else a worker
+    imports, so modules bind them with lazy_import and only the code paths that use
+    them pay for it. Submodules of a package (e.g. 'PIL.Image') import the package
+    itself right away, which is cheap for the ones used here.
+
+    Params:
+    name (str): The module's full name
+    optional (bool): Return None if the module isn't installed instead of a MissingModule (default is False)
+
+    Returns:
+    module: The lazily executed module (the module itself if it was already imported)
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except ModuleNotFoundError:
+        spec = None
+    if spec is None:
+        return None if optional else MissingModule(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    # A regular import also binds a submodule on its package
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+def is_loaded(name):
+    """
+    Return True if module `name` has actually been executed, not just bound lazily.
+    """
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    # isinstance() would look up __class__ on the module, which is enough to execute a lazy one
+    kind = type(module)
+    return kind is not MissingModule and kind.__name__ != "_LazyModule"
@@ -0,0 +1,196 @@
+from urllib.parse import urlsplit
+import bisect
+import json
+import re
+import threading
+
+# Latency buckets in seconds, from a local cache hit to a slow paged search
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Counter:
+    """
+    A monotonically increasing count per label combination.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets per label combination, Prometheus style.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), the sum and the count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(_label_key(self, labels))
+            return 0 if state is None else state[2]
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + "_bucket", dict(labels, le=_format_bound(bound)), cumulative))
+                samples.append((self.name + "_sum", labels, total))
+                samples.append((self.name + "_count", labels, count))
+        return samples
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Registry:
+    """
+    The set of metrics a process exposes, rendered as Prometheus text or JSON.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def to_prometheus(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._all():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        """
+        Return every metric as {name: {"type", "help", "samples": [{"labels", "value"}]}}.
+        """
+        return {
+            metric.name: {
+                'type': metric.kind,
+                'help': metric.help,
+                'samples': [{'name': name, 'labels': labels, 'value': value} for name, labels, value in metric.samples()],
+            }
+            for metric in self._all()
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def reset(self):
+        for metric in self._all():
+            metric.reset()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def _all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+
+def _label_key(metric, labels):
+    return tuple(str(labels.get(name, "")) for name in metric.labelnames)
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+# Numeric and UUID-like path segments (taxon keys, dataset keys) would make one endpoint per record
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8}-[0-9a-f-]{27,})$")
+
+def endpoint(url):
+    """
+    Return a URL's endpoint label: host and path, with record keys replaced by {key}.
+    """
+    parts = urlsplit(url)
+    path = "/".join("{key}" if _ID_SEGMENT.match(segment) else segment for segment in parts.path.split("/"))
+    return (parts.hostname or "") + path
+
+
+# The process-wide registry and the metrics the project records
+registry = Registry()
+
+http_requests = registry.counter(
+    "quinsectz_http_requests_total", "HTTP request attempts by endpoint and status (error for timeouts and connection errors)",
+    ("endpoint", "status"))
+http_request_seconds = registry.histogram(
+    "quinsectz_http_request_seconds", "Latency of HTTP request attempts, until the response headers arrived",
+    ("endpoint",))
+http_response_bytes = registry.counter(
+    "quinsectz_http_response_bytes_total", "Response body bytes received, as announced by Content-Length",
+    ("endpoint",))
+http_retries = registry.counter(
+    "quinsectz_http_retries_total", "HTTP attempts that were retried, by reason (a status code, timeout or connection)",
+    ("endpoint", "reason"))
+cache_requests = registry.counter(
+    "quinsectz_cache_requests_total", "Cache lookups by cache and result (hit, miss, stale, revalidated)",
+    ("cache", "result"))
@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Optional
+import heapq
+import threading
+import unicodedata
+
+# Sorts after every character a folded name can contain, so prefix + _LAST bounds the names starting with prefix
+_LAST = chr(0x10FFFF)
+
+def fold(text):
+    """
+    Return `text` lower-cased and without diacritics, the form names are compared in.
+    """
+    text = unicodedata.normalize("NFKD", text.replace("æ", "ae").replace("œ", "oe").replace("Æ", "Ae").replace("Œ", "Oe"))
+    return " ".join("".join(character for character in text if not unicodedata.combining(character)).casefold().split())
+
+def _prefix_range(keys, prefix):
+    # Positions of the sorted keys starting with prefix
+    low = bisect_left(keys, prefix)
+    return low, bisect_left(keys, prefix + _LAST, low)
+
+@dataclass
+class Completion:
+    name: str # The name as displayed
+    rank: Optional[str] # Its rank, if known (e.g. "family")
+    weight: float # Its popularity, completions are sorted by it
+    key: object = None # The taxon key, if known
+
+
+class NameCompleter:
+    """
+    In-memory prefix index suggesting names as they are typed.
+
+    Names are kept in a sorted array of their folded forms (see fold), so the
+    names starting with a prefix are the range between two binary searches, and
+    a prefix's suggestions are the `size` heaviest names in that range. Prefixes
+    matching more than `max_scan` names have their suggestions worked out when
+    the index is built, so no keystroke looks at more than `max_scan` names.
+    Names can be added at any time; the index is rebuilt lazily on the next
+    lookup, so a batch of additions costs one rebuild.
+    """
+
+    def __init__(self, size=8, max_scan=256):
+        # Suggestions kept per precomputed prefix, the most complete() returns from them
+        self.size = size
+        self.max_scan = max_scan
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        # Sorted folded names, their Completions, and prefix -> suggestions; None until the next lookup
+        self._keys = None
+        self._completions = None
+        self._top = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return fold(name) in self._entries
+
+    def add(self, name, weight=1, rank=None, key=None):
+        """
+        Add a name, or raise the weight of one already known under the same folded form.
+        """
+        folded = fold(name)
+        if not folded:
+            return
+        with self._lock:
+            entry = self._entries.get(folded)
+            if entry is None:
+                self._entries[folded] = Completion(name, rank, weight, key)
+            elif weight > entry.weight:
+                self._entries[folded] = Completion(entry.name, entry.rank or rank, weight, entry.key if entry.key is not None else key)
+            else:
+                return
+            self._keys = None
+
+    def add_taxa(self, taxa, weights=None, rank=None, default_weight=0):
+        """
+        Add the names of GBIF or ChecklistBank taxon records.
+
+        Params:
+        taxa (iterable): Records with a canonicalName or scientificName, and a key
+        weights (dict): taxon key -> popularity (e.g. image counts from an ImageIndex)
+        rank (str): The rank of names whose record doesn't say (default is unknown)
+        default_weight (float): The popularity of taxa missing from `weights`
+        """
+        weights = weights or {}
+        for taxon in taxa:
+            name = taxon.get("canonicalName") or taxon.get("scientificName")
+            if name:
+                key = taxon.get("key")
+                self.add(name, weights.get(key, default_weight), (taxon.get("rank") or rank or "").lower() or None, key)
+
+    def complete(self, prefix, limit=None):
+        """
+        Return the most popular names starting with `prefix`, ignoring case and diacritics.
+
+        Params:
+        prefix (str): What has been typed so far
+        limit (int): Maximum number of suggestions (default is the completer's size)
+
+        Returns:
+        list: Completions sorted by decreasing weight, then alphabetically
+        """
+        limit = self.size if limit is None else limit
+        folded = fold(prefix)
+        keys, completions, top = self._built()
+        if folded in top and limit <= self.size:
+            return top[folded][:limit]
+        return self._range_top(keys, completions, folded, limit)
+
+    def _built(self):
+        with self._lock:
+            if self._keys is None:
+                keys = sorted(self._entries)
+                completions = [self._entries[folded] for folded in keys]
+
+                # The suggestions of the prefixes matching too many names to scan, from the empty one down
+                top = {}
+                pending = [""]
+                while pending:
+                    prefix = pending.pop()
+                    top[prefix] = self._range_top(keys, completions, prefix, self.size)
+                    low, high = _prefix_range(keys, prefix)
+                    if high - low > self.max_scan:
+                        depth = len(prefix)
+                        pending.extend({prefix + folded[depth] for folded in keys[low:high] if len(folded) > depth})
+                self._keys, self._completions, self._top = keys, completions, top
+            return self._keys, self._completions, self._top
+
+    @staticmethod
+    def _range_top(keys, completions, prefix, limit):
+        low, high = _prefix_range(keys, prefix)
+        # nlargest keeps the alphabetical order of names weighing the same
+        return heapq.nlargest(limit, completions[low:high], key=lambda completion: completion.weight)
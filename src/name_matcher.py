@@ -0,0 +1,326 @@
+from collections import Counter
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Optional
+import heapq
+import re
+import threading
+import unicodedata
+from ranks import Rank, parse_rank
+
+# Words that mark a rank or a doubtful identification inside a name, not part of the canonical name
+_MARKERS = {"subsp", "ssp", "var", "subvar", "f", "fo", "forma", "cf", "aff", "sp", "spp", "nothosubsp", "agg", "x"}
+
+# Words authorships are joined with
+_AUTHOR_JOINERS = {"&", "et", "ex", "in", "and"}
+
+# Latin endings that differ between the genders or spellings of one epithet (niger/nigra/nigrum, smithi/smithii), longest first
+_ENDINGS = ("ensis", "ense", "rum", "ius", "ium", "ia", "ii", "ae", "us", "um", "is", "es", "er", "ra", "a", "e", "i", "o")
+
+# An epithet keeps at least this many letters when its ending is cut off
+_MIN_STEM = 3
+
+# Fuzzy candidates whose edit distance is worked out, the rest are ranked by trigrams alone
+_EDIT_CHECKED = 3
+
+# Names further apart than this many edits are left to their trigram score, and match keys
+# further apart in length than this aren't fuzzy candidates at all
+_MAX_EDITS = 3
+
+# One typo changes at most three trigrams, so a name one typo away from the query is in
+# at least one of any four of the query's posting lists: the rarest four give the candidates.
+# More lists do while they hold no more than _SEED_BUDGET entries between them, so that on a
+# short list names a few typos away are candidates too
+_SEED_LISTS = 4
+_SEED_BUDGET = 300
+
+# Scores of candidates whose canonical name or stemmed name equals the query's
+EXACT_SCORE = 1.0
+STEM_SCORE = 0.95
+
+@dataclass
+class Candidate:
+    name: str # The name as imported
+    canonical: str # Its normalized canonical form
+    key: object # The id the name was imported with (e.g. a usage key)
+    rank: Optional[str] # The rank the name was imported with, if any
+    score: float # 1.0 for the same canonical name, lower the further apart the names are
+
+
+def canonical_name(name):
+    """
+    Reduce a scientific name to its lower-case canonical form.
+
+    Drops the authorship and year, a subgenus or anything else in brackets, rank
+    markers (subsp., var.), hybrid signs and diacritics, so "Carabus (Carabus)
+    granulatus Linnæus, 1758" becomes "carabus granulatus".
+    """
+    text = unicodedata.normalize("NFKD", name.replace("×", " ").replace("æ", "ae").replace("œ", "oe"))
+    text = "".join(character for character in text if not unicodedata.combining(character))
+    text = re.sub(r"\([^)]*\)|\[[^\]]*\]", " ", text).replace(",", " ")
+
+    words = []
+    for token in text.split():
+        word = token.rstrip(".")
+        lowered = word.lower()
+        if not words:
+            # The genus (or a name of higher rank)
+            if word.isalpha():
+                words.append(lowered)
+            continue
+        if lowered in _MARKERS:
+            continue
+        # An authorship starts with a capitalized name, a year or a joiner
+        if word[:1].isupper() or not word.replace("-", "").isalpha() or lowered in _AUTHOR_JOINERS:
+            break
+        words.append(lowered)
+    return " ".join(words)
+
+def _stem(epithet):
+    for ending in _ENDINGS:
+        if epithet.endswith(ending) and len(epithet) - len(ending) >= _MIN_STEM:
+            return epithet[:-len(ending)]
+    return epithet
+
+def match_key(canonical):
+    """
+    Return the key names are compared by: the canonical name with the epithets' endings cut off.
+    """
+    words = canonical.split()
+    return " ".join(words[:1] + [_stem(word) for word in words[1:]])
+
+def trigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _edit_similarity(first, second, max_edits=_MAX_EDITS):
+    # 1 - Levenshtein distance / length of the longer name, 0 beyond max_edits
+    if first == second:
+        return 1.0
+    longest = max(len(first), len(second))
+    if abs(len(first) - len(second)) > max_edits:
+        return 0.0
+    # A shared prefix and suffix don't change the distance, around a typo they are most of the name
+    start = 0
+    shortest = min(len(first), len(second))
+    while start < shortest and first[start] == second[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and first[-1 - end] == second[-1 - end]:
+        end += 1
+    first, second = first[start:len(first) - end], second[start:len(second) - end]
+    # Only cells within max_edits of the diagonal can stay within max_edits
+    beyond = max_edits + 1
+    previous = list(range(len(second) + 1))
+    for i, character in enumerate(first, 1):
+        low, high = max(1, i - max_edits), min(len(second), i + max_edits)
+        current = [i if low == 1 else beyond] + [beyond] * len(second)
+        for j in range(low, high + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (character != second[j - 1]))
+        if min(current[low - 1:high + 1]) > max_edits:
+            return 0.0
+        previous = current
+    distance = previous[-1]
+    return 0.0 if distance > max_edits else 1.0 - distance / longest
+
+def _dice(first, second):
+    if not first or not second:
+        return 0.0
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+class NameMatcher:
+    """
+    Local fuzzy matcher over a list of scientific names.
+
+    Names are normalized to their canonical form (see canonical_name) and indexed
+    by the trigrams of their match key, the canonical name with Latin endings cut
+    off. A query is answered from a dictionary when its canonical or stemmed name
+    is known. Otherwise the candidates are the names of about its length in the
+    posting lists of its rarest trigrams; the trigrams they share with it are
+    counted over the other lists, the best of them are scored with the Dice
+    coefficient and the closest few by edit distance.
+    """
+
+    def __init__(self, posting_budget=3000):
+        # How many more posting list entries a fuzzy query reads past the candidates' lists, rarest first
+        self.posting_budget = posting_budget
+        self._lock = threading.Lock()
+
+        # Parallel lists, a name's position is its id
+        self.names = []
+        self.canonical = []
+        self.keys = []
+        self.ranks = []
+        self._match_keys = []
+
+        # Canonical names and match keys -> ids, trigram -> match key length -> ids
+        self._by_canonical = {}
+        self._by_match_key = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, key=None, rank=None):
+        """
+        Add a name to the matcher; `key` is returned with its matches (default is the name itself).
+        """
+        canonical = canonical_name(name)
+        if not canonical:
+            return
+        rank = parse_rank(rank, Rank.UNRANKED).value if rank else None
+        stemmed = match_key(canonical)
+        with self._lock:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.canonical.append(canonical)
+            self.keys.append(name if key is None else key)
+            self.ranks.append(rank)
+            self._match_keys.append(stemmed)
+            self._by_canonical.setdefault(canonical, []).append(name_id)
+            self._by_match_key.setdefault(stemmed, []).append(name_id)
+            for gram in trigrams(stemmed):
+                self._postings.setdefault(gram, {}).setdefault(len(stemmed), []).append(name_id)
+
+    def add_many(self, names):
+        """
+        Add (name, key, rank) tuples, (name, key) pairs or plain names.
+        """
+        for entry in names:
+            if isinstance(entry, str):
+                self.add(entry)
+            else:
+                self.add(*entry)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a matcher from GBIF or ChecklistBank style records (scientificName, key, rank).
+        """
+        matcher = cls()
+        for record in records:
+            name = record.get("scientificName") or record.get("canonicalName")
+            if name:
+                matcher.add(name, record.get("key", record.get("usageKey")), record.get("rank"))
+        return matcher
+
+    @classmethod
+    def from_backbone(cls, store):
+        """
+        Build a matcher over every taxon of a BackboneStore, keyed by GBIF taxon key.
+        """
+        from backbone_store import RANKS
+        matcher = cls()
+        for row in range(len(store)):
+            matcher.add(store.names[store.scientific[row]], store.keys[row], RANKS[store.ranks[row]])
+        return matcher
+
+    @classmethod
+    def load(cls, path):
+        """
+        Build a matcher from a name list: one name per line, optionally followed by a tab, its key, a tab and its rank.
+        """
+        matcher = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\r\n").split("\t")
+                if not fields[0]:
+                    continue
+                key = fields[1] if len(fields) > 1 and fields[1] else None
+                rank = fields[2] if len(fields) > 2 and fields[2] else None
+                matcher.add(fields[0], key, rank)
+        return matcher
+
+    def match(self, name, rank=None, limit=5):
+        """
+        Return the names closest to `name`, best first.
+
+        Params:
+        name (str): The scientific name, with or without authorship
+        rank (str or Rank): Only consider names imported with this rank (default is any)
+        limit (int): Maximum number of candidates
+
+        Returns:
+        list: Candidates sorted by decreasing score
+        """
+        canonical = canonical_name(name)
+        if not canonical:
+            return []
+        rank = parse_rank(rank, Rank.UNRANKED).value if rank else None
+        stemmed = match_key(canonical)
+
+        scores = {}
+        for name_id in self._by_canonical.get(canonical, ()):
+            scores[name_id] = EXACT_SCORE
+        for name_id in self._by_match_key.get(stemmed, ()):
+            scores.setdefault(name_id, STEM_SCORE)
+        if rank is not None:
+            scores = {name_id: score for name_id, score in scores.items() if self.ranks[name_id] in (rank, None)}
+
+        # A known spelling is the answer, the trigram search is for names the list doesn't have as such
+        if not scores:
+            scores = self._fuzzy(canonical, stemmed, rank, limit)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [
+            Candidate(self.names[name_id], self.canonical[name_id], self.keys[name_id], self.ranks[name_id], score)
+            for name_id, score in best
+        ]
+
+    def _fuzzy(self, canonical, stemmed, rank, limit):
+        # Per trigram of the query, the posting lists of the names within _MAX_EDITS of its length
+        lengths = range(len(stemmed) - _MAX_EDITS, len(stemmed) + _MAX_EDITS + 1)
+        query = trigrams(stemmed)
+        lists = []
+        for gram in query:
+            by_length = self._postings.get(gram, {})
+            buckets = [by_length[length] for length in lengths if length in by_length]
+            lists.append((sum(map(len, buckets)), buckets))
+        lists.sort(key=itemgetter(0))
+
+        # Count shared trigrams for the names of the rarest lists, then over the next lists within the budget
+        shared = Counter()
+        seeded = 0
+        position = 0
+        while position < len(lists) and (position < _SEED_LISTS or seeded + lists[position][0] <= _SEED_BUDGET):
+            seeded += lists[position][0]
+            for postings in lists[position][1]:
+                shared.update(postings)
+            position += 1
+        candidates = set(shared)
+        visited = 0
+        for size, buckets in lists[position:]:
+            visited += size
+            if visited > self.posting_budget:
+                break
+            for postings in buckets:
+                shared.update(candidates.intersection(postings))
+        if rank is not None:
+            shared = Counter({name_id: count for name_id, count in shared.items() if self.ranks[name_id] in (rank, None)})
+
+        # Dice coefficients for the names sharing the most trigrams
+        scores = {
+            name_id: _dice(query, trigrams(self._match_keys[name_id]))
+            for name_id, _ in shared.most_common(limit * 4)
+        }
+
+        # One typo changes up to three trigrams, the edit distance is fairer to the closest names
+        for name_id in heapq.nlargest(_EDIT_CHECKED, scores, key=scores.get):
+            scores[name_id] = max(scores[name_id], _edit_similarity(canonical, self.canonical[name_id]))
+
+        # Scaled below a stemmed match, so a typo never outranks a known spelling
+        return {name_id: score * STEM_SCORE for name_id, score in scores.items()}
+
+
+def is_confident(candidates, min_score=0.85, margin=0.03):
+    """
+    Return True if the best candidate is good enough and clearly ahead of any other taxon.
+    """
+    if not candidates or candidates[0].score < min_score:
+        return False
+    best = candidates[0]
+    return all(
+        candidate.key == best.key or candidate.score <= best.score - margin
+        for candidate in candidates[1:]
+    )
@@ -0,0 +1,148 @@
+import http_client
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+from taxonomy_cache import get_default_cache, make_key
+from ranks import Rank
+
+class NameResolver:
+    """
+    Shared name -> GBIF backbone match resolver.
+
+    Matches are looked up in an in-memory LRU first, then in the persistent taxonomy
+    cache, and only then with a name_backbone request. Concurrent requests for the
+    same name wait on the one already in flight instead of sending their own.
+    """
+
+    def __init__(self, maxsize=4096, cache=None, ttl=None, max_workers=16):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._cache = cache
+        self._lru = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name, rank=None):
+        """
+        Return the name_backbone match for a name.
+
+        Params:
+        name (str or int): A scientific name, or a GBIF usageKey which is looked up directly
+        rank (str or Rank): Optional rank to match at (e.g. 'family')
+
+        Returns:
+        dict: The match, with 'usageKey' set when a taxon was found
+        """
+        if isinstance(name, int):
+            return self._resolve(("key", name), lambda: _usage(name))
+
+        lookup = (name.strip().lower(), _rank_name(rank))
+        return self._resolve(lookup, lambda: _name_backbone(name, lookup[1]))
+
+    def usage_key(self, name, rank=None):
+        """
+        Return the GBIF usageKey of a name (usageKeys are returned unchanged).
+        """
+        if isinstance(name, int):
+            return name
+        return self.resolve(name, rank=rank)['usageKey']
+
+    def resolve_many(self, names, rank=None):
+        """
+        Resolve many names concurrently.
+
+        Params:
+        names (iterable): Scientific names and/or usageKeys, duplicates are only resolved once
+        rank (str): Optional rank to match every name at
+
+        Returns:
+        dict: Each distinct input mapped to its match
+        """
+        unique = list(dict.fromkeys(names))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            matches = executor.map(lambda name: self.resolve(name, rank=rank), unique)
+            return dict(zip(unique, matches))
+
+    def invalidate(self, name=None, rank=None):
+        """
+        Forget one name (or every name) in both the LRU and the persistent cache.
+        """
+        store = self._store()
+        with self._lock:
+            if name is None:
+                self._lru.clear()
+                return store.invalidate(prefix="name_backbone:")
+
+            lookup = ("key", name) if isinstance(name, int) else (name.strip().lower(), _rank_name(rank))
+            self._lru.pop(lookup, None)
+            return store.invalidate(key=make_key("name_backbone", list(lookup)))
+
+    def _store(self):
+        return self._cache if self._cache is not None else get_default_cache()
+
+    def _resolve(self, lookup, fetch):
+        with self._lock:
+            match = self._lru.get(lookup)
+            if match is not None:
+                self._lru.move_to_end(lookup)
+                return match
+
+            future = self._inflight.get(lookup)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[lookup] = future
+
+        # Someone else is already resolving this name, share their answer
+        if not owner:
+            return future.result()
+
+        try:
+            cache_key = make_key("name_backbone", list(lookup))
+            match = self._store().get(cache_key)
+            if match is None:
+                match = fetch()
+                self._store().set(cache_key, match, self.ttl)
+        except BaseException as e:
+            # Interrupts too, or the name would stay in flight and every later lookup would wait forever
+            with self._lock:
+                del self._inflight[lookup]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._lru[lookup] = match
+            if len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+            del self._inflight[lookup]
+        future.set_result(match)
+        return match
+
+
+def _rank_name(rank):
+    # Lookups are keyed by the lower-cased rank name, whether it came as a string or a Rank
+    if isinstance(rank, Rank):
+        return rank.value.lower()
+    return rank.lower() if rank else None
+
+def _name_backbone(name, rank):
+    # The match pygbif's species.name_backbone requests, over the shared pooled client
+    params = {'name': name, 'rank': rank, 'strict': False, 'verbose': False}
+    return http_client.get_json(http_client.GBIF_API_URL + 'species/match', params=params)
+
+def _usage(key):
+    # name_usage records use 'key', give them the same 'usageKey' name_backbone matches have
+    match = http_client.get_json(http_client.GBIF_API_URL + f'species/{key}')
+    match.setdefault('usageKey', match.get('key'))
+    return match
+
+
+# Process-wide resolver shared by quinsectz and the demos
+resolver = NameResolver()
+
+def resolve(name, rank=None):
+    return resolver.resolve(name, rank=rank)
+
+def resolve_many(names, rank=None):
+    return resolver.resolve_many(names, rank=rank)
@@ -0,0 +1,280 @@
+from dataclasses import dataclass, field
+from typing import List
+import collections
+import logging
+import random
+import threading
+import time
+import quinsectz as qi
+import image_requestor as imgr
+import image_index
+import image_variants
+from image_source import ScraperImageSource
+from name_completer import NameCompleter
+from name_matcher import canonical_name
+from taxon_sampler import TaxonSampler
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Question:
+    image_path: str # The image, already on disk
+    choices: List[str] # The shuffled family names to pick from
+    answer: str # The correct family name
+    species_name: str = ""
+    family: dict = field(default_factory=dict)
+    genus: dict = field(default_factory=dict)
+
+    def answered_by(self, typed):
+        """
+        Return the rank a typed answer names correctly ("family", or "genus" for the pictured genus), or None.
+
+        Case, diacritics and authorship don't matter.
+        """
+        typed = canonical_name(typed)
+        if not typed:
+            return None
+        if typed == canonical_name(self.answer):
+            return "family"
+        genus_name = self.genus.get('canonicalName') or self.genus.get('scientificName')
+        if genus_name and typed == canonical_name(genus_name):
+            return "genus"
+        return None
+
+
+class QuestionPipeline:
+    """
+    Keeps a bounded queue of fully built questions filled in the background.
+
+    `producers` threads call `build_question` until the queue holds
+    `high_watermark` questions, then rest until it drains to `low_watermark`,
+    so the UI only ever pops a ready question.
+    """
+
+    def __init__(self, build_question, high_watermark=5, low_watermark=2, producers=2, retry_delay=1.0):
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError("low_watermark must be at least 0 and below high_watermark")
+
+        self.build_question = build_question
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.producers = producers
+        self.retry_delay = retry_delay
+
+        self._questions = collections.deque()
+        self._building = 0
+        self._filling = True
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.producers):
+            thread = threading.Thread(target=self._produce, name=f"question-producer-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the producers and wait for them to finish the question they are building.
+
+        Params:
+        timeout (float): Seconds to wait for them in all (default is to wait until they finish)
+
+        Returns:
+        bool: Whether every producer finished in time
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        return not self._threads
+
+    def qsize(self):
+        with self._condition:
+            return len(self._questions)
+
+    def get(self, timeout=None):
+        """
+        Pop the next ready question.
+
+        Params:
+        timeout (float): Seconds to wait for one (default is to wait forever, 0 doesn't wait)
+
+        Returns:
+        Question: The question, or None if none was ready in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._questions:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if self._stopped or (remaining is not None and remaining <= 0):
+                    return None
+                self._condition.wait(remaining)
+
+            question = self._questions.popleft()
+
+            # Wake the producers once the queue has drained to the low watermark
+            if len(self._questions) <= self.low_watermark:
+                self._filling = True
+                self._condition.notify_all()
+            return question
+
+    def _produce(self):
+        while True:
+            with self._condition:
+                # Builds in progress count towards the high watermark so producers don't overshoot it
+                while not self._stopped and (not self._filling or len(self._questions) + self._building >= self.high_watermark):
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                self._building += 1
+
+            try:
+                question = self.build_question()
+            except Exception as e:
+                logger.warning("Building a question failed: %s", e)
+                question = None
+
+            with self._condition:
+                self._building -= 1
+                if question is not None:
+                    self._questions.append(question)
+                    if len(self._questions) >= self.high_watermark:
+                        self._filling = False
+                self._condition.notify_all()
+
+            if question is None:
+                # Back off before trying again, unless the pipeline is stopped meanwhile
+                with self._condition:
+                    self._condition.wait_for(lambda: self._stopped, self.retry_delay)
+
+
+# One taxon sampler per class, shared by every producer
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+def get_sampler(class_name):
+    """
+    Return the (family, genus) sampler of a class, creating it on first use.
+    """
+    with _samplers_lock:
+        sampler = _samplers.get(class_name)
+        if sampler is None:
+            # Weight families and genera by their image counts, those without images are never drawn
+            index = image_index.get_default_index()
+            class_key = index.build(class_name)
+            sampler = _samplers[class_name] = TaxonSampler(
+                qi.families_in_class(class_name),
+                lambda family_key: _fetch_genera(class_name, family_key),
+                family_weights=index.counts(class_key, 'family'),
+                genus_weights=index.counts(class_key, 'genus'),
+                prior_weight=0
+            )
+        return sampler
+
+# One name completer per class, for typed answers
+_completers = {}
+_completers_lock = threading.Lock()
+
+def get_completer(class_name):
+    """
+    Return the completer over the family names of a class, creating it on first use.
+
+    Names are weighted by their image counts, so well photographed taxa are
+    suggested first. The genera of a family are added once the sampler has
+    drawn it.
+    """
+    with _completers_lock:
+        completer = _completers.get(class_name)
+        if completer is None:
+            index = image_index.get_default_index()
+            class_key = index.build(class_name)
+            completer = _completers[class_name] = NameCompleter()
+            completer.add_taxa(qi.families_in_class(class_name), index.counts(class_key, 'family'), rank="family")
+        return completer
+
+def _fetch_genera(class_name, family_key):
+    genera = qi.genus_in_family(family_key, with_images=True)
+    # Only a class played in typed mode has a completer to feed
+    completer = _completers.get(class_name)
+    if completer is not None:
+        index = image_index.get_default_index()
+        completer.add_taxa(genera, index.counts(index.build(class_name), 'genus'), rank="genus")
+    return genera
+
+def choose_family_and_genus(sampler):
+    # Families without genera are weighted out by the sampler instead of retried here
+    family, genus = sampler.draw()
+    logger.debug("Randomly selected family %s, genus %s", family['scientificName'], genus['scientificName'])
+    return family, genus
+
+def make_choices(family, choice_number=4):
+    # The correct family and up to choice_number - 1 of its siblings, shuffled
+    family_siblings = qi.sibling_families(family['key'])
+
+    if len(family_siblings) >= choice_number - 1:
+        other_choices = random.sample(family_siblings, choice_number - 1)
+    else:
+        other_choices = family_siblings
+
+    choices = [family['scientificName']] + [choice['scientificName'] for choice in other_choices]
+    random.shuffle(choices)
+    return choices
+
+def build_api_question(class_name="Insecta"):
+    """
+    Build one question using the GBIF occurrence API for the image.
+
+    Returns:
+    Question: The question, or None if the drawn genus had no usable image
+    """
+    sampler = get_sampler(class_name)
+    family, genus = choose_family_and_genus(sampler)
+
+    image_info = imgr.select_random_image(genus['key'])
+    if not image_info or not image_info[0]:
+        # Don't draw a genus without images again
+        if image_info == ("", ""):
+            sampler.set_genus_weight(family['key'], genus['key'], 0)
+        return None
+
+    # The store builds the display-sized variant at download time, the quiz shows that one
+    image_path = image_variants.display_path(imgr.save_image(image_info, 0))
+    if image_path is None:
+        return None
+
+    return Question(image_path, make_choices(family), family['scientificName'], image_info[0], family, genus)
+
+def make_source_question_builder(image_source, class_name="Insecta"):
+    """
+    Return a build function taking its images from an image_source.ImageSource.
+
+    Genera the source finds no image for are never drawn again.
+    """
+    def build_source_question():
+        sampler = get_sampler(class_name)
+        family, genus = choose_family_and_genus(sampler)
+
+        result = image_source.fetch(genus['key'])
+        if result is None:
+            sampler.set_genus_weight(family['key'], genus['key'], 0)
+            return None
+
+        return Question(result.image_path, make_choices(family), family['scientificName'], result.species_name, family, genus)
+
+    return build_source_question
+
+def make_scraped_question_builder(url_queue, class_name="Mammalia", save_dir="images"):
+    """
+    Return a build function using the image_scraper workers fed through url_queue.
+
+    Each request carries its own reply queue, so several producers can use several
+    scraper workers at once without mixing up their answers.
+    """
+    return make_source_question_builder(ScraperImageSource(url_queue, save_dir), class_name)
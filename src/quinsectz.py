@@ -1,36 +1,184 @@
-from pygbif import species
 import asyncio
-import aiohttp
-
-def families_in_class(class_name="insecta", limit=100000, status="accepted"):
+import collections
+import http_client
+from adaptive_concurrency import AdaptiveConcurrency, as_limiter
+from taxonomy_cache import cached
+from backbone_store import BackboneStore
+from taxonomy_index import TaxonomyIndex
+from name_resolver import resolver
+from ranks import Rank, parse_rank
+import image_index
+
+# Local copy of the GBIF backbone used for offline lookups, see use_backbone_store
+backbone_store = None
+
+# Nested-set index over every taxonomy record fetched so far
+taxonomy_index = TaxonomyIndex()
+
+# Largest page GBIF species search returns, a shorter result list holds every match
+PAGE_LIMIT = 1000
+
+# Pages of species in flight, adapted to how the server copes and shared by every crawl
+species_concurrency = AdaptiveConcurrency(initial=4, max_limit=16)
+
+def use_backbone_store(store):
+    """
+    Answer lookups from a local backbone store instead of the GBIF API.
+
+    Params:
+    store (BackboneStore or str): A loaded store, the directory of a saved one, or None to go back online
+    """
+    global backbone_store
+    if isinstance(store, str):
+        store = BackboneStore.load(store)
+    backbone_store = store
+
+def _offline_store(offline):
+    # offline=None uses the store when one is loaded, True insists on it, False never uses it
+    if offline is False:
+        return None
+    if backbone_store is None and offline:
+        raise RuntimeError("Offline mode requested but no backbone store is loaded, see use_backbone_store()")
+    return backbone_store
+
+def _offline_lookup(store, name, rank):
+    row = store.row_of_key(name) if isinstance(name, int) else store.lookup(name, rank=rank)
+    if row is None:
+        # The same error the online path raises when name_backbone finds no usageKey
+        raise KeyError('usageKey')
+    return row
+
+def _offline_descendants(store, name, name_rank, rank, limit, status):
+    row = _offline_lookup(store, name, name_rank)
+    return [store.record(child) for child in store.descendants_at_rank(row, rank, limit=limit, status=status)]
+
+def _name_lookup(**params):
+    # The species search pygbif's species.name_lookup sends, over the shared pooled client
+    # Species pages rarely change, revalidate the stored body instead of downloading it again
+    if 'rank' in params:
+        params['rank'] = parse_rank(params['rank']).value
+    return http_client.get_json(http_client.GBIF_API_URL + 'species/search', params=params, cache_mode=http_client.CacheMode.REVALIDATE)
+
+def _find_indexed(name, rank):
+    # Names are looked up by name, usageKeys directly
+    if isinstance(name, int):
+        return taxonomy_index.get(name)
+    return taxonomy_index.find(name, rank=rank)
+
+def _indexed_descendants(name, name_rank, rank, limit, status):
+    # Answer from the index when it already holds every descendant at rank, None otherwise
+    parent = _find_indexed(name, name_rank)
+    if parent is None:
+        return None
+    parent_key = parent.get('key', parent.get('usageKey'))
+    if not taxonomy_index.covers(parent_key, rank, status):
+        return None
+    return taxonomy_index.descendants_at_rank(parent_key, rank, limit=limit, status=status)
+
+def _index_descendants(name, name_rank, rank, limit, status, results):
+    # Feed fetched records into the index and remember when they were all of them
+    taxonomy_index.add_many(results)
+    if len(results) < min(limit, PAGE_LIMIT):
+        parent = _find_indexed(name, name_rank)
+        if parent is not None:
+            taxonomy_index.mark_complete(parent.get('key', parent.get('usageKey')), rank, status)
+    return results
+
+def _descendants(name, name_rank, rank, limit, status, fetch, refresh):
+    # refresh=True skips the index as well as the cache, the fetched records replace what it held
+    results = None if refresh else _indexed_descendants(name, name_rank, rank, limit, status)
+    if results is None:
+        results = _index_descendants(name, name_rank, rank, limit, status, fetch(name, limit, status, refresh=refresh))
+    return results
+
+def _with_images(results, with_images):
+    # Leave out the taxa the image availability index knows to have no images
+    if not with_images:
+        return results
+    return image_index.get_default_index().filter_with_images(results)
+
+def families_in_class(class_name="insecta", limit=100000, status="accepted", offline=None, with_images=False, refresh=False):
+    store = _offline_store(offline)
+    if store is not None:
+        return _with_images(_offline_descendants(store, class_name, Rank.CLASS, Rank.FAMILY, limit, status), with_images)
+    return _with_images(_descendants(class_name, Rank.CLASS, Rank.FAMILY, limit, status, _families_in_class, refresh), with_images)
+
+def species_in_family(family_name, limit=100000, status="accepted", offline=None, refresh=False):
+    store = _offline_store(offline)
+    if store is not None:
+        return _offline_descendants(store, family_name, Rank.FAMILY, Rank.SPECIES, limit, status)
+    return _descendants(family_name, Rank.FAMILY, Rank.SPECIES, limit, status, _species_in_family, refresh)
+
+def genus_in_family(family_name, limit=100000, status="accepted", offline=None, with_images=False, refresh=False):
+    store = _offline_store(offline)
+    if store is not None:
+        return _with_images(_offline_descendants(store, family_name, Rank.FAMILY, Rank.GENUS, limit, status), with_images)
+    return _with_images(_descendants(family_name, Rank.FAMILY, Rank.GENUS, limit, status, _genus_in_family, refresh), with_images)
+
+def sibling_families(family_name, parent_rank=Rank.ORDER, limit=100000, status="accepted", offline=None, refresh=False):
+    parent_rank = parse_rank(parent_rank)
+    store = _offline_store(offline)
+    if store is not None:
+        family_row = _offline_lookup(store, family_name, Rank.FAMILY)
+        parent_row = store.ancestor_at_rank(family_row, parent_rank)
+        if parent_row is None:
+            return []
+        siblings = store.descendants_at_rank(parent_row, Rank.FAMILY, limit=limit + 1, status=status)
+        return [store.record(row) for row in siblings if row != family_row][:limit]
+
+    # The siblings are the families of the parent, which the index may already know
+    family = _find_indexed(family_name, Rank.FAMILY)
+    parent = taxonomy_index.ancestor_at_rank(family.get('key', family.get('usageKey')), parent_rank) if family is not None else None
+    parent_key = parent['key'] if parent is not None else None
+    if not refresh and parent_key is not None and taxonomy_index.covers(parent_key, Rank.FAMILY, status):
+        siblings = taxonomy_index.descendants_at_rank(parent_key, Rank.FAMILY, status=status)
+        return [
+            result for result in siblings
+            if result['scientificName'] != family_name and result['key'] != family['key']
+        ][:limit]
+
+    # The cache key holds the rank's name, not the enum member
+    sibling_families_list = _sibling_families(family_name, parent_rank.value, limit, status, refresh=refresh)
+    taxonomy_index.add_many(sibling_families_list)
+    # The filtered-out family has to be known too before the parent counts as complete
+    if family is not None and sibling_families_list and len(sibling_families_list) < min(limit, PAGE_LIMIT - 1):
+        parent_key = sibling_families_list[0].get(parent_rank.key_field)
+        if parent_key is not None:
+            taxonomy_index.mark_complete(parent_key, Rank.FAMILY, status)
+    return sibling_families_list
+
+@cached(namespace="families_in_class")
+def _families_in_class(class_name="insecta", limit=100000, status="accepted"):
     # Search for the family in GBIF to get the usageKey
-    class_search = species.name_backbone(name=class_name, rank='class')
+    class_search = resolver.resolve(class_name, rank=Rank.CLASS)
 
     # Get the family key (an identifier used by GBIF)
     class_key = class_search['usageKey']
 
     # Retrieve species under the family using the family key
-    class_list = species.name_lookup(higherTaxonKey=class_key, rank='family', limit=limit, status=status)
+    class_list = _name_lookup(higherTaxonKey=class_key, rank=Rank.FAMILY, limit=limit, status=status)
 
     return class_list['results']
 
-def species_in_family(family_name, limit=100000, status="accepted"):
+@cached(namespace="species_in_family")
+def _species_in_family(family_name, limit=100000, status="accepted"):
 
     # Search for the family in GBIF to get the usageKey
-    family_search = species.name_backbone(name=family_name, rank='family')
+    family_search = resolver.resolve(family_name, rank=Rank.FAMILY)
 
     # Get the family key (an identifier used by GBIF)
     family_key = family_search['usageKey']
 
     # Retrieve species under the family using the family key
-    species_list = species.name_lookup(higherTaxonKey=family_key, rank='species', limit=limit, status=status)
+    species_list = _name_lookup(higherTaxonKey=family_key, rank=Rank.SPECIES, limit=limit, status=status)
 
     return species_list['results']
 
+@cached()
 def species_in_family_paginated(family_name, limit=100000, status="accepted"):
 
     # Search for the family in GBIF to get the usageKey
-    family_search = species.name_backbone(name=family_name, rank='family')
+    family_search = resolver.resolve(family_name, rank=Rank.FAMILY)
 
     # Get the family key (an identifier used by GBIF)
     family_key = family_search['usageKey']
@@ -43,7 +191,7 @@ def species_in_family_paginated(family_name, limit=100000, status="accepted"):
     while retrieved_count < limit:
         current_limit = min(batch_size, limit - retrieved_count)
 
-        response = species.name_lookup(higherTaxonKey=family_key, rank='species', limit=current_limit, offset=offset, status=status)
+        response = _name_lookup(higherTaxonKey=family_key, rank=Rank.SPECIES, limit=current_limit, offset=offset, status=status)
 
         species_list.extend(response['results'])
 
@@ -55,78 +203,132 @@ def species_in_family_paginated(family_name, limit=100000, status="accepted"):
 
     return species_list
 
-async def fetch_species_page(session, family_key, offset, limit, status):
-    url = 'https://api.gbif.org/v1/species/search'
+async def fetch_species_page(family_key, offset, limit, status):
+    """
+    Fetch a single page of species under a family.
+
+    Returns:
+    tuple: The page's results and the total number of matching species
+    """
+    url = http_client.GBIF_API_URL + 'species/search'
     params = {
         'higherTaxonKey': family_key,
-        'rank': 'species',
+        'rank': Rank.SPECIES.value,
         'limit': limit,
         'offset': offset,
         'status': status
     }
-    async with session.get(url, params=params) as response:
-        result = await response.json()
-        return result['results']
-
-async def species_in_family_paginated_concurrent(family_name, limit=100000, status="accepted"):
-    # Search for the family in GBIF to get the usageKey
-    family_search = species.name_backbone(name=family_name, rank='family')
-
-    # Get the family key (an identifier used by GBIF)
-    family_key = family_search['usageKey']
+    result = await http_client.get_json_async(url, params=params, cache_mode=http_client.CacheMode.REVALIDATE)
+    return result['results'], result.get('count', 0)
+
+async def iter_species_pages(family_name, limit=100000, status="accepted", max_concurrent=None):
+    """
+    Yield (offset, results) pages of the species under a family in offset order.
+
+    The first page is fetched on its own to learn the real number of species, so
+    only the pages that exist are requested. After that no more pages are in
+    flight than the concurrency window allows and nothing further ahead is
+    requested. `max_concurrent` fixes the window; by default the shared
+    species_concurrency controller adapts it to how the server copes. Closing
+    the generator early cancels the pages still in flight.
+    """
+    # The resolver may have to ask GBIF, which blocks
+    family_key = await asyncio.to_thread(resolver.usage_key, family_name, rank=Rank.FAMILY)
+    batch_size = 1000 # Maximum allowed by GBIF
 
+    concurrency = as_limiter(max_concurrent, species_concurrency)
+
+    async with concurrency.slot():
+        first_page, count = await fetch_species_page(family_key, 0, min(batch_size, limit), status)
+    yield 0, first_page
+
+    total = min(count, limit)
+
+    async def fetch_in_window(offset):
+        async with concurrency.slot():
+            results, _ = await fetch_species_page(family_key, offset, min(batch_size, total - offset), status)
+            return results
+
+    offsets = iter(range(batch_size, total, batch_size))
+    pending = collections.deque()
+    try:
+        while True:
+            # Keep the window full, the head page is awaited while the others keep loading
+            while len(pending) < concurrency.limit:
+                offset = next(offsets, None)
+                if offset is None:
+                    break
+                pending.append((offset, asyncio.create_task(fetch_in_window(offset))))
+
+            if not pending:
+                return
+
+            offset, task = pending.popleft()
+            yield offset, await task
+    finally:
+        # Stop whatever is still pending when the caller stops early
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+async def iter_species_in_family(family_name, limit=100000, status="accepted", max_concurrent=None):
+    """
+    Yield the species under a family one record at a time, as pages arrive.
+    """
+    pages = iter_species_pages(family_name, limit, status, max_concurrent)
+    try:
+        async for _, results in pages:
+            for record in results:
+                yield record
+    finally:
+        await pages.aclose()
+
+@cached()
+async def species_in_family_paginated_concurrent(family_name, limit=100000, status="accepted", max_concurrent=None):
+    # The pages arrive in offset order
     species_list = []
-    batch_size = 1000 # Maximum allowed by GBIF
-    tasks = []
-
-    async with aiohttp.ClientSession() as session:
-        # Calculate the num of pages needed
-        num_pages = (limit // batch_size) + (1 if limit % batch_size != 0 else 0)
-
-        # Create asynchronous tasks for each batch/page
-        for page in range(num_pages):
-            offset = page * batch_size
-            current_limit = min(batch_size, limit-offset)
-            task = fetch_species_page(session, family_key, offset, current_limit, status)
-            tasks.append(task)
-        
-        # Gather all results concurrently
-        results = await asyncio.gather(*tasks)
-    
-    # Extend species list with results from all pages
-    for  result in results:
-        species_list.extend(result)
-    
+    async for _, results in iter_species_pages(family_name, limit, status, max_concurrent):
+        species_list.extend(results)
+
     return species_list
 
-def genus_in_family(family_name, limit=100000, status="accepted"):
+@cached(namespace="genus_in_family")
+def _genus_in_family(family_name, limit=100000, status="accepted"):
 
     # Search for the family in GBIF to get the usageKey
-    family_search = species.name_backbone(name=family_name, rank='family')
+    family_search = resolver.resolve(family_name, rank=Rank.FAMILY)
 
     # Get the family key (an identifier used by GBIF)
     family_key = family_search['usageKey']
 
     # Retrieve species under the family using the family key
-    genus_list = species.name_lookup(higherTaxonKey=family_key, rank='genus', limit=limit, status=status)
+    genus_list = _name_lookup(higherTaxonKey=family_key, rank=Rank.GENUS, limit=limit, status=status)
 
     return genus_list['results']
 
-def sibling_families(family_name, parent_rank="order", limit=100000, status="accepted"):
-    family_search = species.name_backbone(name=family_name, rank='family')
+@cached(namespace="sibling_families")
+def _sibling_families(family_name, parent_rank="ORDER", limit=100000, status="accepted"):
+    family_search = resolver.resolve(family_name, rank=Rank.FAMILY)
 
-    order_key = family_search.get(parent_rank+'Key')
+    order_key = family_search.get(parse_rank(parent_rank).key_field)
 
-    siblings = species.name_lookup(higherTaxonKey=order_key, rank='family', limit=limit+1, status=status)
+    siblings = _name_lookup(higherTaxonKey=order_key, rank=Rank.FAMILY, limit=limit+1, status=status)
 
-    # Filter out the original family from the results
+    # Filter out the original family from the results, whether it was given by name or usageKey
     sibling_families_list = [
         result for result in siblings['results'] 
-        if result['scientificName'] != family_name
+        if result['scientificName'] != family_name and result['key'] != family_search.get('usageKey')
     ]
 
     # Ensure the result list has exactly `limit` entries
     if len(sibling_families_list) > limit:
         sibling_families_list = sibling_families_list[:limit]
 
-    return sibling_families_list
\ No newline at end of file
+    return sibling_families_list
+
+# The public lookups store their entries under the cached functions behind them, so
+# taxonomy_cache.invalidate(func=families_in_class) clears the right ones
+families_in_class.cache_prefix = _families_in_class.cache_prefix
+species_in_family.cache_prefix = _species_in_family.cache_prefix
+genus_in_family.cache_prefix = _genus_in_family.cache_prefix
+sibling_families.cache_prefix = _sibling_families.cache_prefix
@@ -0,0 +1,152 @@
+import image_variants
+from lazy_loading import lazy_import
+
+# Loaded when the window opens, importing quiz_ui alone doesn't need a display or Pillow
+tk = lazy_import("tkinter")
+Image = lazy_import("PIL.Image")
+ImageTk = lazy_import("PIL.ImageTk")
+
+# How often the window checks the pipeline while waiting for a question, in milliseconds
+POLL_INTERVAL = 200
+
+# Suggestions shown under the answer box in typed mode
+SUGGESTIONS = 8
+
+# Seconds the closed window waits for the question producers to finish
+STOP_TIMEOUT = 5.0
+
+def show_quiz(pipeline, title="Family Identification Quiz", completer=None):
+    """
+    Run the quiz window, popping ready questions from a QuestionPipeline.
+
+    The window never builds a question itself, it only shows "Loading..." and
+    checks again when the pipeline has nothing ready yet.
+
+    Params:
+    pipeline (QuestionPipeline): Where the questions come from
+    title (str): The window title
+    completer (NameCompleter): Ask for a typed family or genus name, suggesting names from it on every
+        keystroke, instead of offering the choices as buttons (default is buttons)
+    """
+    # Set up the tkinter root
+    root = tk.Tk()
+    root.title(title)
+
+    img_label = tk.Label(root)
+    img_label.pack()
+
+    choices_frame = tk.Frame(root)
+    choices_frame.pack()
+
+    # Label to show result
+    result_label = tk.Label(root, text="", font=("Helvetica", 16))
+    result_label.pack()
+
+    current = {}
+
+    if completer is not None:
+        answer_entry = tk.Entry(choices_frame, width=40, font=("Helvetica", 14))
+        answer_entry.pack(pady=10)
+        suggestion_list = tk.Listbox(choices_frame, height=SUGGESTIONS, width=40)
+        suggestion_list.pack()
+
+        def suggest(event=None):
+            # Navigation keys move through the list, anything else changes the text
+            if event is not None and event.keysym in ("Up", "Down", "Return", "Tab"):
+                return
+            suggestion_list.delete(0, tk.END)
+            typed = answer_entry.get()
+            if typed.strip():
+                for completion in completer.complete(typed, SUGGESTIONS):
+                    suggestion_list.insert(tk.END, completion.name)
+
+        def check_typed(typed):
+            question = current.get('question')
+            if question is None:
+                return
+            rank = question.answered_by(typed)
+            if rank == "family":
+                result_label.config(text="Correct!", fg="green")
+            elif rank == "genus":
+                result_label.config(text=f"Correct, down to the genus! ({question.answer})", fg="green")
+            else:
+                result_label.config(text="Wrong, try again!", fg="red")
+
+        def pick_suggestion(event=None):
+            selection = suggestion_list.curselection()
+            if selection:
+                answer_entry.delete(0, tk.END)
+                answer_entry.insert(0, suggestion_list.get(selection[0]))
+            check_typed(answer_entry.get())
+            return "break"
+
+        def move_selection(step):
+            size = suggestion_list.size()
+            if not size:
+                return "break"
+            selection = suggestion_list.curselection()
+            position = (selection[0] + step) % size if selection else (0 if step > 0 else size - 1)
+            suggestion_list.selection_clear(0, tk.END)
+            suggestion_list.selection_set(position)
+            suggestion_list.see(position)
+            return "break"
+
+        answer_entry.bind("<KeyRelease>", suggest)
+        answer_entry.bind("<Return>", pick_suggestion)
+        answer_entry.bind("<Down>", lambda event: move_selection(1))
+        answer_entry.bind("<Tab>", lambda event: move_selection(1))
+        answer_entry.bind("<Up>", lambda event: move_selection(-1))
+        suggestion_list.bind("<Double-Button-1>", pick_suggestion)
+
+    def show_question(question):
+        # Load the image, normally the display variant built at download time
+        img = Image.open(question.image_path)
+        img.thumbnail(image_variants.DISPLAY_SIZE)  # Only does work for images without a variant
+        img_tk = ImageTk.PhotoImage(img)
+
+        # Display the image, keeping a reference so tkinter doesn't drop it
+        img_label.config(image=img_tk)
+        img_label.image = img_tk
+        current['question'] = question
+
+        if completer is not None:
+            # A fresh answer box, the completer does the rest
+            answer_entry.delete(0, tk.END)
+            suggestion_list.delete(0, tk.END)
+            answer_entry.focus_set()
+            result_label.config(text="")
+            return
+
+        # Display the choices
+        def check_answer(selected_family):
+            if selected_family == question.answer:
+                result_label.config(text="Correct!", fg="green")
+            else:
+                result_label.config(text="Wrong, try again!", fg="red")
+
+        # Add buttons for multiple choices
+        for child in choices_frame.winfo_children():
+            child.destroy()
+        for choice in question.choices:
+            button = tk.Button(choices_frame, text=choice, command=lambda c=choice: check_answer(c))
+            button.pack(pady=10)
+
+        result_label.config(text="")
+
+    def next_question():
+        question = pipeline.get(timeout=0)
+        if question is None:
+            result_label.config(text="Loading...", fg="black")
+            root.after(POLL_INTERVAL, next_question)
+            return
+        show_question(question)
+
+    next_button = tk.Button(root, text="Next", command=next_question)
+    next_button.pack(pady=10)
+
+    next_question()
+
+    # Start the tkinter main loop
+    root.mainloop()
+    # A producer stuck on a slow download is a daemon thread, it doesn't hold up the exit
+    pipeline.stop(timeout=STOP_TIMEOUT)
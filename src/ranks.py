@@ -1,6 +1,14 @@
 from enum import Enum
 
 class Rank(Enum):
+    """
+    Taxonomic ranks as spelled by GBIF and ChecklistBank, declared from the highest to the lowest.
+
+    Ranks compare by their position in that order, so a higher rank is the smaller
+    one: Rank.ORDER < Rank.FAMILY. OTHER and UNRANKED sort last but don't sit at
+    a fixed depth, see `ordered`.
+    """
+
     SUPERDOMAIN = "SUPERDOMAIN"
     DOMAIN = "DOMAIN"
     SUBDOMAIN = "SUBDOMAIN"
@@ -113,4 +121,113 @@ class Rank(Enum):
     MUTATIO = "MUTATIO"
     STRAIN = "STRAIN"
     OTHER = "OTHER"
-    UNRANKED = "UNRANKED"
\ No newline at end of file
+    UNRANKED = "UNRANKED"
+
+    @property
+    def ordinal(self):
+        """
+        The rank's position from the top of the hierarchy (0 for SUPERDOMAIN).
+        """
+        return self._ordinal
+
+    @property
+    def ordered(self):
+        """
+        False for the ranks that can show up anywhere in the tree (OTHER, UNRANKED).
+        """
+        return self not in UNORDERED_RANKS
+
+    @property
+    def major_index(self):
+        """
+        The rank's index in MAJOR_RANKS and in ancestor arrays, or None for minor ranks.
+        """
+        return _MAJOR_INDEX.get(self)
+
+    @property
+    def key_field(self):
+        """
+        The field GBIF records name their ancestor at this rank in (e.g. 'orderKey').
+        """
+        return self.value.lower() + "Key"
+
+    def is_above(self, other):
+        return self._ordinal < parse_rank(other)._ordinal
+
+    def is_below(self, other):
+        return self._ordinal > parse_rank(other)._ordinal
+
+    def __lt__(self, other):
+        if not isinstance(other, Rank):
+            return NotImplemented
+        return self._ordinal < other._ordinal
+
+    def __le__(self, other):
+        if not isinstance(other, Rank):
+            return NotImplemented
+        return self._ordinal <= other._ordinal
+
+    def __gt__(self, other):
+        if not isinstance(other, Rank):
+            return NotImplemented
+        return self._ordinal > other._ordinal
+
+    def __ge__(self, other):
+        if not isinstance(other, Rank):
+            return NotImplemented
+        return self._ordinal >= other._ordinal
+
+
+# Precomputed once, comparisons only read an attribute
+for _ordinal, _rank in enumerate(Rank):
+    _rank._ordinal = _ordinal
+del _ordinal, _rank
+
+# Ranks which don't sit at a fixed depth, traversals walk through them instead of stopping
+UNORDERED_RANKS = frozenset((Rank.OTHER, Rank.UNRANKED))
+
+# The ranks GBIF records carry ancestor keys for (kingdomKey, phylumKey, ...), highest first
+MAJOR_RANKS = (Rank.KINGDOM, Rank.PHYLUM, Rank.CLASS, Rank.ORDER, Rank.FAMILY, Rank.GENUS, Rank.SPECIES)
+_MAJOR_INDEX = {rank: index for index, rank in enumerate(MAJOR_RANKS)}
+
+# Every spelling parse_rank has seen, seeded with the enum names and the GBIF spellings that differ
+_SPELLINGS = {rank.value: rank for rank in Rank}
+_SPELLINGS.update({
+    "SUPERSECTION": Rank.SUPERSECTION_BOTANY,
+    "SECTION": Rank.SECTION_BOTANY,
+    "SUBSECTION": Rank.SUBSECTION_BOTANY,
+    "FORMA": Rank.FORM,
+})
+
+def parse_rank(value, default=None):
+    """
+    Turn a rank as GBIF ('FAMILY') or ChecklistBank ('family', 'section zoology') spell it into a Rank.
+
+    Params:
+    value (str or Rank): The rank, Ranks are returned unchanged
+    default (Rank): Returned for unknown ranks (default is to raise ValueError)
+
+    Returns:
+    Rank: The parsed rank
+    """
+    if isinstance(value, Rank):
+        return value
+    rank = _SPELLINGS.get(value)
+    if rank is None and isinstance(value, str):
+        rank = _SPELLINGS.get(value.strip().upper().replace(" ", "_").replace("-", "_"))
+        if rank is not None:
+            # Known spellings are few, remember this one so the next parse is a single lookup
+            _SPELLINGS[value] = rank
+    if rank is None:
+        if default is not None:
+            return default
+        raise ValueError(f"Unknown rank: {value!r}")
+    return rank
+
+def ancestor_keys(record):
+    """
+    Return a record's ancestor keys as a tuple indexed by Rank.major_index (None where it has none).
+
+    A taxon at a major rank is its own entry, the way GBIF records carry it.
+    """
+    return tuple(record.get(rank.key_field) for rank in MAJOR_RANKS)
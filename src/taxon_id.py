@@ -1,6 +1,14 @@
-import requests
+import asyncio
+import http_client
+import logging
+import metrics
 from dataclasses import dataclass, asdict 
-from typing import List, Optional
+from typing import Optional
+from adaptive_concurrency import AdaptiveConcurrency, as_limiter
+from taxonomy_cache import get_default_cache, make_key
+import name_matcher
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class TaxonFilter:
@@ -37,26 +45,189 @@ class TaxonFilter:
     species: Optional[str] = None
 
 
-BASE_URL = "https://api.checklistbank.org/"
+@dataclass
+class TaxonMatch:
+    result: Optional[dict] = None # The nameusage match as ChecklistBank returns it
+    error: Optional[BaseException] = None # Why this input couldn't be matched, the result is None then
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# Endpoint for name matching within a dataset, under http_client.CHECKLISTBANK_API_URL
 SEARCH_ENDPOINT = "dataset/{key}/match/nameusage"
 
+# Cache namespace of the matches of one dataset, see match_cache_prefix
+MATCH_NAMESPACE = "nameusage_match"
+
+# Matches in flight, adapted to how the server copes and shared by every match_many call
+match_concurrency = AdaptiveConcurrency(initial=4, max_limit=16)
+
+def _filter_dict(search_filters):
+    return asdict(search_filters) if isinstance(search_filters, TaxonFilter) else dict(search_filters)
+
+def _match_params(search_filters):
+    # The dataset key goes in the path; unset filters are left out and taxon_class is sent as class
+    params = {}
+    for name, value in _filter_dict(search_filters).items():
+        if name == "key" or value is None:
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        params["class" if name == "taxon_class" else name] = value
+    return params
+
+def match_cache_prefix(dataset_key):
+    """
+    Return the taxonomy cache key prefix of a dataset's matches, e.g. to invalidate them.
+    """
+    return f"{MATCH_NAMESPACE}:{dataset_key}:"
+
+def _match_cache_key(dataset_key, params):
+    return make_key(f"{MATCH_NAMESPACE}:{dataset_key}", params)
+
+# Dataset key -> (NameMatcher, whether it lists the whole dataset), see use_local_matcher
+local_matchers = {}
+
+# A local match needs this score to be answered without ChecklistBank
+LOCAL_MIN_SCORE = 0.85
+
+# With a complete name list, a name whose best local candidate scores below this has no match
+LOCAL_NONE_BELOW = 0.5
+
+# The only filters a local matcher can honour, filters on the classification still go to ChecklistBank
+_LOCAL_PARAMS = {"scientificName", "name", "q", "authorship", "rank", "verbose"}
+
+def use_local_matcher(dataset_key, matcher, complete=False):
+    """
+    Answer the matches against a dataset from a local NameMatcher when it is confident.
+
+    Params:
+    dataset_key (int): The ChecklistBank dataset the names were imported from
+    matcher (NameMatcher): The imported names, keyed by their usage id in that dataset (None to stop using one)
+    complete (bool): The names are the whole dataset, so names far from all of them have no match (default is False)
+    """
+    if matcher is None:
+        local_matchers.pop(dataset_key, None)
+    else:
+        local_matchers[dataset_key] = (matcher, complete)
+
+def local_match(dataset_key, params):
+    """
+    Return a ChecklistBank-shaped match from the dataset's local matcher, or None if ChecklistBank has to decide.
+    """
+    entry = local_matchers.get(dataset_key)
+    name = params.get("scientificName") or params.get("name") or params.get("q")
+    if entry is None or not name or not set(params) <= _LOCAL_PARAMS:
+        return None
+
+    matcher, complete = entry
+    candidates = matcher.match(name, rank=params.get("rank"), limit=3)
+    if name_matcher.is_confident(candidates, LOCAL_MIN_SCORE):
+        best = candidates[0]
+        metrics.cache_requests.inc(cache="names", result="hit")
+        return {
+            "original": {"scientificName": name},
+            "type": "exact" if best.score >= name_matcher.EXACT_SCORE else "variant",
+            "usage": {
+                "id": str(best.key),
+                "name": {"scientificName": best.name, "rank": best.rank.lower() if best.rank else None},
+            },
+            "issues": {},
+            "local": {"score": best.score},
+        }
+    if complete and (not candidates or candidates[0].score < LOCAL_NONE_BELOW):
+        metrics.cache_requests.inc(cache="names", result="hit")
+        return {"original": {"scientificName": name}, "type": "none", "issues": {}, "local": {"score": 0.0}}
+    metrics.cache_requests.inc(cache="names", result="miss")
+    return None
+
 def get_exact_taxon_id(search_filters):
-    url = BASE_URL+SEARCH_ENDPOINT.format(key=search_filters["key"])
+    params = _match_params(search_filters)
+    local = local_match(search_filters["key"], params)
+    if local is not None:
+        return local
+
+    url = http_client.CHECKLISTBANK_API_URL+SEARCH_ENDPOINT.format(key=search_filters["key"])
 
-    response = requests.get(url, params=search_filters)
+    response = http_client.get(url, params=params)
 
     if response.status_code != 200:
-        print(f"Error: {response.status_code} for URL: {response.url}")
+        logger.warning("Error: %s for URL: %s", response.status_code, response.url)
         return None
 
     try:
         return response.json()
     except:
-        print("Error: The file could not be parsed properly. Maybe it's not JSON?")
+        logger.warning("The response of %s could not be parsed properly. Maybe it's not JSON?", response.url)
         return None
 
-search_filters = TaxonFilter(
-    key=3,
-    scientificName="Insecta"
-)
-print(get_exact_taxon_id(search_filters=asdict(search_filters)))
\ No newline at end of file
+async def match_many(filters, max_concurrent=None, refresh=False, cache=None):
+    """
+    Match many names against their datasets, yielding (input, TaxonMatch) pairs as the matches finish.
+
+    Identical filters are matched once and their match is yielded for every copy.
+    Names a local matcher is confident about are answered without a request (see
+    use_local_matcher). Other matches are kept in the taxonomy cache under their
+    dataset key, so a later run only asks ChecklistBank about the names it hasn't
+    seen. A failed match is yielded with its error instead of stopping the others.
+    Closing the generator early cancels the matches still in flight.
+
+    Params:
+    filters (iterable): TaxonFilters, or dicts with the same fields
+    max_concurrent (int): Maximum number of matches in flight (default adapts to the server)
+    refresh (bool): Ignore cached matches and overwrite them (default is False)
+    cache (TaxonomyCache): Where matches are cached (default is the process-wide cache)
+
+    Returns:
+    async generator: (input, TaxonMatch) pairs, in completion order
+    """
+    store = cache if cache is not None else get_default_cache()
+    concurrency = as_limiter(max_concurrent, match_concurrency)
+
+    # Group the inputs by what is actually sent, copies share one request
+    groups = {}
+    for search_filters in filters:
+        dataset_key = _filter_dict(search_filters).get("key")
+        params = _match_params(search_filters)
+        groups.setdefault(_match_cache_key(dataset_key, params), (dataset_key, params, []))[2].append(search_filters)
+
+    async def match_one(cache_key, dataset_key, params):
+        # Confident local matches are cheaper than the cache and aren't stored in it
+        local = local_match(dataset_key, params)
+        if local is not None:
+            return cache_key, TaxonMatch(local)
+        if not refresh:
+            cached = store.get(cache_key)
+            if cached is not None:
+                metrics.cache_requests.inc(cache="taxonomy", result="hit")
+                return cache_key, TaxonMatch(cached)
+        metrics.cache_requests.inc(cache="taxonomy", result="miss")
+        try:
+            url = http_client.CHECKLISTBANK_API_URL + SEARCH_ENDPOINT.format(key=dataset_key)
+            async with concurrency.slot():
+                result = await http_client.get_json_async(url, params=params)
+        except Exception as e:
+            return cache_key, TaxonMatch(error=e)
+        store.set(cache_key, result)
+        return cache_key, TaxonMatch(result)
+
+    tasks = [asyncio.ensure_future(match_one(cache_key, dataset_key, params))
+             for cache_key, (dataset_key, params, _) in groups.items()]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            cache_key, match = await finished
+            for search_filters in groups[cache_key][2]:
+                yield search_filters, match
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+if __name__ == "__main__":
+    search_filters = TaxonFilter(
+        key=3,
+        scientificName="Insecta"
+    )
+    print(get_exact_taxon_id(search_filters=asdict(search_filters)))
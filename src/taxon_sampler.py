@@ -0,0 +1,173 @@
+from array import array
+import random
+import threading
+
+class AliasTable:
+    """
+    Walker alias table for O(1) weighted draws.
+
+    Built in O(n) with Vose's method. Items with a weight of zero (or less) are
+    left out, so they can never be drawn.
+    """
+
+    def __init__(self, items, weights):
+        pairs = [(item, float(weight)) for item, weight in zip(items, weights) if weight > 0]
+        self.items = [item for item, _ in pairs]
+        self.total = sum(weight for _, weight in pairs)
+
+        count = len(pairs)
+        self._probability = array("d", bytes(8 * count))
+        self._alias = array("l", bytes(array("l").itemsize * count))
+        if count == 0:
+            return
+
+        # Scale the weights so the average is 1, then pair every small column with a large one
+        scaled = [weight * count / self.total for _, weight in pairs]
+        small = [index for index, weight in enumerate(scaled) if weight < 1.0]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Whatever is left is 1 up to rounding errors
+        for index in large + small:
+            self._probability[index] = 1.0
+            self._alias[index] = index
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=random):
+        """
+        Return a random item with probability proportional to its weight.
+        """
+        if not self.items:
+            raise LookupError("Cannot draw from an alias table without positive weights")
+        column = rng.randrange(len(self.items))
+        if rng.random() < self._probability[column]:
+            return self.items[column]
+        return self.items[self._alias[column]]
+
+
+class WeightedSampler:
+    """
+    Keyed weighted sampler backed by an alias table.
+
+    Weights can be changed at any time as new counts arrive; the alias table is
+    rebuilt lazily on the next draw, so a batch of updates costs one rebuild.
+    """
+
+    def __init__(self, weights=None):
+        self._weights = dict(weights or {})
+        self._table = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for weight in self._weights.values() if weight > 0)
+
+    def __contains__(self, key):
+        return key in self._weights
+
+    def weight(self, key):
+        return self._weights.get(key, 0)
+
+    def set_weight(self, key, weight):
+        with self._lock:
+            if self._weights.get(key) != weight:
+                self._weights[key] = weight
+                self._table = None
+
+    def update(self, weights):
+        with self._lock:
+            self._weights.update(weights)
+            self._table = None
+
+    def draw(self, rng=random):
+        """
+        Return a random key with probability proportional to its weight, never one weighing zero.
+        """
+        with self._lock:
+            if self._table is None:
+                self._table = AliasTable(list(self._weights), list(self._weights.values()))
+            table = self._table
+        return table.draw(rng)
+
+
+class TaxonSampler:
+    """
+    Draws (family, genus) pairs for quiz questions without empty-draw retry loops.
+
+    Families are weighted by `family_weights` and genera by `genus_weights`
+    (e.g. image-bearing occurrence counts); taxa without a known weight start at
+    `prior_weight`. Whenever a draw turns out to be useless (a family without
+    genera, a genus without images) its weight drops to zero so it is never
+    drawn again.
+    """
+
+    def __init__(self, families, genus_lookup, family_weights=None, genus_weights=None, prior_weight=1.0):
+        self.genus_lookup = genus_lookup
+        self.prior_weight = prior_weight
+        self._genus_weights = dict(genus_weights or {})
+        self._families = {family['key']: family for family in families}
+        self._genera = {}
+        self._genus_samplers = {}
+        self._lock = threading.Lock()
+
+        family_weights = family_weights or {}
+        self.families = WeightedSampler({key: family_weights.get(key, prior_weight) for key in self._families})
+
+    def draw(self, rng=random):
+        """
+        Return a random (family, genus) pair of taxon records.
+
+        Raises:
+        LookupError: If no family with a drawable genus is left
+        """
+        while True:
+            family_key = self.families.draw(rng)
+            genera = self._genus_sampler(family_key)
+            if len(genera) == 0:
+                self.families.set_weight(family_key, 0)
+                continue
+            genus_key = genera.draw(rng)
+            return self._families[family_key], self._genera[genus_key]
+
+    def set_genus_weight(self, family_key, genus_key, weight):
+        """
+        Record a new weight (e.g. a fresh image count) for a genus, zero to exclude it.
+        """
+        self._genus_weights[genus_key] = weight
+        sampler = self._genus_samplers.get(family_key)
+        if sampler is not None:
+            sampler.set_weight(genus_key, weight)
+            if len(sampler) == 0:
+                self.families.set_weight(family_key, 0)
+
+    def set_family_weight(self, family_key, weight):
+        self.families.set_weight(family_key, weight)
+
+    def _genus_sampler(self, family_key):
+        with self._lock:
+            sampler = self._genus_samplers.get(family_key)
+        if sampler is not None:
+            return sampler
+
+        # Fetch the genera of a family the first time it is drawn
+        genus_list = self.genus_lookup(family_key)
+        with self._lock:
+            for genus in genus_list:
+                self._genera[genus['key']] = genus
+            sampler = WeightedSampler({
+                genus['key']: self._genus_weights.get(genus['key'], self.prior_weight) for genus in genus_list
+            })
+            self._genus_samplers.setdefault(family_key, sampler)
+            return self._genus_samplers[family_key]
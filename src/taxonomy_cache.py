@@ -0,0 +1,256 @@
+import sqlite3
+import threading
+import json
+import time
+import os
+import asyncio
+import functools
+import inspect
+import metrics
+
+# Default location of the on-disk cache, relative to where the quiz is started
+DEFAULT_CACHE_PATH = os.path.join("cache", "taxonomy.sqlite")
+
+# Taxonomy barely changes, so a week is a safe default lifetime for an entry
+DEFAULT_TTL = 7 * 24 * 3600
+
+# Upper bound on the number of stored entries before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = 10000
+
+class TaxonomyCache:
+    """
+    Persistent SQLite-backed key/value cache for taxonomy lookups.
+
+    Every entry carries its own expiry time, the table is kept under `max_entries`
+    by evicting the least recently used rows, and entries can be dropped explicitly
+    with `invalidate`.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+
+        # Create the cache directory if it doesn't exist
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for `key`, or `default` if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return default
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                # Expired entries are dropped lazily on read
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return default
+
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a JSON-serialisable `value` under `key`.
+
+        Params:
+        key (str): The cache key
+        value: Any JSON-serialisable value
+        ttl (float): Lifetime of the entry in seconds (default is the cache's default_ttl, None or 0 never expires)
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, key=None, prefix=None):
+        """
+        Drop cached entries.
+
+        Params:
+        key (str): Drop exactly this entry
+        prefix (str): Drop every entry whose key starts with this prefix (e.g. a function name)
+
+        With neither argument the whole cache is cleared.
+
+        Returns:
+        int: The number of entries removed
+        """
+        with self._lock:
+            if key is not None:
+                cursor = self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            elif prefix is not None:
+                # Escape LIKE wildcards so the prefix is matched literally
+                escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                cursor = self._conn.execute(
+                    "DELETE FROM entries WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",)
+                )
+            else:
+                cursor = self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            return cursor.rowcount
+
+    def purge_expired(self):
+        """
+        Remove every expired entry and return how many were removed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        # Expired rows go first, then the least recently used ones until we fit
+        self._conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """
+    Return the process-wide cache, opening it on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TaxonomyCache()
+        return _default_cache
+
+def set_default_cache(cache):
+    """
+    Replace the process-wide cache (e.g. with one at another path, or None to reopen the default).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
+
+def make_key(namespace, arguments):
+    """
+    Build a stable cache key from a function name and its bound call arguments.
+    """
+    return namespace + ":" + json.dumps(arguments, sort_keys=True, default=str)
+
+def cached(namespace=None, ttl=None, cache=None):
+    """
+    Decorator caching the JSON-serialisable return value of a function in a TaxonomyCache.
+
+    Works for both plain functions and coroutines. The wrapped function gains a
+    `refresh=True` keyword to bypass the cache and overwrite the stored entry.
+
+    Params:
+    namespace (str): Key prefix for the function's entries (default is the function name)
+    ttl (float): Lifetime of the entries in seconds (default is the cache's default_ttl)
+    cache (TaxonomyCache): The cache to use (default is the process-wide cache)
+    """
+    def decorator(func):
+        prefix = namespace or func.__name__
+        signature = inspect.signature(func)
+
+        def resolve_cache():
+            return cache if cache is not None else get_default_cache()
+
+        def key_for(args, kwargs):
+            # Bind against the signature so positional, keyword and default arguments share a key
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return make_key(prefix, bound.arguments)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, refresh=False, **kwargs):
+                store = resolve_cache()
+                key = key_for(args, kwargs)
+                if not refresh:
+                    value = store.get(key)
+                    if value is not None:
+                        metrics.cache_requests.inc(cache="taxonomy", result="hit")
+                        return value
+                metrics.cache_requests.inc(cache="taxonomy", result="miss")
+                value = await func(*args, **kwargs)
+                store.set(key, value, ttl)
+                return value
+
+            async_wrapper.cache_prefix = prefix + ":"
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, refresh=False, **kwargs):
+            store = resolve_cache()
+            key = key_for(args, kwargs)
+            if not refresh:
+                value = store.get(key)
+                if value is not None:
+                    metrics.cache_requests.inc(cache="taxonomy", result="hit")
+                    return value
+            metrics.cache_requests.inc(cache="taxonomy", result="miss")
+            value = func(*args, **kwargs)
+            store.set(key, value, ttl)
+            return value
+
+        wrapper.cache_prefix = prefix + ":"
+        return wrapper
+
+    return decorator
+
+def invalidate(func=None, key=None):
+    """
+    Invalidate the process-wide cache: everything, everything stored by a cached function, or a single key.
+    """
+    store = get_default_cache()
+    if func is not None:
+        return store.invalidate(prefix=func.cache_prefix)
+    return store.invalidate(key=key)
@@ -0,0 +1,262 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+import threading
+from ranks import MAJOR_RANKS, Rank, ancestor_keys, parse_rank
+
+class TaxonomyIndex:
+    """
+    Nested-set index over the taxonomy records fetched so far.
+
+    Every known taxon gets a pre-order number and the largest pre-order number in its
+    subtree, so a taxon's descendants are exactly the taxa whose pre-order number
+    falls in its interval. Keeping one sorted array of pre-order numbers per rank
+    turns "all families under Insecta" into two binary searches and a slice.
+
+    Records are added incrementally, taxa are linked to the nearest major-rank
+    ancestor they name (orderKey, familyKey, ...), and the numbering is rebuilt
+    lazily on the first query after a change. Each taxon also keeps those major-rank
+    ancestor keys in a small array indexed by Rank.major_index.
+
+    Rebuilding the numbering walks every known taxon, whichever subtree changed
+    (about 45 ms for 50,000 taxa): inserting into a nested set shifts the numbers
+    of everything after the insertion point anyway. It runs once per batch of
+    changes, so records should arrive through add_many a page at a time, as the
+    quinsectz lookups do, rather than through add() between queries.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+        # key -> record, parent key, Rank and major-rank ancestor keys (-1 where unknown) of every known taxon
+        self._records = {}
+        self._parents = {}
+        self._ranks = {}
+        self._ancestors = {}
+
+        # Lower-cased canonical and scientific names -> keys
+        self._names = {}
+
+        # (key, rank, status) triples whose descendants at rank are all known
+        self._complete = set()
+
+        self._dirty = False
+        self._pre = {}
+        self._last = {}
+        self._rank_pre = {}
+        self._rank_keys = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def add(self, record):
+        """
+        Add a GBIF taxon record (a search result or a name_backbone match) to the index.
+        """
+        with self._lock:
+            self._add(record)
+            self._dirty = True
+
+    def add_many(self, records):
+        with self._lock:
+            for record in records:
+                self._add(record)
+            self._dirty = True
+
+    def mark_complete(self, key, rank, status="accepted"):
+        """
+        Record that every descendant of `key` at `rank` with `status` is in the index.
+        """
+        with self._lock:
+            self._complete.add((key, parse_rank(rank), _status_key(status)))
+
+    def covers(self, key, rank, status="accepted"):
+        """
+        Return True if the index knows all descendants of `key` at `rank`.
+
+        Knowing every family of a class also means knowing every family of each of its
+        orders, so the ancestors of `key` are checked as well.
+        """
+        rank = parse_rank(rank)
+        status = _status_key(status)
+        with self._lock:
+            current = key
+            while current is not None:
+                if (current, rank, status) in self._complete:
+                    return True
+                current = self._parents.get(current)
+        return False
+
+    def get(self, key):
+        return self._records.get(key)
+
+    def find(self, name, rank=None):
+        """
+        Return the record of a known taxon by canonical or scientific name, or None.
+        """
+        rank = parse_rank(rank) if rank else None
+        with self._lock:
+            for key in self._names.get(name.strip().lower(), ()):
+                if rank is None or self._ranks.get(key) is rank:
+                    return self._records[key]
+        return None
+
+    def ancestor_at_rank(self, key, rank):
+        """
+        Return the record of the closest known ancestor of `key` at `rank`, or None.
+
+        Major ranks are an index into the taxon's ancestor array, other ranks walk up the known parents.
+        """
+        rank = parse_rank(rank)
+        with self._lock:
+            if key not in self._records:
+                return None
+            if rank.major_index is not None:
+                ancestor = self._ancestors[key][rank.major_index]
+                if ancestor == -1 or ancestor == key:
+                    return None
+                return self._records.get(ancestor)
+
+            current = self._parents.get(key)
+            while current is not None:
+                if self._ranks.get(current) is rank:
+                    return self._records[current]
+                current = self._parents.get(current)
+        return None
+
+    def is_descendant(self, key, ancestor_key):
+        """
+        Return True if `key` sits strictly inside the subtree of `ancestor_key`.
+        """
+        with self._lock:
+            self._renumber()
+            if key not in self._pre or ancestor_key not in self._pre or key == ancestor_key:
+                return False
+            return self._pre[ancestor_key] < self._pre[key] <= self._last[ancestor_key]
+
+    def descendants_at_rank(self, key, rank, limit=None, status=None):
+        """
+        Return the records of all known descendants of `key` at `rank`, in tree order.
+
+        Params:
+        key (int): The ancestor's key
+        rank (str or Rank): The rank of the descendants
+        limit (int): Maximum number of records (default is all)
+        status (str): Only the descendants with this taxonomic status, e.g. "accepted" (default is any)
+        """
+        rank = parse_rank(rank)
+        status = _status_key(status)
+        with self._lock:
+            self._renumber()
+            if key not in self._pre or rank not in self._rank_pre:
+                return []
+
+            numbers = self._rank_pre[rank]
+            start = bisect_right(numbers, self._pre[key])
+            end = bisect_left(numbers, self._last[key] + 1)
+            records = (self._records[child] for child in self._rank_keys[rank][start:end])
+            if status is not None:
+                records = (record for record in records if _record_status(record) == status)
+            return list(islice(records, limit))
+
+    def _add(self, record):
+        key = record.get("key", record.get("usageKey"))
+        if key is None:
+            return
+
+        ancestors = array("q", (-1 if chain_key is None else chain_key for chain_key in ancestor_keys(record)))
+
+        # Make sure the major-rank ancestors exist and are chained to each other
+        parent = None
+        for index, chain_rank in enumerate(MAJOR_RANKS):
+            chain_key = ancestors[index]
+            if chain_key == -1 or chain_key == key:
+                continue
+            if chain_key not in self._records:
+                name = record.get(chain_rank.value.lower(), "")
+                chain_ancestors = array("q", ancestors[:index + 1]) + array("q", [-1]) * (len(MAJOR_RANKS) - index - 1)
+                self._store(chain_key, {"key": chain_key, "scientificName": name, "canonicalName": name, "rank": chain_rank.value}, parent, chain_ancestors)
+            elif self._parents.get(chain_key) is None and parent is not None:
+                self._parents[chain_key] = parent
+            parent = chain_key
+
+        # Ancestors the record doesn't name are those of its nearest named one
+        if parent is not None:
+            ancestors = array("q", (own if own != -1 else inherited for own, inherited in zip(ancestors, self._ancestors[parent])))
+        self._store(key, record, parent, ancestors)
+
+    def _store(self, key, record, parent, ancestors):
+        previous = self._records.get(key)
+        if previous is not None:
+            # Don't lose a known parent or ancestor when a record with fewer ancestor keys arrives
+            if parent is None:
+                parent = self._parents.get(key)
+            known = self._ancestors[key]
+            ancestors = array("q", (new if new != -1 else old for new, old in zip(ancestors, known)))
+
+        self._records[key] = record
+        self._parents[key] = parent
+        self._ranks[key] = parse_rank(record.get("rank"), Rank.UNRANKED)
+        self._ancestors[key] = ancestors
+
+        for field in ("canonicalName", "scientificName"):
+            name = record.get(field)
+            if name:
+                keys = self._names.setdefault(name.lower(), [])
+                if key not in keys:
+                    keys.append(key)
+
+    def _renumber(self):
+        # A full walk, O(number of known taxa), see the class docstring
+        if not self._dirty:
+            return
+
+        children = {}
+        roots = []
+        for key, parent in self._parents.items():
+            if parent is None or parent not in self._records:
+                roots.append(key)
+            else:
+                children.setdefault(parent, []).append(key)
+
+        # Iterative depth-first walk assigning pre-order numbers and subtree ends
+        pre = {}
+        last = {}
+        rank_pre = {}
+        rank_keys = {}
+        counter = 0
+        for root in roots:
+            stack = [(root, False)]
+            while stack:
+                key, done = stack.pop()
+                if done:
+                    last[key] = counter - 1
+                    continue
+
+                pre[key] = counter
+                rank = self._ranks[key]
+                rank_pre.setdefault(rank, array("l")).append(counter)
+                rank_keys.setdefault(rank, []).append(key)
+                counter += 1
+
+                stack.append((key, True))
+                for child in reversed(children.get(key, ())):
+                    stack.append((child, False))
+
+        self._pre = pre
+        self._last = last
+        self._rank_pre = rank_pre
+        self._rank_keys = rank_keys
+        self._dirty = False
+
+
+def _status_key(status):
+    return status.upper() if status else None
+
+def _record_status(record):
+    # Search results spell it taxonomicStatus, name_backbone matches status; the
+    # placeholder records of ancestors known only by key have neither
+    return _status_key(record.get("taxonomicStatus") or record.get("status"))
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# The controller is fed by http_client
+pytest.importorskip("aiohttp")
+pytest.importorskip("requests")
+
+from adaptive_concurrency import AdaptiveConcurrency
+
+def test_window_grows_while_latency_is_flat():
+    concurrency = AdaptiveConcurrency(initial=2, max_limit=5)
+    for _ in range(100):
+        concurrency.observe(200, 0.05)
+    assert concurrency.limit == 5
+
+def test_window_shrinks_on_throttling_and_spikes():
+    concurrency = AdaptiveConcurrency(initial=16, max_limit=32)
+    concurrency.observe(200, 0.0)
+    concurrency.observe(429, 0.0)
+    assert concurrency.limit == 8
+
+    concurrency = AdaptiveConcurrency(initial=16, max_limit=32)
+    concurrency.observe(200, 0.001)
+    concurrency.observe(200, 0.5)
+    assert concurrency.limit == 8
+
+    # A burst of errors within one round trip is a single signal
+    concurrency = AdaptiveConcurrency(initial=16, max_limit=32)
+    concurrency.observe(200, 10.0)
+    for _ in range(5):
+        concurrency.observe(None, 10.0)
+    assert concurrency.limit == 8
+
+def test_slots_respect_the_window():
+    concurrency = AdaptiveConcurrency.fixed(3)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with concurrency.slot():
+            peak = max(peak, concurrency.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def crawl():
+        await asyncio.gather(*(request() for _ in range(20)))
+
+    asyncio.run(crawl())
+    assert peak == 3
+    assert concurrency.in_flight == 0
+
+def test_jitter_is_not_congestion():
+    # Flat latencies spread between 50 and 150 ms, the server isn't getting slower
+    rng = random.Random(4)
+    concurrency = AdaptiveConcurrency(initial=4, max_limit=16)
+    for _ in range(1000):
+        concurrency.observe(200, rng.uniform(0.05, 0.15))
+    assert concurrency.decreases == 0
+    assert concurrency.limit == 16
+    assert 80 <= concurrency.snapshot()['baseline_ms'] <= 120
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ranks import Rank
+from backbone_store import BackboneStore, import_backbone
+
+HEADER = ["taxonID", "parentNameUsageID", "acceptedNameUsageID", "scientificName", "canonicalName", "taxonRank", "taxonomicStatus"]
+
+ROWS = [
+    ("1", "", "", "Animalia", "Animalia", "kingdom", "accepted"),
+    ("54", "1", "", "Arthropoda", "Arthropoda", "phylum", "accepted"),
+    ("216", "54", "", "Insecta", "Insecta", "class", "accepted"),
+    ("1458", "216", "", "Orthoptera", "Orthoptera", "order", "accepted"),
+    ("7", "1458", "", "Acridoidea", "Acridoidea", "superfamily", "accepted"),
+    ("4", "7", "", "Acrididae MacLeay, 1821", "Acrididae", "family", "accepted"),
+    ("5", "1458", "", "Tettigoniidae Krauss, 1902", "Tettigoniidae", "family", "accepted"),
+    ("6", "4", "", "Dissosteira Scudder, 1876", "Dissosteira", "genus", "accepted"),
+    ("8", "6", "", "Dissosteira carolina (Linnaeus, 1758)", "Dissosteira carolina", "species", "accepted"),
+    ("9", "4", "6", "Oldname Someone, 1900", "Oldname", "genus", "synonym"),
+]
+
+def write_archive(path):
+    lines = ["\t".join(HEADER)] + ["\t".join(row) for row in ROWS]
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("Taxon.tsv", "\n".join(lines) + "\n")
+
+def test_import_and_queries(tmp_path):
+    archive = str(tmp_path / "backbone.zip")
+    write_archive(archive)
+
+    import_backbone(archive, str(tmp_path / "store"), progress_every=0)
+    store = BackboneStore.load(str(tmp_path / "store"))
+
+    # The synonym is skipped by default
+    assert len(store) == 9
+    assert store.lookup("Oldname") is None
+
+    insecta = store.lookup("insecta", rank="class")
+    families = [store.record(row)["canonicalName"] for row in store.descendants_at_rank(insecta, "family")]
+    assert sorted(families) == ["Acrididae", "Tettigoniidae"]
+
+    acrididae = store.lookup("Acrididae MacLeay, 1821")
+    record = store.record(acrididae)
+    assert record["key"] == 4
+    assert record["rank"] == "FAMILY"
+    assert record["parentKey"] == 7
+    assert record["orderKey"] == 1458
+    assert record["class"] == "Insecta"
+
+    order = store.ancestor_at_rank(acrididae, "order")
+    assert store.keys[order] == 1458
+    assert [store.keys[row] for row in store.descendants_at_rank(acrididae, "species")] == [8]
+
+    # Major ranks come from the ancestor column, and Rank members work like the strings
+    column = store.ancestor_column(Rank.CLASS)
+    assert store.keys[column[acrididae]] == store.keys[insecta]
+    assert store.ancestor_at_rank(acrididae, Rank.FAMILY) is None
+    assert store.ancestor_at_rank(acrididae, "superfamily") == store.parents[acrididae]
+
+def test_saved_layout_is_checked(tmp_path):
+    archive = str(tmp_path / "backbone.zip")
+    write_archive(archive)
+    store_dir = str(tmp_path / "store")
+    store = import_backbone(archive, store_dir, progress_every=0)
+
+    # Row ids take 4 bytes whatever the platform, GBIF keys 8
+    assert os.path.getsize(os.path.join(store_dir, "parents.bin")) == 4 * len(store)
+    assert os.path.getsize(os.path.join(store_dir, "keys.bin")) == 8 * len(store)
+
+    # A store written with other item sizes, or before they were recorded, isn't misread
+    meta_path = os.path.join(store_dir, "meta.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["columns"]["parents"] = ["l", 8]
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    with pytest.raises(ValueError):
+        BackboneStore.load(store_dir)
+
+    del meta["columns"]
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    with pytest.raises(ValueError):
+        BackboneStore.load(store_dir)
+
+    store.save(store_dir)
+    assert len(BackboneStore.load(store_dir)) == len(store)
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# datasets pulls in the HTTP stack
+pytest.importorskip("aiohttp")
+pytest.importorskip("requests")
+
+import datasets
+import dataset_export
+import http_client
+
+TOTAL = 2350
+
+async def fake_fetch_dataset_page(search_filters, offset, cache_mode=None):
+    # Later pages often arrive first
+    await asyncio.sleep(random.uniform(0, 0.01))
+    limit = search_filters['limit']
+    return [{'key': key} for key in range(offset, min(offset + limit, TOTAL))], TOTAL
+
+def test_pages_come_in_offset_order(monkeypatch):
+    monkeypatch.setattr(datasets, "fetch_dataset_page", fake_fetch_dataset_page)
+
+    async def collect():
+        return [page async for page in datasets.iter_dataset_pages({'limit': 100, 'offset': 0}, size=1234, max_concurrent=4)]
+
+    pages = asyncio.run(collect())
+    assert [offset for offset, _ in pages] == list(range(0, 1234, 100))
+    assert [record['key'] for _, results in pages for record in results] == list(range(1234))
+
+def test_pages_are_revalidated_unless_stale_ones_are_asked_for(monkeypatch):
+    modes = []
+
+    async def get_json_async(url, params=None, cache_mode=None, **kwargs):
+        modes.append(cache_mode)
+        offset = dict(params)['offset']
+        return {'result': [{'key': key} for key in range(offset, min(offset + 100, 250))], 'total': 250}
+
+    monkeypatch.setattr(http_client, "get_json_async", get_json_async)
+
+    found = asyncio.run(datasets.get_dataset_async({'limit': 100, 'offset': 0}))
+    assert [record['key'] for record in found] == list(range(250))
+    assert modes == [http_client.CacheMode.REVALIDATE] * 3
+
+    modes.clear()
+    asyncio.run(datasets.get_dataset_async({'limit': 100}, cache_mode=http_client.CacheMode.STALE_WHILE_REVALIDATE))
+    assert modes == [http_client.CacheMode.STALE_WHILE_REVALIDATE] * 3
+
+def test_export_writes_ndjson(monkeypatch, tmp_path):
+    monkeypatch.setattr(datasets, "fetch_dataset_page", fake_fetch_dataset_page)
+    path = str(tmp_path / "datasets.ndjson")
+
+    async def export():
+        with dataset_export.open_sink(path) as sink:
+            return await dataset_export.export_datasets(sink, {'limit': 500, 'offset': 0}, max_concurrent=3)
+
+    assert asyncio.run(export()) == TOTAL
+    with open(path) as f:
+        assert [json.loads(line)['key'] for line in f] == list(range(TOTAL))
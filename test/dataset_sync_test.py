@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# datasets pulls in the HTTP stack
+pytest.importorskip("aiohttp")
+pytest.importorskip("requests")
+
+import datasets
+from dataset_sync import DatasetStore, sync_datasets
+
+class FakeCatalogue:
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.requests = []
+
+    async def fetch_dataset_page(self, search_filters, offset, cache_mode=None):
+        self.requests.append(dict(search_filters, offset=offset))
+        matching = [dataset for dataset in self.catalogue
+                    if not search_filters.get('modified') or dataset['modified'][:10] >= search_filters['modified']]
+        limit = search_filters['limit']
+        return matching[offset:offset + limit], len(matching)
+
+def test_incremental_sync(monkeypatch, tmp_path):
+    catalogue = FakeCatalogue([
+        {'key': 1, 'title': "one", 'modified': "2024-01-01T10:00:00"},
+        {'key': 2, 'title': "two", 'modified': "2024-02-01T10:00:00"},
+        {'key': 3, 'title': "three", 'modified': "2024-03-01T10:00:00"},
+    ])
+    monkeypatch.setattr(datasets, "fetch_dataset_page", catalogue.fetch_dataset_page)
+    store = DatasetStore(str(tmp_path / "datasets.sqlite"))
+
+    # The first run crawls everything
+    first = asyncio.run(sync_datasets(store))
+    assert first.full and first.inserted == 3
+    assert store.high_water_mark() == "2024-03-01T10:00:00"
+    assert not catalogue.requests[0].get('modified')
+
+    # Later runs only ask for what changed since the mark
+    catalogue.catalogue[0] = {'key': 1, 'title': "one, renamed", 'modified': "2024-04-01T09:00:00"}
+    catalogue.catalogue.append({'key': 4, 'title': "four", 'modified': "2024-04-02T09:00:00"})
+    second = asyncio.run(sync_datasets(store))
+    assert not second.full
+    assert catalogue.requests[-1]['modified'] == "2024-03-01"
+    assert (second.fetched, second.inserted, second.updated) == (3, 1, 1)
+    assert store.get(1)['title'] == "one, renamed"
+    assert store.high_water_mark() == "2024-04-02T09:00:00"
+
+    # A full run on demand also drops datasets that are gone
+    del catalogue.catalogue[1]
+    third = asyncio.run(sync_datasets(store, full=True))
+    assert third.full and third.removed == 1
+    assert [dataset['key'] for dataset in store.iter_datasets()] == [1, 3, 4]
+    store.close()
@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# The pool tells browser failures apart with selenium's exception classes
+exceptions = pytest.importorskip("selenium.common.exceptions")
+
+from driver_pool import DriverPool
+
+class FakeDriver:
+    def __init__(self, number):
+        self.number = number
+        self.pages = []
+        self.quit_calls = 0
+
+    def get(self, url):
+        self.pages.append(url)
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class FakeFactory:
+    def __init__(self):
+        self.drivers = []
+
+    def __call__(self):
+        driver = FakeDriver(len(self.drivers))
+        self.drivers.append(driver)
+        return driver
+
+
+def test_drivers_are_reused_and_recycled_after_max_pages():
+    factory = FakeFactory()
+    pool = DriverPool(size=2, max_pages=3, driver_factory=factory)
+
+    for number in range(7):
+        with pool.driver() as lease:
+            lease.get(f"https://example.org/{number}")
+
+    # One driver at a time was enough, it was replaced after every third page
+    assert [len(driver.pages) for driver in factory.drivers] == [3, 3, 1]
+    assert [driver.quit_calls for driver in factory.drivers] == [1, 1, 0]
+
+    pool.close()
+    assert factory.drivers[2].quit_calls == 1
+
+def test_browser_errors_discard_the_driver():
+    factory = FakeFactory()
+    pool = DriverPool(size=1, driver_factory=factory)
+
+    with pytest.raises(exceptions.WebDriverException):
+        with pool.driver():
+            raise exceptions.WebDriverException("chrome not reachable")
+    assert factory.drivers[0].quit_calls == 1
+
+    # A slow page or a bug in the caller keeps the driver
+    with pytest.raises(exceptions.TimeoutException):
+        with pool.driver():
+            raise exceptions.TimeoutException("page load")
+    with pytest.raises(ValueError):
+        with pool.driver():
+            raise ValueError("parsing failed")
+    with pool.driver() as lease:
+        assert lease.driver is factory.drivers[1]
+    assert len(factory.drivers) == 2 and factory.drivers[1].quit_calls == 0
+    pool.close()
+
+def test_acquire_waits_for_a_driver_and_times_out():
+    factory = FakeFactory()
+    pool = DriverPool(size=1, driver_factory=factory)
+
+    with pool.driver():
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with pool.driver(timeout=0.1):
+                pass
+        assert 0.1 <= time.monotonic() - start < 0.5
+
+    # A waiting thread gets the driver as soon as it comes back
+    borrowed = threading.Event()
+    released = threading.Event()
+    got = []
+
+    def hold():
+        with pool.driver():
+            borrowed.set()
+            released.wait()
+
+    def wait_for_it():
+        with pool.driver(timeout=2) as lease:
+            got.append(lease.driver)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    borrowed.wait()
+    waiter = threading.Thread(target=wait_for_it)
+    waiter.start()
+    time.sleep(0.05)
+    released.set()
+    holder.join()
+    waiter.join()
+    assert got == [factory.drivers[0]] and len(factory.drivers) == 1
+
+    pool.close()
+    with pytest.raises(RuntimeError):
+        with pool.driver():
+            pass
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from http_cache import HttpCache, cache_key, parse_cache_control
+
+def test_cache_key_ignores_parameter_order():
+    first = cache_key("https://api.example.org/dataset", [("limit", "10"), ("offset", "0"), ("type", "A"), ("type", "B")])
+    second = cache_key("https://api.example.org/dataset", [("type", "A"), ("offset", "0"), ("type", "B"), ("limit", "10")])
+    assert first == second
+    assert first != cache_key("https://api.example.org/dataset", [("type", "B"), ("type", "A"), ("limit", "10"), ("offset", "0")])
+
+def test_parse_cache_control():
+    assert parse_cache_control('max-age=60, stale-while-revalidate=30, no-transform') == {
+        "max-age": "60", "stale-while-revalidate": "30", "no-transform": None
+    }
+    assert parse_cache_control(None) == {}
+
+def test_store_and_revalidate(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"), stale_ttl=100)
+
+    assert cache.store("a", b'{"result": [1]}', {"ETag": '"v1"', "Cache-Control": "max-age=60"})
+    stored = cache.get("a")
+    assert stored.json() == {"result": [1]}
+    assert stored.conditional_headers() == {"If-None-Match": '"v1"'}
+    assert stored.fresh_until > time.time() + 50
+    assert stored.stale_until > stored.fresh_until + 99
+
+    # A 304 keeps the body, renews the deadlines and picks up new validators
+    cache.revalidated("a", {"ETag": '"v2"', "Last-Modified": "Wed, 01 May 2024 00:00:00 GMT"})
+    revalidated = cache.get("a")
+    assert revalidated.body == stored.body
+    assert revalidated.fresh_until <= time.time()
+    assert revalidated.conditional_headers() == {
+        "If-None-Match": '"v2"', "If-Modified-Since": "Wed, 01 May 2024 00:00:00 GMT"
+    }
+
+    assert not cache.store("b", b"{}", {"Cache-Control": "no-store"})
+    assert cache.get("b") is None
+    cache.close()
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"), max_entries=2)
+    cache.store("a", b"1", {})
+    time.sleep(0.01)
+    cache.store("b", b"2", {})
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.store("c", b"3", {})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.close()
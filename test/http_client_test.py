@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+import time
+from email.utils import formatdate
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+
+import requests
+from http_client import ClientConfig, HttpClient, TokenBucket, observe_attempts, parse_retry_after
+from stub_server import StubServer
+
+@pytest.fixture
+def server():
+    with StubServer(seed=1) as stub:
+        yield stub
+
+def make_client(tmp_path, **config):
+    config.setdefault("backoff_base", 0.01)
+    return HttpClient(ClientConfig(cache_path=str(tmp_path / "http.sqlite"), **config))
+
+def run_async(client, coroutine_function):
+    async def run():
+        try:
+            return await coroutine_function()
+        finally:
+            await client.close_async()
+    return asyncio.run(run())
+
+def test_retries_until_the_last_attempt(server, tmp_path):
+    server.error_rate = 1.0
+    client = make_client(tmp_path, max_retries=2)
+
+    # The last response is handed back whatever its status
+    response = client.get(server.gbif_url + "species/1")
+    assert response.status_code == 503
+    assert server.requests == 3
+
+    server.error_rate = 0.0
+    assert client.get_json(server.gbif_url + "species/1")["scientificName"] == "Animalia"
+    client.close()
+
+def test_retry_after_is_honoured(server, tmp_path):
+    server.error_rate = 1.0
+    server.retry_after = 0.3
+    client = make_client(tmp_path, max_retries=1)
+
+    start = time.monotonic()
+    assert client.get(server.gbif_url + "species/1").status_code == 503
+    assert time.monotonic() - start >= 0.3
+    client.close()
+
+def test_backoff_and_retry_after_parsing(tmp_path):
+    client = make_client(tmp_path, backoff_base=0.5, backoff_cap=4.0)
+    for attempt in range(6):
+        assert 0 <= client.backoff(attempt) <= min(4.0, 0.5 * 2 ** attempt)
+    assert client.backoff(0, retry_after=2.0) >= 2.0
+    # A server asking for longer than the cap doesn't stall the client
+    assert client.backoff(0, retry_after=600) <= 4.0
+
+    assert parse_retry_after("3") == 3.0
+    assert 8 <= parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10.0, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # Later callers are told to wait their turn, one token per 1/rate seconds
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.02)
+
+def test_rate_limit_spaces_requests(server, tmp_path):
+    client = make_client(tmp_path, rate_limits={"127.0.0.1": (20.0, 2)})
+
+    start = time.monotonic()
+    for _ in range(5):
+        client.get_json(server.gbif_url + "species/1")
+    # Two requests from the burst, then one every 50 ms
+    assert time.monotonic() - start >= 0.14
+    client.close()
+
+def test_sync_timeout(server, tmp_path):
+    server.latency = 0.5
+    client = make_client(tmp_path, timeout=0.1, max_retries=0)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get(server.gbif_url + "species/1")
+    client.close()
+
+def test_async_timeouts_fire_and_are_observed(server, tmp_path):
+    server.latency = 1.0
+    client = make_client(tmp_path, timeout=0.2, max_retries=0)
+    attempts = []
+
+    async def fetch(**kwargs):
+        with observe_attempts(lambda status, seconds: attempts.append((status, seconds))):
+            return await client.get_json_async(server.gbif_url + "species/1", **kwargs)
+
+    # The session's own timeout applies when the call doesn't set one
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        run_async(client, fetch)
+    assert time.monotonic() - start < 0.8
+    assert attempts and attempts[0][0] is None
+
+    # A per-call timeout overrides it
+    client = make_client(tmp_path, timeout=30.0, max_retries=0)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        run_async(client, lambda: fetch(timeout=0.2))
+    assert time.monotonic() - start < 0.8
+
+def test_async_retries(server, tmp_path):
+    server.error_rate = 1.0
+    client = make_client(tmp_path, max_retries=2)
+    statuses = []
+
+    async def fetch():
+        with observe_attempts(lambda status, seconds: statuses.append(status)):
+            async with client.request_async(server.gbif_url + "species/1") as response:
+                return response.status
+
+    assert run_async(client, fetch) == 503
+    assert statuses == [503, 503, 503]
+
+    server.error_rate = 0.0
+    record = run_async(client, lambda: client.get_json_async(server.gbif_url + "species/216"))
+    assert record["scientificName"] == "Insecta"
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import image_index
+from image_index import ImageAvailabilityIndex
+
+FACETS = {
+    "familyKey": [(5, 60)],
+    "genusKey": [(6, 50), (7, 10)],
+}
+
+def make_index(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setattr(image_index.resolver, "usage_key", lambda name, rank=None: 216)
+    monkeypatch.setattr(image_index, "_facet_counts", lambda filters, field: iter(FACETS[field]))
+    index = ImageAvailabilityIndex(str(tmp_path / "images.sqlite"), **kwargs)
+    assert index.build("Insecta") == 216
+    return index
+
+def test_build_and_counts(tmp_path, monkeypatch):
+    index = make_index(tmp_path, monkeypatch)
+
+    assert index.counts(216, 'family') == {5: 60}
+    assert index.counts(216, 'genus') == {6: 50, 7: 10}
+    # Taxa of a built class missing from the facets have no images
+    assert index.image_count({'key': 8, 'classKey': 216}) == 0
+    assert index.has_images({'key': 8, 'classKey': 216}) is False
+    assert index.has_images(9) is None
+    index.close()
+
+def test_set_count_keeps_the_built_rank_and_class(tmp_path, monkeypatch):
+    index = make_index(tmp_path, monkeypatch)
+
+    # A count learnt from a draw knows neither, the genus must stay drawable
+    index.set_count(6, 51)
+    assert index.counts(216, 'genus') == {6: 51, 7: 10}
+    assert index.image_count(6) == 51
+
+    # New taxa are stored with whatever they come with
+    index.set_count({'key': 10, 'classKey': 216}, 3, rank="genus")
+    index.set_count(11, 4)
+    assert index.counts(216, 'genus') == {6: 51, 7: 10, 10: 3}
+    assert index.image_count(11) == 4
+    index.close()
+
+def test_failures_expire(tmp_path, monkeypatch):
+    index = make_index(tmp_path, monkeypatch)
+
+    index.mark_failed(6, ttl=0.05)
+    assert index.has_images(6) is False
+    assert index.filter_with_images([{'key': 6}, {'key': 7}, {'key': 9}]) == [{'key': 7}, {'key': 9}]
+    time.sleep(0.06)
+    assert index.has_images(6) is True
+    index.close()
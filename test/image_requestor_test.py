@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import image_index
+import image_requestor as imgr
+import requests
+from image_index import ImageAvailabilityIndex
+
+def occurrence(species, *urls):
+    return {'species': species, 'media': [{'identifier': url} for url in urls] + [{'type': "StillImage"}]}
+
+class FakeOccurrenceSearch:
+    """
+    Answers occurrence searches of one taxon, `pages` hands out the page at each request in turn.
+    """
+
+    def __init__(self, count, pages=()):
+        self.count = count
+        self.pages = list(pages)
+        self.requests = []
+
+    def get_json(self, url, params=None, **kwargs):
+        self.requests.append(dict(params))
+        if params['limit'] == 0:
+            return {'count': self.count, 'results': []}
+        return {'count': self.count, 'results': self.pages.pop(0)}
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = ImageAvailabilityIndex(str(tmp_path / "images.sqlite"))
+    monkeypatch.setattr(image_index, "get_default_index", lambda: index)
+    yield index
+    index.close()
+
+def search(monkeypatch, count, pages=()):
+    fake = FakeOccurrenceSearch(count, pages)
+    monkeypatch.setattr(imgr.http_client, "get_json", fake.get_json)
+    return fake
+
+def test_zero_count_is_remembered(index, monkeypatch):
+    fake = search(monkeypatch, count=0)
+
+    assert imgr.select_random_image(1470) == ("", "")
+    assert index.image_count(1470) == 0 and index.has_images(1470) is False
+    assert len(fake.requests) == 1
+
+    # The index answers the next draw without a request
+    assert imgr.select_random_image(1470) == ("", "")
+    assert len(fake.requests) == 1
+
+def test_pages_without_usable_media_are_retried(index, monkeypatch):
+    fake = search(monkeypatch, count=40, pages=[
+        [{'species': "Carabus nemoralis"}, occurrence("Carabus nemoralis")],
+        [occurrence("Carabus granulatus", "https://images.example.org/granulatus.jpg")],
+    ])
+
+    assert imgr.select_random_image(1470, page_size=2) == ("Carabus granulatus", "https://images.example.org/granulatus.jpg")
+    assert index.image_count(1470) == 40
+    pages = fake.requests[1:]
+    assert len(pages) == 2
+    assert all(0 <= page['offset'] < 40 and page['limit'] == 2 for page in pages)
+
+    # The offset stays inside the window and the page within GBIF's paging limit
+    fake = search(monkeypatch, count=10 ** 6, pages=[[occurrence("Carabus auratus", "https://images.example.org/auratus.jpg")]])
+    monkeypatch.setattr(imgr.random, "randrange", lambda window: window - 1)
+    assert imgr.select_random_image(1471)[0] == "Carabus auratus"
+    assert fake.requests[-1]['offset'] == imgr.OCCURRENCE_PAGING_LIMIT - 1 and fake.requests[-1]['limit'] == 1
+
+def test_no_image_after_every_attempt(index, monkeypatch):
+    fake = search(monkeypatch, count=5, pages=[[occurrence("Carabus")]] * 3)
+
+    assert imgr.select_random_image(1470, attempts=3) == ("", "")
+    assert len(fake.requests) == 4
+    # The taxon is skipped for a while, though it does have occurrences with images
+    assert index.has_images(1470) is False
+    assert imgr.select_random_image(1470) == ("", "")
+    assert len(fake.requests) == 4
+
+def test_request_failures_are_not_held_against_the_taxon(index, monkeypatch):
+    def unreachable(url, params=None, **kwargs):
+        raise requests.exceptions.ConnectionError("GBIF unreachable")
+    monkeypatch.setattr(imgr.http_client, "get_json", unreachable)
+
+    # An empty list rather than ("", ""), the caller keeps drawing the genus
+    assert imgr.select_random_image(1470) == []
+    assert index.has_images(1470) is None
@@ -0,0 +1,110 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from image_source import HedgedImageSource, ImageResult, ImageSource, LatencyTracker
+
+class FakeSource(ImageSource):
+    def __init__(self, name, delay, found=True):
+        self.name = name
+        self.delay = delay
+        self.found = found
+        self.cancelled = threading.Event()
+
+    def fetch(self, genus_key, cancel=None):
+        if cancel.wait(self.delay):
+            self.cancelled.set()
+            return None
+        return ImageResult("Apis mellifera", "image.png", self.name) if self.found else None
+
+def test_fast_primary_is_not_hedged():
+    fallback = FakeSource("fallback", 0.0)
+    source = HedgedImageSource(FakeSource("primary", 0.01), fallback, hedge_delay=0.5)
+
+    assert source.fetch(1).source == "primary"
+    assert source.tracker.count("fallback") == 0
+    source.close()
+
+def test_slow_primary_loses_to_fallback_and_is_cancelled():
+    primary = FakeSource("primary", 5.0)
+    source = HedgedImageSource(primary, FakeSource("fallback", 0.01), hedge_delay=0.05)
+
+    start = time.monotonic()
+    assert source.fetch(1).source == "fallback"
+    assert time.monotonic() - start < 1.0
+    assert primary.cancelled.wait(1.0)
+    source.close()
+
+class RecordingSource(FakeSource):
+    def __init__(self, name, delay, found=True, failing=False):
+        super().__init__(name, delay, found)
+        self.failing = failing
+        self.started = []
+        self.finished = []
+
+    def fetch(self, genus_key, cancel=None):
+        self.started.append(time.monotonic())
+        try:
+            if self.failing:
+                raise RuntimeError("no answer")
+            return super().fetch(genus_key, cancel)
+        finally:
+            self.finished.append(time.monotonic())
+
+def test_empty_or_failed_primary_falls_back_before_the_delay():
+    # Deliberately not a pure hedge: waiting out the delay after an empty answer would gain nothing
+    for primary in (RecordingSource("primary", 0.05, found=False), RecordingSource("primary", 0.0, failing=True)):
+        fallback = RecordingSource("fallback", 0.0)
+        source = HedgedImageSource(primary, fallback, hedge_delay=5.0)
+
+        start = time.monotonic()
+        assert source.fetch(1).source == "fallback"
+        assert time.monotonic() - start < 1.0
+        # The fallback only started once the primary had given up
+        assert fallback.started[0] >= primary.finished[0]
+        source.close()
+
+def test_image_source_is_abstract():
+    class Incomplete(ImageSource):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_hedge_delay_follows_primary_latency():
+    tracker = LatencyTracker()
+    source = HedgedImageSource(FakeSource("primary", 0.0), FakeSource("fallback", 0.0),
+                               hedge_delay=2.0, quantile=0.9, min_samples=10, min_delay=0.1, tracker=tracker)
+    assert source.hedge_delay() == 2.0
+
+    for sample in range(1, 11):
+        tracker.record("primary", sample / 10)
+    assert source.hedge_delay() == 1.0
+
+    for _ in range(100):
+        tracker.record("primary", 0.01)
+    assert source.hedge_delay() == 0.1
+    source.close()
+
+def test_slow_primaries_that_lose_are_still_sampled():
+    primary = FakeSource("primary", 5.0)
+    source = HedgedImageSource(primary, FakeSource("fallback", 0.01), hedge_delay=0.1)
+
+    assert source.fetch(1).source == "fallback"
+    assert primary.cancelled.wait(1.0)
+    time.sleep(0.05)
+    # The cancelled primary counts with at least the time it was given
+    assert source.tracker.count("primary") == 1
+    assert source.tracker.quantile("primary", 0.5) >= 0.1
+
+    # A source that comes back empty at once isn't a latency sample
+    empty = HedgedImageSource(FakeSource("primary", 0.0, found=False), FakeSource("fallback", 0.0))
+    empty.fetch(1)
+    assert empty.tracker.count("primary") == 0
+    source.close()
+    empty.close()
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import http_client
+from image_store import ImageStore
+
+class FakeImageServer:
+    """
+    Serves `bodies[url]` for every image URL, counting the downloads.
+    """
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.downloads = []
+
+    def _response(self, url):
+        self.downloads.append(url)
+        body = self.bodies[url]
+        return FakeResponse(body)
+
+    def get(self, url, stream=False, **kwargs):
+        return self._response(url)
+
+    @asynccontextmanager
+    async def request_async(self, url, **kwargs):
+        yield self._response(url)
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+        self.headers = {"Content-Type": "image/jpeg"}
+        self.content = self
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        return [self.body[i:i + size] for i in range(0, len(self.body), size)]
+
+    async def iter_chunked(self, size):
+        for chunk in self.iter_content(size):
+            yield chunk
+
+    def close(self):
+        pass
+
+
+def serve(monkeypatch, bodies):
+    server = FakeImageServer(bodies)
+    monkeypatch.setattr(http_client, "get", server.get)
+    monkeypatch.setattr(http_client, "request_async", server.request_async)
+    return server
+
+def test_ingest_runs_off_the_event_loop_and_concurrently(tmp_path, monkeypatch):
+    urls = [f"https://images.example.org/{number}.jpg" for number in range(4)]
+    serve(monkeypatch, {url: url.encode() * 100 for url in urls})
+    hook_threads = []
+
+    def slow_ingest(path):
+        hook_threads.append(threading.current_thread())
+        time.sleep(0.2)
+        return []
+
+    store = ImageStore(str(tmp_path / "images"), ingest=slow_ingest)
+
+    async def fetch_all():
+        start = time.monotonic()
+        paths = await store.fetch_many(urls)
+        return paths, time.monotonic() - start, threading.current_thread()
+
+    paths, elapsed, loop_thread = asyncio.run(fetch_all())
+    assert all(os.path.exists(path) for path in paths.values())
+    assert len(hook_threads) == 4 and loop_thread not in hook_threads
+    # Four 200 ms hooks side by side, not one after the other
+    assert elapsed < 0.6
+    store.close()
+
+def test_same_content_is_stored_once(tmp_path, monkeypatch):
+    server = serve(monkeypatch, {
+        "https://a.example.org/carabus.jpg": b"same image" * 10,
+        "https://b.example.org/mirror/carabus.jpg": b"same image" * 10,
+    })
+    store = ImageStore(str(tmp_path / "images"))
+
+    first = store.fetch("https://a.example.org/carabus.jpg")
+    second = store.fetch("https://b.example.org/mirror/carabus.jpg")
+    assert first == second and first.endswith(".jpg")
+    assert store.hash_for("https://a.example.org/carabus.jpg") == store.hash_for("https://b.example.org/mirror/carabus.jpg")
+    assert store.total_bytes() == 100
+    assert os.listdir(str(tmp_path / "images" / "tmp")) == []
+
+    # Known URLs are answered from the index without a download
+    assert store.fetch("https://a.example.org/carabus.jpg") == first
+    assert len(server.downloads) == 2
+    store.close()
+
+def test_url_index_forgets_removed_files(tmp_path, monkeypatch):
+    server = serve(monkeypatch, {"https://a.example.org/1.jpg": b"x" * 50})
+    store = ImageStore(str(tmp_path / "images"))
+
+    assert store.path_for("https://a.example.org/1.jpg") is None
+    path = store.fetch("https://a.example.org/1.jpg")
+    assert store.path_for("https://a.example.org/1.jpg") == path
+
+    os.remove(path)
+    assert store.path_for("https://a.example.org/1.jpg") is None
+    assert store.total_bytes() == 0
+    assert store.fetch("https://a.example.org/1.jpg") == path
+    assert len(server.downloads) == 2
+    store.close()
+
+def test_least_recently_used_objects_are_evicted(tmp_path, monkeypatch):
+    urls = {name: f"https://a.example.org/{name}.jpg" for name in "abc"}
+    serve(monkeypatch, {url: name.encode() * 100 for name, url in urls.items()})
+    store = ImageStore(str(tmp_path / "images"), max_bytes=250)
+
+    paths = {}
+    for name in "ab":
+        paths[name] = store.fetch(urls[name])
+        time.sleep(0.01)
+    # Reading a makes b the least recently used object
+    store.fetch(urls["a"])
+    time.sleep(0.01)
+    paths["c"] = store.fetch(urls["c"])
+
+    assert store.path_for(urls["b"]) is None and not os.path.exists(paths["b"])
+    assert store.path_for(urls["a"]) == paths["a"]
+    assert store.total_bytes() == 200
+
+    assert store.evict(max_bytes=100) == 1
+    assert store.total_bytes() == 100
+    store.close()
+
+def test_object_just_fetched_is_never_evicted(tmp_path, monkeypatch):
+    serve(monkeypatch, {
+        "https://a.example.org/small.jpg": b"s" * 50,
+        "https://a.example.org/huge.jpg": b"h" * 500,
+    })
+    store = ImageStore(str(tmp_path / "images"), max_bytes=100)
+
+    store.fetch("https://a.example.org/small.jpg")
+    time.sleep(0.01)
+    # Bigger than the whole budget, everything else goes but the image asked for stays
+    path = store.fetch("https://a.example.org/huge.jpg")
+    assert os.path.exists(path)
+    assert store.path_for("https://a.example.org/small.jpg") is None
+    assert store.total_bytes() == 500
+    store.close()
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+Image = pytest.importorskip("PIL.Image")
+
+import image_variants
+
+ORIENTATION = 0x0112
+
+def halves(size, path, **save):
+    # Red on the left, blue on the right, so a rotation shows
+    img = Image.new("RGB", size, (0, 0, 255))
+    img.paste((255, 0, 0), (0, 0, size[0] // 2, size[1]))
+    img.save(path, **save)
+    return path
+
+def close_to(pixel, colour):
+    return all(abs(a - b) < 40 for a, b in zip(pixel, colour))
+
+def test_variant_fits_the_display_and_sits_next_to_the_original(tmp_path):
+    original = halves((1600, 900), str(tmp_path / "carabus.png"))
+    variant = image_variants.make_variant(original)
+
+    assert variant == str(tmp_path / f"carabus.400x400{image_variants.variant_extension()}")
+    with Image.open(variant) as img:
+        assert img.size == (400, 225)
+        assert img.format == image_variants.variant_format()
+
+    assert image_variants.variant_path(original, (200, 100)).endswith(".200x100" + image_variants.variant_extension())
+    assert image_variants.make_display_variants(original) == [variant]
+
+def test_exif_orientation_is_applied(tmp_path):
+    exif = Image.Exif()
+    # 6: the camera was turned a quarter clockwise, the left of the stored image is the top
+    exif[ORIENTATION] = 6
+    original = halves((1200, 800), str(tmp_path / "apis.jpg"), exif=exif)
+
+    with Image.open(image_variants.make_variant(original)) as img:
+        assert img.size == (267, 400)
+        assert close_to(img.getpixel((133, 20)), (255, 0, 0))
+        assert close_to(img.getpixel((133, 380)), (0, 0, 255))
+        assert ORIENTATION not in img.getexif()
+
+def test_jpeg_is_used_without_webp(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_variants, "_variant_format", None)
+    monkeypatch.setattr(image_variants.features, "check", lambda feature: False)
+    assert image_variants.VARIANT_FORMAT == "JPEG"
+    assert image_variants.VARIANT_EXTENSION == ".jpg"
+
+    # Transparency is dropped, JPEG can't hold it
+    original = str(tmp_path / "vespa.png")
+    Image.new("RGBA", (800, 800), (10, 200, 10, 128)).save(original)
+    variant = image_variants.make_variant(original)
+    assert variant.endswith("vespa.400x400.jpg")
+    with Image.open(variant) as img:
+        assert img.format == "JPEG" and img.mode == "RGB" and img.size == (400, 400)
+
+    monkeypatch.setattr(image_variants, "_variant_format", None)
+    monkeypatch.setattr(image_variants.features, "check", lambda feature: feature == "webp")
+    assert image_variants.variant_extension() == ".webp"
+
+def test_display_path_falls_back_to_the_original(tmp_path):
+    original = halves((100, 80), str(tmp_path / "formica.png"))
+    assert image_variants.display_path(None) is None
+    assert image_variants.display_path(original) == original
+
+    variant = image_variants.make_variant(original)
+    assert image_variants.display_path(original) == variant
+    # A small image isn't enlarged
+    with Image.open(variant) as img:
+        assert img.size == (100, 80)
@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from lazy_loading import MissingModule, is_loaded, lazy_import
+
+HEAVY_MODULES = ["requests", "aiohttp", "selenium.webdriver", "PIL.Image", "pyarrow", "tkinter"]
+
+@pytest.mark.parametrize("module", ["quinsectz", "datasets", "dataset_sync", "image_scraper", "image_variants", "quiz_ui", "demo_scraped_image"])
+def test_import_is_side_effect_free(module):
+    # A fresh interpreter, the modules this process already imported don't count
+    probe = (
+        "import json, sys, threading\n"
+        f"sys.path.insert(0, {SRC!r})\n"
+        f"import {module}\n"
+        "from lazy_loading import is_loaded\n"
+        f"print(json.dumps([[name for name in {HEAVY_MODULES!r} if is_loaded(name)], threading.active_count()]))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+    heavy, threads = json.loads(output.strip().splitlines()[-1])
+    assert heavy == []
+    assert threads == 1
+
+def test_lazy_import_defers_execution_and_missing_modules():
+    if "wave" in sys.modules:
+        pytest.skip("wave was already imported")
+    module = lazy_import("wave")
+    assert not is_loaded("wave")
+    assert module.WAVE_FORMAT_PCM == 1
+    assert is_loaded("wave")
+
+    missing = lazy_import("no_such_module_here")
+    assert isinstance(missing, MissingModule)
+    assert lazy_import("no_such_module_here", optional=True) is None
+    with pytest.raises(ModuleNotFoundError):
+        missing.anything
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from metrics import Registry, endpoint
+
+def test_counter_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("test_requests_total", "Requests", ("endpoint", "status"))
+    requests.inc(endpoint="api/species", status=200)
+    requests.inc(endpoint="api/species", status=200)
+    requests.inc(endpoint="api/species", status=503)
+
+    assert requests.value(endpoint="api/species", status=200) == 2
+    # Registering the same name again returns the existing metric
+    assert registry.counter("test_requests_total", "Requests", ("endpoint", "status")) is requests
+
+    text = registry.to_prometheus()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{endpoint="api/species",status="200"} 2' in text
+    assert 'test_requests_total{endpoint="api/species",status="503"} 1' in text
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("test_seconds", "Latency", ("endpoint",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(seconds, endpoint="api")
+
+    samples = {(name, labels.get('le')): value for name, labels, value in latency.samples()}
+    assert samples[("test_seconds_bucket", "0.1")] == 1
+    assert samples[("test_seconds_bucket", "1.0")] == 3
+    assert samples[("test_seconds_bucket", "+Inf")] == 4
+    assert samples[("test_seconds_count", None)] == 4
+    assert abs(samples[("test_seconds_sum", None)] - 4.25) < 1e-9
+
+    exported = json.loads(registry.to_json())
+    assert exported["test_seconds"]["type"] == "histogram"
+
+    registry.reset()
+    assert latency.count(endpoint="api") == 0
+
+def test_endpoint_collapses_record_keys():
+    assert endpoint("https://api.gbif.org/v1/species/1234/children") == "api.gbif.org/v1/species/{key}/children"
+    assert endpoint("https://api.checklistbank.org/dataset/3LR/match/nameusage") == "api.checklistbank.org/dataset/3LR/match/nameusage"
@@ -0,0 +1,64 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from name_completer import NameCompleter, fold
+from question_pipeline import Question
+
+FAMILIES = [
+    {'key': 1, 'scientificName': "Carabidae Latreille, 1802", 'canonicalName': "Carabidae", 'rank': "FAMILY"},
+    {'key': 2, 'scientificName': "Cantharidae", 'rank': "FAMILY"},
+    {'key': 3, 'scientificName': "Cerambycidae", 'rank': "FAMILY"},
+    {'key': 4, 'scientificName': "Curculionidae", 'rank': "FAMILY"},
+    {'key': 5, 'scientificName': "Coccinellidae", 'rank': "FAMILY"},
+]
+
+def names(completions):
+    return [completion.name for completion in completions]
+
+def test_fold():
+    assert fold("  Æschna  Grandis ") == "aeschna grandis"
+    assert fold("Bombus lapidarius Linnæus") == "bombus lapidarius linnaeus"
+    assert fold("Löwia") == "lowia"
+
+def test_completes_by_popularity():
+    completer = NameCompleter(size=3)
+    completer.add_taxa(FAMILIES, weights={1: 50, 2: 5, 3: 20, 4: 80})
+
+    assert names(completer.complete("C")) == ["Curculionidae", "Carabidae", "Cerambycidae"]
+    assert names(completer.complete("ca")) == ["Carabidae", "Cantharidae"]
+    assert names(completer.complete("CAR")) == ["Carabidae"]
+    assert completer.complete("cx") == []
+    # A longer list than the precomputed one, ties keep their alphabetical order
+    assert names(completer.complete("c", limit=5)) == ["Curculionidae", "Carabidae", "Cerambycidae", "Cantharidae", "Coccinellidae"]
+    assert completer.complete("carabidae")[0].rank == "family"
+
+def test_case_and_diacritics_and_updates():
+    completer = NameCompleter(size=2, max_scan=1)
+    completer.add("Löwia", 1)
+    completer.add("Lomechusa", 2)
+    assert names(completer.complete("lo")) == ["Lomechusa", "Löwia"]
+    assert names(completer.complete("LOW")) == ["Löwia"]
+
+    # Adding after a lookup rebuilds the index, the same folded name only raises the weight
+    completer.add("lowia", 5)
+    completer.add("Lodes", 3)
+    assert names(completer.complete("lo")) == ["Löwia", "Lodes"]
+    assert len(completer) == 3 and "LOWIA" in completer
+
+def test_large_ranges_match_a_scan():
+    completer = NameCompleter(size=4, max_scan=8)
+    for number in range(300):
+        completer.add(f"Genus{number % 7} epithet{number}", weight=(number * 37) % 101)
+    entries = sorted(completer._entries.items())
+    for prefix in ["", "g", "genus3", "genus3 epithet1", "genus3 epithet10"]:
+        expected = sorted((completion for key, completion in entries if key.startswith(prefix)), key=lambda c: -c.weight)
+        assert completer.complete(prefix) == expected[:4]
+
+def test_typed_answers():
+    question = Question("image.png", [], "Carabidae Latreille, 1802", genus={'key': 7, 'scientificName': "Carabus Linnaeus, 1758"})
+    assert question.answered_by(" carabidae ") == "family"
+    assert question.answered_by("Carabus") == "genus"
+    assert question.answered_by("Cicindelidae") is None
+    assert question.answered_by("") is None
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from name_matcher import NameMatcher, canonical_name, is_confident, EXACT_SCORE, STEM_SCORE
+
+NAMES = [
+    ("Carabus granulatus Linnaeus, 1758", 1),
+    ("Carabus nemoralis O.F.Müller, 1764", 2),
+    ("Carabus auratus Linnaeus, 1761", 3),
+    ("Cicindela campestris Linnaeus, 1758", 4),
+    ("Aphodius niger (Panzer, 1797)", 5),
+    ("Carabidae", 6, "family"),
+    ("Carabus", 7, "genus"),
+    ("Silene vulgaris subsp. maritima (With.) Á.Löve & D.Löve", 8),
+]
+
+def make_matcher():
+    matcher = NameMatcher()
+    matcher.add_many(NAMES)
+    return matcher
+
+def test_canonical_name():
+    assert canonical_name("Carabus (Carabus) granulatus Linnæus, 1758") == "carabus granulatus"
+    assert canonical_name("Silene vulgaris subsp. maritima (With.) Á.Löve & D.Löve") == "silene vulgaris maritima"
+    assert canonical_name("Mentha × piperita L.") == "mentha piperita"
+    assert canonical_name("Aphodius cf. niger") == "aphodius niger"
+    assert canonical_name("Carabidae Latreille, 1802") == "carabidae"
+    assert canonical_name("1758") == ""
+
+def test_exact_and_variant_spellings():
+    matcher = make_matcher()
+
+    best = matcher.match("Carabus granulatus")[0]
+    assert (best.key, best.score) == (1, EXACT_SCORE)
+    assert matcher.match("Carabus (Carabus) granulatus Fabricius")[0].key == 1
+
+    # Another gender ending of the epithet
+    best = matcher.match("Aphodius nigra")[0]
+    assert (best.key, best.score) == (5, STEM_SCORE)
+
+    # A typo is found by trigrams, below a stemmed match but still confident
+    candidates = matcher.match("Carabus nemorslis")
+    assert candidates[0].key == 2
+    assert STEM_SCORE > candidates[0].score
+    assert is_confident(candidates)
+
+    # Letters left out or doubled, up to a few, are typos too
+    assert matcher.match("Cicindela campestrs")[0].key == 4
+    assert matcher.match("Ciccindela campesstris")[0].key == 4
+    # Names much longer or shorter than any listed one aren't close to it
+    assert matcher.match("Cicindela campestrisvulgarissima") == []
+
+    assert not is_confident(matcher.match("Pterostichus melanarius"))
+
+def test_rank_filter():
+    matcher = make_matcher()
+    assert [candidate.key for candidate in matcher.match("Carabus", rank="genus")] == [7]
+    assert all(candidate.key != 7 for candidate in matcher.match("Carabus", rank="family"))
+
+def test_homonyms_are_not_confident():
+    matcher = make_matcher()
+    matcher.add("Carabus auratus Fabricius, 1801", 30)
+
+    candidates = matcher.match("Carabus auratus")
+    assert {candidate.key for candidate in candidates[:2]} == {3, 30}
+    assert not is_confident(candidates)
+
+def test_load(tmp_path):
+    path = tmp_path / "names.tsv"
+    path.write_text("Carabus granulatus\t1\tspecies\nCarabidae\t6\tfamily\n\nCicindela\n", encoding="utf-8")
+
+    matcher = NameMatcher.load(str(path))
+    assert len(matcher) == 3
+    best = matcher.match("Carabus granulata")[0]
+    assert (best.key, best.rank) == ("1", "SPECIES")
+    assert matcher.match("Cicindela")[0].key == "Cicindela"
@@ -0,0 +1,179 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import name_resolver
+from name_resolver import NameResolver
+from ranks import Rank
+from taxonomy_cache import TaxonomyCache
+
+class FakeBackbone:
+    """
+    Stands in for the species/match and species/{key} requests, counting them.
+    """
+
+    def __init__(self, delay=0.0, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def name_backbone(self, name, rank):
+        with self._lock:
+            self.calls.append((name, rank))
+        time.sleep(self.delay)
+        if name in self.failing:
+            raise RuntimeError(f"no answer for {name}")
+        return {'usageKey': len(name), 'scientificName': name, 'rank': (rank or "unranked").upper()}
+
+    def usage(self, key):
+        with self._lock:
+            self.calls.append((key, None))
+        return {'key': key, 'usageKey': key}
+
+
+@pytest.fixture
+def backbone(monkeypatch):
+    fake = FakeBackbone()
+    monkeypatch.setattr(name_resolver, "_name_backbone", fake.name_backbone)
+    monkeypatch.setattr(name_resolver, "_usage", fake.usage)
+    return fake
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TaxonomyCache(str(tmp_path / "taxonomy.sqlite"))
+    yield cache
+    cache.close()
+
+def test_concurrent_resolves_share_one_request(backbone, cache):
+    backbone.delay = 0.1
+    resolver = NameResolver(cache=cache)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def resolve():
+        barrier.wait()
+        results.append(resolver.resolve(" Insecta", rank="class"))
+
+    threads = [threading.Thread(target=resolve) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backbone.calls == [(" Insecta", "class")]
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    # Spelling and rank type don't make another lookup
+    assert resolver.resolve("insecta", rank=Rank.CLASS) is results[0]
+    assert len(backbone.calls) == 1
+
+def test_failures_reach_every_waiter_and_are_not_kept(backbone, cache):
+    backbone.delay = 0.1
+    backbone.failing = {"Nonsense"}
+    resolver = NameResolver(cache=cache)
+    errors = []
+
+    def resolve():
+        try:
+            resolver.resolve("Nonsense")
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=resolve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4
+
+    backbone.failing = set()
+    assert resolver.resolve("Nonsense")['scientificName'] == "Nonsense"
+
+def test_lru_capacity(backbone, cache):
+    resolver = NameResolver(maxsize=2, cache=cache)
+    for name in ["Apidae", "Vespidae", "Apidae", "Formicidae"]:
+        resolver.resolve(name)
+    assert len(backbone.calls) == 3
+
+    # Without the persistent cache behind it, only the two most recent names are still known
+    cache.invalidate(prefix="name_backbone:")
+    resolver.resolve("Apidae")
+    resolver.resolve("Formicidae")
+    assert len(backbone.calls) == 3
+    resolver.resolve("Vespidae")
+    assert backbone.calls[-1] == ("Vespidae", None)
+
+def test_resolve_many_and_usage_keys(backbone, cache):
+    resolver = NameResolver(cache=cache, max_workers=4)
+    matches = resolver.resolve_many(["Apidae", 1470, "Apidae", "Vespidae", 1470])
+
+    assert list(matches) == ["Apidae", 1470, "Vespidae"]
+    assert matches[1470]['usageKey'] == 1470
+    assert len(backbone.calls) == 3
+    assert set(backbone.calls) == {(1470, None), ("Apidae", None), ("Vespidae", None)}
+    assert resolver.usage_key("Vespidae") == len("Vespidae")
+    assert resolver.usage_key(1470) == 1470
+
+def test_invalidate(backbone, cache):
+    resolver = NameResolver(cache=cache)
+    resolver.resolve("Apidae", rank="family")
+    resolver.resolve("Vespidae")
+
+    assert resolver.invalidate("Apidae", rank="FAMILY") == 1
+    resolver.resolve("Apidae", rank="family")
+    resolver.resolve("Vespidae")
+    assert len(backbone.calls) == 3
+
+    assert resolver.invalidate() == 2
+    resolver.resolve("Vespidae")
+    assert len(backbone.calls) == 4
+
+class Interrupted(BaseException):
+    pass
+
+def test_interrupted_lookups_are_not_left_in_flight(backbone, cache, monkeypatch):
+    resolver = NameResolver(cache=cache)
+    started = threading.Event()
+    release = threading.Event()
+
+    def interrupted(name, rank):
+        started.set()
+        release.wait()
+        raise Interrupted()
+    monkeypatch.setattr(name_resolver, "_name_backbone", interrupted)
+
+    def owner():
+        with pytest.raises(Interrupted):
+            resolver.resolve("Apidae")
+
+    errors = []
+    def waiter():
+        try:
+            resolver.resolve("Apidae")
+        except Interrupted as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=owner, daemon=True)]
+    threads[0].start()
+    started.wait()
+    threads.append(threading.Thread(target=waiter, daemon=True))
+    threads[1].start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=2)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(errors) == 1
+
+    # The next lookup asks again instead of waiting on the interrupted one
+    monkeypatch.setattr(name_resolver, "_name_backbone", backbone.name_backbone)
+    results = []
+    retry = threading.Thread(target=lambda: results.append(resolver.resolve("Apidae")), daemon=True)
+    retry.start()
+    retry.join(timeout=2)
+    assert [match['scientificName'] for match in results] == ["Apidae"]
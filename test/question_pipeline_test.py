@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from question_pipeline import Question, QuestionPipeline
+
+class StubBuilder:
+    """
+    Builds numbered questions, each after `delay` seconds, failing while `failing` is set.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.failing = False
+        self.built = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(self.delay)
+        if self.failing:
+            raise RuntimeError("no image")
+        with self._lock:
+            self.built += 1
+            return Question(image_path=f"{self.built}.jpg", choices=["Apidae", "Vespidae"], answer="Apidae")
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_fills_to_the_high_watermark_and_refills_below_the_low_one():
+    builder = StubBuilder(delay=0.01)
+    pipeline = QuestionPipeline(builder, high_watermark=4, low_watermark=1, producers=3).start()
+
+    wait_until(lambda: pipeline.qsize() == 4)
+    time.sleep(0.1)
+    # Builds in progress count towards the high watermark, three producers don't overshoot it
+    assert builder.built == 4
+
+    # Above the low watermark the producers rest
+    pipeline.get()
+    pipeline.get()
+    time.sleep(0.1)
+    assert pipeline.qsize() == 2 and builder.built == 4
+
+    # Down to it they fill up again
+    pipeline.get()
+    wait_until(lambda: pipeline.qsize() == 4)
+    assert builder.built == 7
+    assert pipeline.stop(timeout=1)
+
+def test_get_times_out_and_failures_are_retried():
+    builder = StubBuilder()
+    builder.failing = True
+    pipeline = QuestionPipeline(builder, high_watermark=2, low_watermark=0, producers=1, retry_delay=0.05).start()
+
+    start = time.monotonic()
+    assert pipeline.get(timeout=0.1) is None
+    assert 0.1 <= time.monotonic() - start < 0.5
+    assert pipeline.get(timeout=0) is None
+
+    builder.failing = False
+    question = pipeline.get(timeout=1)
+    assert question is not None and question.image_path == "1.jpg"
+    assert pipeline.stop(timeout=1)
+
+def test_stop_joins_the_producers():
+    builder = StubBuilder(delay=0.2)
+    pipeline = QuestionPipeline(builder, high_watermark=5, low_watermark=2, producers=2).start()
+    threads = list(pipeline._threads)
+    time.sleep(0.05)
+
+    # The producers finish the question they are building, then leave
+    start = time.monotonic()
+    assert pipeline.stop()
+    assert time.monotonic() - start < 0.5
+    assert not any(thread.is_alive() for thread in threads)
+    # What they built can still be popped, then get stops waiting
+    assert pipeline.qsize() == 2
+    pipeline.get()
+    pipeline.get()
+    assert pipeline.get() is None
+
+    # A producer that doesn't finish in time is reported
+    builder = StubBuilder(delay=0.5)
+    pipeline = QuestionPipeline(builder, producers=1).start()
+    time.sleep(0.05)
+    assert pipeline.stop(timeout=0.05) is False
+    assert pipeline.stop(timeout=1)
+
+def test_watermarks_are_checked():
+    with pytest.raises(ValueError):
+        QuestionPipeline(StubBuilder(), high_watermark=2, low_watermark=2)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import quinsectz as qi
+import taxonomy_cache
+from taxonomy_cache import TaxonomyCache
+from taxonomy_index import TaxonomyIndex
+
+FAMILIES = [
+    {"key": 4, "scientificName": "Acrididae", "rank": "FAMILY", "classKey": 216, "class": "Insecta",
+     "orderKey": 1458, "order": "Orthoptera", "taxonomicStatus": "ACCEPTED"},
+    {"key": 10, "scientificName": "Carabidae", "rank": "FAMILY", "classKey": 216, "class": "Insecta",
+     "orderKey": 1470, "order": "Coleoptera", "taxonomicStatus": "ACCEPTED"},
+]
+
+@pytest.fixture
+def lookups(tmp_path, monkeypatch):
+    # Every search lands here, the cache and the index start out empty
+    searches = []
+
+    def name_lookup(**params):
+        searches.append(params)
+        return {"results": [dict(record) for record in FAMILIES]}
+
+    cache = TaxonomyCache(str(tmp_path / "taxonomy.sqlite"))
+    taxonomy_cache.set_default_cache(cache)
+    monkeypatch.setattr(qi, "taxonomy_index", TaxonomyIndex())
+    monkeypatch.setattr(qi.resolver, "resolve", lambda name, rank=None: {"usageKey": 216, "classKey": 216})
+    monkeypatch.setattr(qi, "_name_lookup", name_lookup)
+    yield searches
+    taxonomy_cache.set_default_cache(None)
+    cache.close()
+
+def test_invalidate_through_the_public_function(lookups):
+    assert [r["key"] for r in qi.families_in_class("Insecta")] == [4, 10]
+    assert len(lookups) == 1
+
+    assert qi.families_in_class.cache_prefix == "families_in_class:"
+    assert taxonomy_cache.invalidate(func=qi.families_in_class) == 1
+    assert taxonomy_cache.invalidate(func=qi.genus_in_family) == 0
+
+def test_refresh_skips_the_cache_and_the_index(lookups):
+    qi.families_in_class("Insecta")
+    qi.families_in_class("Insecta")
+    assert len(lookups) == 1
+
+    qi.families_in_class("Insecta", refresh=True)
+    assert len(lookups) == 2
+    # The refreshed entry is the one answered from then on
+    qi.families_in_class("Insecta")
+    assert len(lookups) == 2
+
+class FakeSpeciesSearch:
+    """
+    Answers species/search pages of a family holding `count` species, later pages faster.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.requests = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def get_json_async(self, url, params=None, **kwargs):
+        self.requests.append((params['offset'], params['limit']))
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.05 - params['offset'] / 200000)
+        finally:
+            self.in_flight -= 1
+        results = [{"key": key} for key in range(params['offset'], min(params['offset'] + params['limit'], self.count))]
+        return {"results": results, "count": self.count}
+
+def test_species_pages_come_in_order_with_a_bounded_window(monkeypatch):
+    search = FakeSpeciesSearch(count=5500)
+    resolved_in = []
+
+    def usage_key(name, rank=None):
+        resolved_in.append(threading.current_thread())
+        return 4
+    monkeypatch.setattr(qi.resolver, "usage_key", usage_key)
+    monkeypatch.setattr(qi.http_client, "get_json_async", search.get_json_async)
+
+    async def crawl(**kwargs):
+        pages = []
+        async for offset, results in qi.iter_species_pages("Acrididae", **kwargs):
+            pages.append((offset, len(results)))
+            # A slow consumer doesn't let the crawl run ahead of it
+            await asyncio.sleep(0.1)
+            assert len(search.requests) <= len(pages) + kwargs['max_concurrent']
+        return pages
+
+    pages = asyncio.run(crawl(max_concurrent=2))
+    assert pages == [(0, 1000), (1000, 1000), (2000, 1000), (3000, 1000), (4000, 1000), (5000, 500)]
+    assert search.most_in_flight == 2
+    assert resolved_in and threading.main_thread() not in resolved_in
+
+    # Only the pages the count and the limit leave are requested, the last one cut short
+    search.requests.clear()
+    assert asyncio.run(crawl(limit=2500, max_concurrent=4)) == [(0, 1000), (1000, 1000), (2000, 500)]
+    assert search.requests == [(0, 1000), (1000, 1000), (2000, 500)]
+
+def test_indexed_descendants_keep_to_the_status(lookups):
+    qi.families_in_class("Insecta")
+    # A synonym family learnt from another lookup doesn't turn up among the accepted ones
+    qi.taxonomy_index.add(dict(FAMILIES[0], key=11, scientificName="Oldidae", taxonomicStatus="SYNONYM"))
+
+    assert [r["key"] for r in qi.families_in_class("Insecta")] == [4, 10]
+    assert len(lookups) == 1
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ranks import MAJOR_RANKS, Rank, ancestor_keys, parse_rank
+
+def test_ranks_compare_by_depth():
+    assert Rank.ORDER < Rank.FAMILY < Rank.SPECIES
+    assert Rank.KINGDOM.is_above("family")
+    assert Rank.SUBSPECIES.is_below(Rank.SPECIES)
+    assert sorted([Rank.GENUS, Rank.CLASS, Rank.SUPERFAMILY]) == [Rank.CLASS, Rank.SUPERFAMILY, Rank.GENUS]
+    assert not Rank.UNRANKED.ordered and Rank.FAMILY.ordered
+    assert [rank.major_index for rank in MAJOR_RANKS] == list(range(len(MAJOR_RANKS)))
+    assert Rank.SUBFAMILY.major_index is None
+    assert Rank.ORDER.key_field == "orderKey"
+
+def test_parse_rank_spellings():
+    assert parse_rank("FAMILY") is Rank.FAMILY
+    assert parse_rank("family") is Rank.FAMILY
+    assert parse_rank(" Section Zoology ") is Rank.SECTION_ZOOLOGY
+    assert parse_rank("infraspecific-name") is Rank.INFRASPECIFIC_NAME
+    assert parse_rank("SECTION") is Rank.SECTION_BOTANY
+    assert parse_rank(Rank.GENUS) is Rank.GENUS
+    assert parse_rank("nonsense", Rank.UNRANKED) is Rank.UNRANKED
+    with pytest.raises(ValueError):
+        parse_rank("nonsense")
+
+def test_ancestor_keys():
+    record = {"key": 4, "rank": "FAMILY", "kingdomKey": 1, "classKey": 216, "orderKey": 1458, "familyKey": 4}
+    keys = ancestor_keys(record)
+    assert keys[Rank.ORDER.major_index] == 1458
+    assert keys[Rank.PHYLUM.major_index] is None
+    assert keys[Rank.FAMILY.major_index] == 4
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import http_client
+import taxon_id
+from taxon_id import TaxonFilter, match_many
+from name_matcher import NameMatcher
+from taxonomy_cache import TaxonomyCache
+
+class FakeChecklistBank:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+
+    async def get_json_async(self, url, params=None, **kwargs):
+        self.requests.append((url, dict(params)))
+        await asyncio.sleep(0)
+        name = params.get("scientificName")
+        if name in self.failing:
+            raise RuntimeError(f"no answer for {name}")
+        return {"original": {"scientificName": name}, "type": "exact", "usage": {"id": name.lower()}}
+
+def collect(filters, **kwargs):
+    async def run():
+        return [pair async for pair in match_many(filters, **kwargs)]
+    return asyncio.run(run())
+
+def test_match_many_dedupes_and_reports_errors(monkeypatch, tmp_path):
+    server = FakeChecklistBank(failing={"Nonsense"})
+    monkeypatch.setattr(http_client, "get_json_async", server.get_json_async)
+    cache = TaxonomyCache(str(tmp_path / "taxonomy.sqlite"))
+
+    filters = [
+        TaxonFilter(scientificName="Insecta"),
+        TaxonFilter(scientificName="Insecta"),
+        {'key': 3, 'scientificName': "Insecta"},
+        TaxonFilter(scientificName="Nonsense"),
+        TaxonFilter(key=7, scientificName="Insecta", taxon_class="Insecta"),
+    ]
+    pairs = collect(filters, max_concurrent=2, cache=cache)
+
+    # Every input comes back once, the three copies from one request
+    assert len(pairs) == len(filters)
+    assert len(server.requests) == 3
+    assert all(any(item is search_filters for item, _ in pairs) for search_filters in filters)
+    matches = {id(item): match for item, match in pairs}
+    assert matches[id(filters[0])] is matches[id(filters[2])]
+    assert matches[id(filters[0])].result["usage"]["id"] == "insecta"
+    assert not matches[id(filters[3])].ok and "Nonsense" in str(matches[id(filters[3])].error)
+
+    # Matches are cached per dataset, taxon_class is sent as class
+    params = next(params for url, params in server.requests if "dataset/7/" in url)
+    assert params == {"scientificName": "Insecta", "class": "Insecta"}
+
+    again = collect(filters, cache=cache)
+    assert len(again) == len(filters)
+    # Only the failed match is asked for again
+    assert len(server.requests) == 4
+    assert cache.invalidate(prefix=taxon_id.match_cache_prefix(7)) == 1
+    cache.close()
+
+def test_local_matcher_answers_confident_names(monkeypatch, tmp_path):
+    server = FakeChecklistBank()
+    monkeypatch.setattr(http_client, "get_json_async", server.get_json_async)
+    cache = TaxonomyCache(str(tmp_path / "taxonomy.sqlite"))
+    matcher = NameMatcher()
+    matcher.add_many([("Carabus granulatus Linnaeus, 1758", 101), ("Carabus nemoralis", 102)])
+
+    taxon_id.use_local_matcher(3, matcher)
+    try:
+        filters = [
+            TaxonFilter(scientificName="Carabus granulata"),
+            TaxonFilter(scientificName="Carabus nemorslis"),
+            TaxonFilter(scientificName="Insecta"),
+        ]
+        matches = {item.scientificName: match for item, match in collect(filters, cache=cache)}
+
+        # Only the name the matcher doesn't know goes to ChecklistBank
+        assert [params["scientificName"] for _, params in server.requests] == ["Insecta"]
+        assert matches["Carabus granulata"].result["usage"]["id"] == "101"
+        assert matches["Carabus granulata"].result["type"] == "variant"
+        assert matches["Carabus nemorslis"].result["usage"]["id"] == "102"
+
+        # A complete name list answers "none" for names far from all of them
+        taxon_id.use_local_matcher(3, matcher, complete=True)
+        assert taxon_id.local_match(3, {"scientificName": "Insecta"})["type"] == "none"
+        # Filters on the classification aren't answered locally
+        assert taxon_id.local_match(3, {"scientificName": "Carabus nemoralis", "family": "Carabidae"}) is None
+    finally:
+        taxon_id.use_local_matcher(3, None)
+        cache.close()
@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from taxon_sampler import AliasTable, TaxonSampler, WeightedSampler
+
+def test_alias_table_follows_weights():
+    rng = random.Random(1)
+    table = AliasTable(["a", "b", "c", "d"], [1, 3, 0, 6])
+    counts = Counter(table.draw(rng) for _ in range(100000))
+
+    assert "c" not in counts
+    assert abs(counts["a"] / 100000 - 0.1) < 0.01
+    assert abs(counts["b"] / 100000 - 0.3) < 0.01
+    assert abs(counts["d"] / 100000 - 0.6) < 0.01
+
+def test_weighted_sampler_updates():
+    rng = random.Random(2)
+    sampler = WeightedSampler({"a": 1, "b": 1})
+    sampler.set_weight("a", 0)
+    assert {sampler.draw(rng) for _ in range(100)} == {"b"}
+
+    sampler.set_weight("b", 0)
+    with pytest.raises(LookupError):
+        sampler.draw(rng)
+
+def test_taxon_sampler_skips_empty_taxa():
+    rng = random.Random(3)
+    genera = {1: [], 2: [{"key": 20}, {"key": 21}]}
+    lookups = []
+
+    def genus_lookup(family_key):
+        lookups.append(family_key)
+        return genera[family_key]
+
+    sampler = TaxonSampler([{"key": 1}, {"key": 2}], genus_lookup)
+    sampler.set_genus_weight(2, 21, 0)
+
+    for _ in range(50):
+        family, genus = sampler.draw(rng)
+        assert family["key"] == 2
+
+    # The genus weight was recorded before the family's genera were fetched
+    assert {sampler.draw(rng)[1]["key"] for _ in range(50)} == {20}
+    # Each family's genera are only fetched once
+    assert len(lookups) == len(set(lookups))
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from taxonomy_cache import TaxonomyCache, cached
+
+def test_ttl_and_invalidate(tmp_path):
+    cache = TaxonomyCache(path=str(tmp_path / "cache.sqlite"))
+
+    cache.set("families_in_class:a", [1, 2, 3])
+    cache.set("families_in_class:b", [4], ttl=0.01)
+    cache.set("genus_in_family:c", [5])
+
+    assert cache.get("families_in_class:a") == [1, 2, 3]
+
+    time.sleep(0.02)
+    assert cache.get("families_in_class:b") is None
+
+    assert cache.invalidate(prefix="families_in_class:") == 1
+    assert cache.get("genus_in_family:c") == [5]
+    assert len(cache) == 1
+
+def test_lru_eviction(tmp_path):
+    cache = TaxonomyCache(path=str(tmp_path / "cache.sqlite"), max_entries=2)
+
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    cache.get("a")  # "b" is now the least recently used entry
+    time.sleep(0.01)
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+def test_cached_decorator_skips_repeated_calls(tmp_path):
+    cache = TaxonomyCache(path=str(tmp_path / "cache.sqlite"))
+    calls = []
+
+    @cached(cache=cache)
+    def families_in_class(class_name="insecta", limit=100000):
+        calls.append(class_name)
+        return [{"scientificName": class_name}]
+
+    families_in_class("Insecta")
+    families_in_class(class_name="Insecta")
+    families_in_class("Insecta", refresh=True)
+
+    assert calls == ["Insecta", "Insecta"]
@@ -0,0 +1,67 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ranks import Rank
+from taxonomy_index import TaxonomyIndex
+
+def family(key, name, order_key, order):
+    return {"key": key, "scientificName": name, "canonicalName": name, "rank": "FAMILY",
+            "kingdomKey": 1, "kingdom": "Animalia", "classKey": 216, "class": "Insecta",
+            "orderKey": order_key, "order": order}
+
+def test_descendants_and_coverage():
+    index = TaxonomyIndex()
+    index.add_many([
+        family(4, "Acrididae", 1458, "Orthoptera"),
+        family(5, "Tettigoniidae", 1458, "Orthoptera"),
+        family(10, "Carabidae", 1470, "Coleoptera"),
+    ])
+    index.mark_complete(216, "family")
+
+    assert [r["key"] for r in index.descendants_at_rank(216, "family")] == [4, 5, 10]
+    assert [r["key"] for r in index.descendants_at_rank(1458, "family")] == [4, 5]
+    assert index.covers(1470, "family")
+    assert not index.covers(1470, "genus")
+    assert index.is_descendant(10, 1470)
+    assert not index.is_descendant(10, 1458)
+
+    # Genera arriving later hang off the family they name
+    index.add({"key": 6, "scientificName": "Dissosteira", "rank": "GENUS", "classKey": 216, "class": "Insecta",
+               "orderKey": 1458, "order": "Orthoptera", "familyKey": 4, "family": "Acrididae"})
+    assert [r["key"] for r in index.descendants_at_rank(1458, "genus")] == [6]
+    assert index.is_descendant(6, 216)
+    assert index.find("acrididae", rank="family")["key"] == 4
+
+def test_ancestor_at_rank():
+    index = TaxonomyIndex()
+    index.add(family(4, "Acrididae", 1458, "Orthoptera"))
+    index.add({"key": 6, "scientificName": "Dissosteira", "rank": "GENUS", "familyKey": 4, "family": "Acrididae"})
+
+    assert index.ancestor_at_rank(4, Rank.ORDER)["key"] == 1458
+    assert index.ancestor_at_rank(4, "class")["key"] == 216
+    assert index.ancestor_at_rank(4, "family") is None
+    assert index.ancestor_at_rank(6, Rank.FAMILY)["key"] == 4
+    # The genus record doesn't name the order, it inherits it from the family
+    assert index.ancestor_at_rank(6, Rank.ORDER)["key"] == 1458
+
+def test_descendants_by_status():
+    index = TaxonomyIndex()
+    synonym = dict(family(11, "Oldidae", 1458, "Orthoptera"), taxonomicStatus="SYNONYM")
+    index.add_many([
+        dict(family(4, "Acrididae", 1458, "Orthoptera"), taxonomicStatus="ACCEPTED"),
+        synonym,
+        dict(family(5, "Tettigoniidae", 1458, "Orthoptera"), taxonomicStatus="DOUBTFUL"),
+    ])
+    # A name_backbone match spells it status
+    index.add({"usageKey": 12, "scientificName": "Gryllidae", "rank": "FAMILY", "status": "ACCEPTED", "orderKey": 1458})
+
+    def keys(records):
+        return [record.get("key", record.get("usageKey")) for record in records]
+
+    assert keys(index.descendants_at_rank(1458, "family")) == [4, 11, 5, 12]
+    assert keys(index.descendants_at_rank(1458, "family", status="accepted")) == [4, 12]
+    assert index.descendants_at_rank(1458, "family", limit=1, status="SYNONYM") == [synonym]
+    # The order itself is only known by key, it has no status
+    assert index.descendants_at_rank(216, "order", status="accepted") == []